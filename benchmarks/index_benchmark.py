@@ -0,0 +1,96 @@
+""" Compare the load time and memory footprint of the compact index with the jsonasobj representation used by
+earlier versions.
+
+    python -m benchmarks.index_benchmark [identities]
+
+jsonasobj must be installed for the comparison.
+"""
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from typing import Callable, Tuple, Any
+
+from cachejar.index import CacheIndex, CacheEntry, ObjectInfo, new_blob
+
+OBJECTS_PER_SOURCE = 4
+
+
+def build_index(nidentities: int) -> CacheIndex:
+    """ Index with nidentities objects, OBJECTS_PER_SOURCE per source file """
+    index = CacheIndex()
+    now = time.time()
+    for i in range(0, nidentities, OBJECTS_PER_SOURCE):
+        entry = index[f'/data/project/sources/file{i:08}.json'] = CacheEntry(f'f{i * 1017 % 99991}-1612345678.1234')
+        for j in range(OBJECTS_PER_SOURCE):
+            entry.objects[f'Parser(strict={j},)'] = ObjectInfo(new_blob(), 1000 + i, now - i, 0.01 * j)
+    return index
+
+
+def legacy_json(index: CacheIndex) -> dict:
+    """ The same index as written by earlier versions """
+    return {name_or_url: {'signature': entry.signature,
+                          'cached_objects': {obj_identity: 'A' + str(uuid.uuid4()) for obj_identity in entry.objects},
+                          'object_info': {obj_identity: dict(size=info.size, atime=info.atime, cost=info.cost)
+                                          for obj_identity, info in entry.objects.items()}}
+            for name_or_url, entry in index.items()}
+
+
+def measure(load: Callable[[], Any]) -> Tuple[float, int]:
+    """ Return the best of three load times in seconds and the memory held by the result in bytes """
+    times = []
+    for _ in range(3):
+        gc.collect()
+        start = time.perf_counter()
+        result = load()
+        times.append(time.perf_counter() - start)
+        del result
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    nbytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return min(times), nbytes
+
+
+def main(nidentities: int) -> None:
+    index = build_index(nidentities)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        compact_path = os.path.join(tmpdir, 'index')
+        with open(compact_path, 'w') as f:
+            index.dump(f)
+        legacy_path = os.path.join(tmpdir, 'legacy_index')
+        with open(legacy_path, 'w') as f:
+            json.dump(legacy_json(index), f)
+        del index
+
+        def load_compact():
+            with open(compact_path) as f:
+                return CacheIndex.load(f)[0]
+
+        results = [('compact', os.path.getsize(compact_path)) + measure(load_compact)]
+        try:
+            import jsonasobj
+        except ImportError:
+            jsonasobj = None
+            print("jsonasobj is not installed - skipping the comparison")
+        if jsonasobj:
+            def load_jsonasobj():
+                with open(legacy_path) as f:
+                    return jsonasobj.load(f)
+
+            results.append(('jsonasobj', os.path.getsize(legacy_path)) + measure(load_jsonasobj))
+
+    print(f"{nidentities:,} identities")
+    print(f"{'':12}{'file (MB)':>12}{'load (s)':>12}{'memory (MB)':>14}")
+    for name, fsize, load_time, nbytes in results:
+        print(f"{name:12}{fsize / 2 ** 20:12.1f}{load_time:12.2f}{nbytes / 2 ** 20:14.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
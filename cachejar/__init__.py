@@ -1,2 +1,2 @@
 from cachejar.jar import factory, jar
-
+from cachejar.dependencies import Dependencies
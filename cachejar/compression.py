@@ -0,0 +1,47 @@
+import bz2
+import lzma
+import zlib
+from typing import Callable, Dict
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class Codec:
+    """ A named compression algorithm for cache files """
+    def __init__(self, name: str, compress: Callable[[bytes], bytes], decompress: Callable[[bytes], bytes]) -> None:
+        self.name = name
+        self.compress = compress
+        self.decompress = decompress
+
+
+codecs: Dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec) -> None:
+    """ Make a codec available by name """
+    codecs[codec.name] = codec
+
+
+def get_codec(name: str) -> Codec:
+    """ Return the codec registered under name """
+    if name not in codecs:
+        raise KeyError(f"Unknown compression codec: {name}")
+    return codecs[name]
+
+
+register_codec(Codec('zlib', lambda data: zlib.compress(data, 6), zlib.decompress))
+register_codec(Codec('lzma', lzma.compress, lzma.decompress))
+register_codec(Codec('bz2', bz2.compress, bz2.decompress))
+if lz4 is not None:
+    register_codec(Codec('lz4', lz4.frame.compress, lz4.frame.decompress))
+if zstandard is not None:
+    register_codec(Codec('zstd', lambda data: zstandard.ZstdCompressor().compress(data),
+                         lambda data: zstandard.ZstdDecompressor().decompress(data)))
@@ -0,0 +1,99 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+from typing import Callable, Optional, List, Union
+
+from cachejar.lazyimport import lazy_import
+
+futures = lazy_import('concurrent.futures')
+
+
+class Dependencies(str):
+    """ A set of files, directories, urls and glob patterns that an object is derived from, for use in place of a
+    single name_or_url:
+
+        deps = Dependencies('schema.json', 'data/', 'https://example.org/context.jsonld', 'rules/**/*.yaml')
+        obj = jar.object_for(deps, 'model')
+
+    The value of the string is a canonical key for the set, so the order the sources are given in doesn't matter.
+    The signature of the set is the list of the signatures of its members.  Members are signed concurrently, and when
+    a cached entry is being validated, signing stops at the first member that has changed.
+    """
+    prefix = 'deps:'
+    max_workers = 8                     # Number of dependencies signed at once
+    _executor: Optional["futures.ThreadPoolExecutor"] = None
+    _executor_lock = threading.Lock()
+
+    def __new__(cls, *sources: Union[str, os.PathLike]) -> "Dependencies":
+        if not sources:
+            raise ValueError("At least one dependency must be supplied")
+        sorted_sources = sorted({os.fspath(source) for source in sources})
+        deps = super().__new__(cls, cls.prefix + json.dumps(sorted_sources, separators=(',', ':')))
+        deps.sources = sorted_sources
+        return deps
+
+    def __reduce__(self):
+        return Dependencies, tuple(self.sources)
+
+    @classmethod
+    def from_key(cls, key: str) -> str:
+        """ Return the source whose key is key - Dependencies if key is the value of one, key itself otherwise.  Used
+        for sources that have been read back from an index, where Dependencies are plain strings """
+        if key.startswith(cls.prefix):
+            return cls(*json.loads(key[len(cls.prefix):]))
+        return key
+
+    @staticmethod
+    def is_pattern(source: str) -> bool:
+        return any(c in source for c in '*?[') and '://' not in source
+
+    @staticmethod
+    def _pattern_signature(pattern: str, signer: Callable[[str], str]) -> str:
+        """ Signature for a glob pattern - a digest of the names and signatures of the paths that it matches """
+        digest = hashlib.md5()
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            digest.update(path.encode() + b'\0' + signer(path).encode() + b'\0')
+        return 'glob:' + digest.hexdigest()
+
+    def _sign(self, source: str, signer: Callable[[str], str]) -> str:
+        return self._pattern_signature(source, signer) if self.is_pattern(source) else signer(source)
+
+    @classmethod
+    def _pool(cls) -> "futures.ThreadPoolExecutor":
+        with cls._executor_lock:
+            if Dependencies._executor is None:
+                Dependencies._executor = futures.ThreadPoolExecutor(cls.max_workers, thread_name_prefix='cachejar-deps')
+            return Dependencies._executor
+
+    def signature(self, signer: Callable[[str], str], expected: Optional[str] = None) -> Optional[str]:
+        """ Return the composite signature of the dependencies
+
+        :param signer: function that returns the signature of a file, directory or url
+        :param expected: signature on record, if any.  Members are compared with it as their signatures come in
+        :return: composite signature.  None if expected was supplied and it is out of date
+        """
+        try:
+            previous: Optional[List[str]] = json.loads(expected) if expected is not None else None
+        except ValueError:
+            return None
+        if previous is not None and (not isinstance(previous, list) or len(previous) != len(self.sources)):
+            return None
+        sigs: List[Optional[str]] = [None] * len(self.sources)
+        if len(self.sources) == 1:
+            sigs[0] = self._sign(self.sources[0], signer)
+            if previous is not None and sigs[0] != previous[0]:
+                return None
+        else:
+            pending = {self._pool().submit(self._sign, source, signer): i for i, source in enumerate(self.sources)}
+            try:
+                for future in futures.as_completed(pending):
+                    i = pending[future]
+                    sigs[i] = future.result()
+                    if previous is not None and sigs[i] != previous[i]:
+                        return None
+            finally:
+                for future in pending:
+                    future.cancel()
+        return expected if previous is not None else json.dumps(sigs)
@@ -0,0 +1,94 @@
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from cachejar.index import CacheEntry, CacheIndex, ObjectInfo, read_blob_header
+
+
+class FsckReport:
+    """ What CacheJar.fsck found """
+    def __init__(self, scanned: int, complete: bool = True) -> None:
+        self.scanned = scanned              # Number of directory entries examined
+        self.complete = complete            # False means the time budget ran out - fsck carries on with the next call
+        self.orphans: List[str] = []        # Files that nothing refers to - cache files and abandoned temporary files
+        self.dangling: List[Tuple[str, str]] = []   # (name_or_url, identity) of objects whose cache files are missing
+        self.repaired = False               # True means orphans were removed and dangling objects dropped
+
+    def __repr__(self) -> str:
+        return f"FsckReport(scanned={self.scanned}, complete={self.complete}, orphans={len(self.orphans)}, " \
+               f"dangling={len(self.dangling)}, repaired={self.repaired})"
+
+
+class DirectoryScan:
+    """ A single pass over a jar directory (one os.scandir) that sorts the entries into cache files, with any
+    auxiliary files, and temporary files.  Nothing is stat'ed.  The pass can be made a piece at a time - see step.
+    """
+    blob_pattern = re.compile(r'(A(?:[a-f0-9]{24}|[a-fA-F0-9]{8}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-'
+                              r'[a-fA-F0-9]{12}))(\.\w+)?$')
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.scanned = 0
+        self.blobs: Dict[str, List[str]] = {}       # cache file name --> names of it and its auxiliary files
+        self.temporary: List[str] = []              # Files being written, or abandoned part way through
+        self._entries = os.scandir(directory)
+
+    def step(self, deadline: Optional[float] = None) -> bool:
+        """ Carry on with the scan
+
+        :param deadline: time.monotonic() value to stop at.  None means scan the rest of the directory
+        :return: True if the scan is complete
+        """
+        for entry in self._entries:
+            self.scanned += 1
+            name = entry.name
+            if name.endswith('.tmp'):
+                self.temporary.append(name)
+            else:
+                match = self.blob_pattern.match(name)
+                if match:
+                    self.blobs.setdefault(match.group(1), []).append(name)
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+        self.close()
+        return True
+
+    def close(self) -> None:
+        self._entries.close()
+
+
+def rebuild_index(scan: DirectoryScan) -> CacheIndex:
+    """ Rebuild an index from the headers of the cache files found by a complete scan.  Files without headers
+    (written by earlier versions) or with damaged headers are left out.  If a source has objects recorded under more
+    than one signature, which happens when it changed and the old files weren't removed, the signature of the most
+    recently written file wins.
+
+    :return: the index.  Access times are the access times of the files
+    """
+    found: Dict[str, Dict[str, list]] = {}          # source --> signature --> [(mtime, identity, object_info)]
+    for fname, names in scan.blobs.items():
+        if '-' in fname:
+            continue                                # uuid names are only used by versions that didn't write headers
+        path = os.path.join(scan.directory, fname)
+        try:
+            with open(path, 'rb') as f:
+                header = read_blob_header(f)
+            if header is None:
+                continue
+            st = os.stat(path)
+            size = st.st_size + sum(os.path.getsize(os.path.join(scan.directory, name))
+                                    for name in names if name != fname)
+            info = ObjectInfo(int(fname[1:], 16), size, st.st_atime, header.get('cost'), header.get('serializer'),
+                              header.get('codec'), header.get('label'))
+            found.setdefault(header['source'], {}).setdefault(header['signature'], []).append(
+                (st.st_mtime, header['identity'], info))
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+    cache = CacheIndex()
+    for source, signatures in found.items():
+        sig, objects = max(signatures.items(), key=lambda s: max(o[0] for o in s[1]))
+        entry = cache[source] = CacheEntry(sig)
+        for _, obj_identity, info in sorted(objects, key=lambda o: o[0]):      # The newest copy of an object wins
+            entry.objects[obj_identity] = info
+    return cache
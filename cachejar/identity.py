@@ -0,0 +1,195 @@
+import datetime
+import enum
+import functools
+import hashlib
+import os
+import pathlib
+import sys
+import types
+from typing import Any, List, Callable, Dict, Optional
+
+PREFIX_SIZE = 8                 # Bytes of an identity that depend on obj_id alone
+DIGEST_SIZE = 12                # Bytes of an identity that depend on obj_id and the parameters
+PREFIX_LENGTH = 2 * PREFIX_SIZE
+
+_encoders: Dict[type, Callable[[Any, List[bytes]], None]] = {}      # Class --> encoding function
+
+
+class Identity(str):
+    """ An object identity that remembers the readable form it was computed from (see CacheJar.readable_identities)
+    """
+    readable: Optional[str] = None
+
+
+def _field(tag: bytes, data: bytes) -> bytes:
+    """ Length prefixed field, so that no encoding is a prefix of another """
+    return tag + str(len(data)).encode() + b':' + data
+
+
+def _qualname(obj: Any) -> bytes:
+    return f"{getattr(obj, '__module__', None)}.{getattr(obj, '__qualname__', obj.__class__.__qualname__)}".encode()
+
+
+def _encode(obj: Any, out: List[bytes]) -> None:
+    """ encode, bypassing the singledispatch machinery for types that have already been seen """
+    cls = obj.__class__
+    try:
+        fn = _encoders[cls]
+    except KeyError:
+        fn = _encoders[cls] = encode.dispatch(cls)
+    fn(obj, out)
+
+
+@functools.singledispatch
+def encode(obj: Any, out: List[bytes]) -> None:
+    """ Append the canonical encoding of obj to out.  Objects without a registered encoding are identified by their
+    type and str(), which is only canonical if str() is
+
+    :param obj: object to encode
+    :param out: encoding so far
+    """
+    dataclasses = sys.modules.get('dataclasses')    # Not there in python 3.6, and if it isn't loaded obj can't be one
+    if dataclasses is not None and dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        out.append(_field(b'o', _qualname(type(obj))))
+        _encode({f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)}, out)
+    else:
+        out.append(_field(b'r', _qualname(type(obj)) + b'\0' + str(obj).encode(errors='surrogatepass')))
+
+
+def register_encoder(cls: type, to_identity: Callable[[Any], Any]) -> None:
+    """ Identify instances of cls (and its subclasses) by to_identity(obj), which must return something that can
+    itself be encoded.
+
+        register_encoder(numpy.ndarray, lambda a: (a.dtype.str, a.shape, a.tobytes()))
+
+    :param cls: type to register
+    :param to_identity: function that converts an instance of cls into its identity
+    """
+    tag = _field(b'x', _qualname(cls))
+
+    def encode_cls(obj: Any, out: List[bytes]) -> None:
+        out.append(tag)
+        _encode(to_identity(obj), out)
+    encode.register(cls, encode_cls)
+    _encoders.clear()
+
+
+@encode.register(type(None))
+def _(obj: None, out: List[bytes]) -> None:
+    out.append(b'N')
+
+
+@encode.register(bool)
+def _(obj: bool, out: List[bytes]) -> None:
+    out.append(b'T' if obj else b'F')
+
+
+@encode.register(int)
+def _(obj: int, out: List[bytes]) -> None:
+    out.append(_field(b'i', str(int(obj)).encode()))
+
+
+@encode.register(float)
+def _(obj: float, out: List[bytes]) -> None:
+    out.append(_field(b'f', repr(float(obj)).encode()))
+
+
+@encode.register(str)
+def _(obj: str, out: List[bytes]) -> None:
+    out.append(_field(b's', obj.encode(errors='surrogatepass')))
+
+
+@encode.register(bytes)
+@encode.register(bytearray)
+@encode.register(memoryview)
+def _(obj: bytes, out: List[bytes]) -> None:
+    out.append(_field(b'b', bytes(obj)))
+
+
+@encode.register(tuple)
+@encode.register(list)
+def _(obj: tuple, out: List[bytes]) -> None:
+    out.append(b't' if isinstance(obj, tuple) else b'l')
+    for item in obj:
+        _encode(item, out)
+    out.append(b'e')
+
+
+def _encoded(obj: Any) -> bytes:
+    out = []
+    _encode(obj, out)
+    return b''.join(out)
+
+
+@encode.register(dict)
+def _(obj: dict, out: List[bytes]) -> None:
+    """ Dictionaries are ordered by the encodings of their keys, so insertion order doesn't matter """
+    out.append(b'd')
+    out += sorted(_encoded(k) + _encoded(v) for k, v in obj.items())
+    out.append(b'e')
+
+
+@encode.register(set)
+@encode.register(frozenset)
+def _(obj: set, out: List[bytes]) -> None:
+    out.append(b'S')
+    out += sorted(_encoded(item) for item in obj)
+    out.append(b'e')
+
+
+@encode.register(type)
+@encode.register(types.FunctionType)
+@encode.register(types.BuiltinFunctionType)
+def _(obj: Any, out: List[bytes]) -> None:
+    """ Classes and functions are identified by name, except for lambdas, which don't have one """
+    name = _qualname(obj)
+    if b'<lambda>' in name:
+        encode.dispatch(object)(obj, out)
+    else:
+        out.append(_field(b'c', name))
+
+
+@encode.register(enum.Enum)
+def _(obj: enum.Enum, out: List[bytes]) -> None:
+    out.append(_field(b'E', _qualname(type(obj)) + b'.' + obj.name.encode()))
+
+
+@encode.register(datetime.date)
+@encode.register(datetime.time)
+def _(obj: Any, out: List[bytes]) -> None:
+    out.append(_field(b'D', _qualname(type(obj)) + b'\0' + obj.isoformat().encode()))
+
+
+@encode.register(pathlib.PurePath)
+def _(obj: pathlib.PurePath, out: List[bytes]) -> None:
+    out.append(_field(b'p', os.fspath(obj).encode(errors='surrogateescape')))
+
+
+def identity_prefix(obj_id: Any) -> str:
+    """ Return the part of an object identity that depends on obj_id alone - shared by all of its variants """
+    out = []
+    _encode(obj_id, out)
+    return hashlib.blake2b(b''.join(out), digest_size=PREFIX_SIZE).hexdigest()
+
+
+def object_identity(obj_id: Any, parms: tuple, kwparms: Dict[str, Any]) -> str:
+    """ Return the key that an object is stored under - a fixed size digest of the canonical encoding of its id and
+    parameters.  The order of the keyword parameters doesn't matter.  The first PREFIX_LENGTH characters are the
+    identity_prefix of obj_id, so all of the variants of an object can be found without knowing their parameters.
+
+    :param obj_id: object identifier
+    :param parms: positional parameters
+    :param kwparms: keyword parameters
+    :return: hex digest
+    """
+    out = []
+    _encode(obj_id, out)
+    prefix = hashlib.blake2b(b''.join(out), digest_size=PREFIX_SIZE).hexdigest()
+    _encode(tuple(parms), out)
+    _encode(kwparms, out)
+    return prefix + hashlib.blake2b(b''.join(out), digest_size=DIGEST_SIZE).hexdigest()
+
+
+def readable_identity(obj_id: Any, parms: tuple, kwparms: Dict[str, Any]) -> str:
+    """ Return the human readable form of an object identity """
+    return str(obj_id) + (str(tuple(parms)) if parms else '') + (str(dict(sorted(kwparms.items()))) if kwparms else '')
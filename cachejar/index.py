@@ -0,0 +1,227 @@
+import gc
+import json
+import os
+import struct
+import sys
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Union, TextIO, List, Tuple, Iterator, Set, BinaryIO
+
+# Cache files are named 'A' followed by a fixed width hex number.  Jars written by earlier versions used 'A' + uuid4,
+# and those names are carried as strings.
+Blob = Union[int, str]
+BLOB_BITS = 96
+
+INDEX_FORMAT = 'cachejar-index'
+INDEX_VERSION = 2
+
+# Cache files start with a header - magic, length and a JSON description of the object (see write_blob_header) - so
+# that a damaged index can be rebuilt from the files.  Files written by earlier versions have no header.
+BLOB_MAGIC = b'CJBLOB01'
+_header_length = struct.Struct('<I')
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    """ Suspend the cyclic garbage collector.  Loading a large index allocates millions of containers, none of which
+    are garbage, and collections triggered along the way would otherwise take as long as the load itself. """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def new_blob() -> int:
+    """ Return the id for a new cache file """
+    return int.from_bytes(os.urandom(BLOB_BITS // 8), 'big')
+
+
+def blob_fname(blob: Blob) -> str:
+    """ Return the name of the file that holds blob """
+    return blob if isinstance(blob, str) else f'A{blob:0{BLOB_BITS // 4}x}'
+
+
+def write_blob_header(f: BinaryIO, header: dict, info: "ObjectInfo") -> None:
+    """ Write the header that starts a cache file
+
+    :param f: cache file, positioned at the start
+    :param header: source, signature and identity of the object (see CacheJar._blob_header)
+    :param info: object_info for the file.  The fields that don't change once it has been written are recorded
+    """
+    fields = {k: v for k, v in info.as_dict().items() if k not in ('size', 'atime')}
+    data = json.dumps(dict(header, **fields), separators=(',', ':')).encode()
+    f.write(BLOB_MAGIC + _header_length.pack(len(data)) + data)
+
+
+def read_blob_header(f: BinaryIO) -> Optional[dict]:
+    """ Read the header of a cache file, leaving f positioned at the start of the object
+
+    :param f: cache file, positioned at the start
+    :return: header, None if the file was written by an earlier version.  ValueError if the header is damaged
+    """
+    if f.read(len(BLOB_MAGIC)) != BLOB_MAGIC:
+        f.seek(0)
+        return None
+    try:
+        length = _header_length.unpack(f.read(_header_length.size))[0]
+    except struct.error:
+        raise ValueError("Damaged cache file header") from None
+    return json.loads(f.read(length))
+
+
+class ObjectInfo:
+    """ Per object bookkeeping - the cache file, its size in bytes, last access time, the time it took to compute,
+    the serializer, if it isn't the default, the compression codec, if any, and the readable form of the object
+    identity, if it was recorded """
+    __slots__ = ('blob', 'size', 'atime', 'cost', 'serializer', 'codec', 'label')
+
+    def __init__(self, blob: Blob, size: Optional[int], atime: Optional[float] = None, cost: Optional[float] = None,
+                 serializer: Optional[str] = None, codec: Optional[str] = None, label: Optional[str] = None) -> None:
+        self.blob = blob
+        self.size = size
+        self.atime = time.time() if atime is None else atime
+        self.cost = cost
+        self.serializer = serializer
+        self.codec = codec
+        self.label = label
+
+    @property
+    def fname(self) -> str:
+        return blob_fname(self.blob)
+
+    def as_dict(self) -> dict:
+        """ Return the journal representation of everything but the blob """
+        d = dict(size=self.size, atime=self.atime, cost=self.cost)
+        if self.serializer:
+            d['serializer'] = self.serializer
+        if self.codec:
+            d['codec'] = self.codec
+        if self.label:
+            d['label'] = self.label
+        return d
+
+    def as_row(self, obj_identity: str) -> list:
+        """ Return the snapshot representation - trailing defaults are omitted """
+        row = [obj_identity, self.blob, self.size, self.atime, self.cost, self.serializer, self.codec, self.label]
+        while row[-1] is None:
+            row.pop()
+        return row
+
+
+class CacheEntry:
+    """ The signature of a file or url and the objects cached for it """
+    __slots__ = ('signature', 'objects')
+
+    def __init__(self, sig: Optional[str] = None) -> None:
+        self.signature = sig
+        self.objects: Dict[str, ObjectInfo] = {}           # Obj_id --> ObjectInfo
+
+
+class CacheIndex(dict):
+    """ Map from a file or url to its CacheEntry.
+
+    A snapshot is written as `["cachejar-index", 2, {name_or_url: [signature, [row, ...]]}]`, where each row is an
+    ObjectInfo as a flat list (see ObjectInfo.as_row).  Lists decode much faster than objects, and identities and
+    codec names, which are shared across many entries, are interned as they are loaded.
+    """
+
+    def dump(self, f: TextIO) -> None:
+        """ Write a snapshot to f """
+        json.dump([INDEX_FORMAT, INDEX_VERSION,
+                   {name_or_url: [entry.signature, [info.as_row(obj_identity)
+                                                    for obj_identity, info in entry.objects.items()]]
+                    for name_or_url, entry in self.items()}], f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, f: TextIO) -> Tuple["CacheIndex", bool]:
+        """ Load a snapshot
+
+        :param f: open snapshot file
+        :return: index, True if it was written by an earlier version and should be rewritten.  ValueError if it
+        can't be decoded
+        """
+        with _gc_paused():
+            data = json.load(f)
+            if isinstance(data, dict):
+                return cls._load_legacy(data), True
+            if not isinstance(data, list) or len(data) != 3 or data[0] != INDEX_FORMAT or data[1] != INDEX_VERSION:
+                raise ValueError("Unrecognized index format")
+            index = cls()
+            intern = sys.intern
+            for name_or_url, (sig, rows) in data[2].items():
+                entry = index[name_or_url] = CacheEntry(sig)
+                objects = entry.objects
+                for row in rows:
+                    info = ObjectInfo(*row[1:])
+                    if info.serializer:
+                        info.serializer = intern(info.serializer)
+                    if info.codec:
+                        info.codec = intern(info.codec)
+                    objects[intern(row[0])] = info
+        return index, False
+
+    @classmethod
+    def _load_legacy(cls, data: dict) -> "CacheIndex":
+        """ Convert the attribute dictionary representation used by earlier versions.  Objects whose size wasn't
+        recorded have a size of None """
+        index = cls()
+        for name_or_url, legacy_entry in data.items():
+            entry = index[name_or_url] = CacheEntry(legacy_entry['signature'])
+            legacy_info = legacy_entry.get('object_info', {})
+            for obj_identity, fname in legacy_entry['cached_objects'].items():
+                info = legacy_info.get(obj_identity)
+                entry.objects[sys.intern(obj_identity)] = \
+                    ObjectInfo(fname, info['size'], info['atime'], info.get('cost'), info.get('serializer'),
+                               info.get('codec')) if info else ObjectInfo(fname, None)
+        return index
+
+    def size(self) -> int:
+        """ Return the number of journal records it would take to rebuild the index """
+        return sum(1 + len(entry.objects) for entry in self.values())
+
+    def blobs(self) -> List[str]:
+        """ Return the names of all of the cache files in the index """
+        return [info.fname for entry in self.values() for info in entry.objects.values()]
+
+
+class IdentityIndex:
+    """ Secondary index of a CacheIndex - the sources that each object identity is cached for, and the identities
+    that share each prefix (see identity.identity_prefix), so that an object can be found in every entry without
+    looking at the others """
+    def __init__(self, cache: CacheIndex, prefix_length: int) -> None:
+        self.prefix_length = prefix_length
+        self._sources: Dict[str, Set[str]] = {}                 # identity --> sources
+        self._prefixes: Dict[str, Set[str]] = {}                # prefix --> identities
+        for name_or_url, entry in cache.items():
+            for obj_identity in entry.objects:
+                self.add(name_or_url, obj_identity)
+
+    def add(self, name_or_url: str, obj_identity: str) -> None:
+        sources = self._sources.get(obj_identity)
+        if sources is None:
+            self._sources[obj_identity] = {name_or_url}
+            self._prefixes.setdefault(obj_identity[:self.prefix_length], set()).add(obj_identity)
+        else:
+            sources.add(name_or_url)
+
+    def discard(self, name_or_url: str, obj_identity: str) -> None:
+        sources = self._sources.get(obj_identity)
+        if sources is not None:
+            sources.discard(name_or_url)
+            if not sources:
+                del self._sources[obj_identity]
+                prefix = obj_identity[:self.prefix_length]
+                self._prefixes[prefix].discard(obj_identity)
+                if not self._prefixes[prefix]:
+                    del self._prefixes[prefix]
+
+    def sources(self, obj_identity: str) -> List[str]:
+        """ Return the sources that obj_identity is cached for """
+        return list(self._sources.get(obj_identity, ()))
+
+    def identities(self, prefix: str) -> List[str]:
+        """ Return the cached identities that start with prefix """
+        return list(self._prefixes.get(prefix, ()))
@@ -1,34 +1,113 @@
-import json
+import functools
+import hashlib
+import io
 import os
-import pickle
 import re
-import uuid
-from typing import Optional, Dict, Any
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple, Iterator, Union, Iterable, Sequence, Callable, Set
 
-import jsonasobj
-from jsonasobj.jsonobj import as_json, items
+from cachejar.compression import get_codec
+from cachejar.dependencies import Dependencies
+from cachejar.journal import IndexJournal
+from cachejar.lazyimport import lazy_import
+from cachejar.lease import Lease
+from cachejar.locking import FileLock
+from cachejar.memtier import MemoryTier
+from cachejar.rwlock import RWLock, NoLock
+from cachejar.serializers import Serializer, get_serializer
+from cachejar.signature import signature, is_url, UrlSignatureCache, DirectorySigner, default_directory_signer, \
+    file_signature, ContentSigner, async_url_signature
 
-from cachejar.signature import signature
+# Loaded on first use, to keep `import cachejar` cheap
+asyncio = lazy_import('asyncio')
+fsck = lazy_import('cachejar.fsck')
+futures = lazy_import('concurrent.futures')
+identity = lazy_import('cachejar.identity')
+index = lazy_import('cachejar.index')
+inspect = lazy_import('inspect')
+pack = lazy_import('cachejar.pack')
+sharedtier = lazy_import('cachejar.sharedtier')
+watcher = lazy_import('cachejar.watcher')
+writebehind = lazy_import('cachejar.writebehind')
 
 
 class CacheError(Exception):
     pass
 
 
-class CacheIndex(jsonasobj.JsonObj):
+def eviction_key(policy: str, info: "index.ObjectInfo") -> tuple:
+    """ Sort key for eviction candidates - lowest goes first.
+
+    'lru' evicts the least recently used object.  'cost' evicts the object that is cheapest to recompute per byte of
+    disk it occupies (objects with no recorded cost first), least recently used within that.
+    """
+    if policy == 'cost':
+        return (info.cost or 0.0) / max(info.size, 1), info.atime
+    return info.atime,
+
+
+def write_cache_file(cache_directory: str, obj: object, serializer: str, compression: Optional[str] = None,
+                     compression_threshold: int = 0, cost: Optional[float] = None,
+                     header: Optional[dict] = None) -> "index.ObjectInfo":
+    """ Serialize obj to a new cache file.  The file isn't added to any index.
+
+    :param cache_directory: jar directory to write the file in
+    :param obj: object to write
+    :param serializer: name of the serializer to use
+    :param compression: name of the codec to compress the file with, if any
+    :param compression_threshold: files smaller than this aren't compressed
+    :param cost: time in seconds that it took to compute obj, if known
+    :param header: source, signature and identity of the object, recorded in the file (see index.write_blob_header)
+    :return: object_info for the new file
+    """
+    blob_serializer = get_serializer(serializer)
+    info = index.ObjectInfo(index.new_blob(), 0, cost=cost,
+                            serializer=serializer if serializer != CacheJar.default_serializer else None)
+    fpath = os.path.join(cache_directory, info.fname)
+    tmp_path = fpath + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        if compression:
+            buf = io.BytesIO()
+            size = blob_serializer.dump(obj, buf, fpath)
+            data = buf.getvalue()
+            if len(data) >= compression_threshold:
+                info.codec = compression
+                data = get_codec(compression).compress(data)
+            if header is not None:
+                index.write_blob_header(f, header, info)
+            f.write(data)
+        else:
+            if header is not None:
+                index.write_blob_header(f, header, info)
+            size = blob_serializer.dump(obj, f, fpath)
+        info.size = size + f.tell()
+    os.replace(tmp_path, fpath)           # No one ever sees a partially written cache file
+    return info
 
-    class CacheEntry(jsonasobj.JsonObj):
-        def __init__(self, sig: Optional[str]=None):
-            self.signature = sig
-            self.cached_objects: Dict[str, str] = jsonasobj.JsonObj()        # Obj_id --> filename
-            super().__init__()
 
-    def __init__(self):
-        super().__init__()
+def _warm_one(builder: Callable[[str], Any], source: str, cache_directory: str, serializer: str,
+              compression: Optional[str], compression_threshold: int, header: dict) -> "index.ObjectInfo":
+    """ Build the object for source and write it to a cache file - run in a worker process by CacheJar.warm """
+    start = time.perf_counter()
+    obj = builder(source)
+    return write_cache_file(cache_directory, obj, serializer, compression, compression_threshold,
+                            time.perf_counter() - start, header)
 
 
 class CacheJar:
+    access_resolution = 60.0            # Access times are only updated (and journaled) at this granularity (seconds)
+    eviction_target = 0.9               # Eviction reduces usage to this fraction of the limit
+    default_serializer = 'pickle'
+    lease_poll_interval = 0.5           # How often processes waiting for another process's build check for it (seconds)
+    orphan_age = 3600.0                 # fsck leaves unreferenced files younger than this alone - they may be in use
+
     cache_index_fname = 'index'
+    cache_journal_fname = 'journal'
+    content_hashes_fname = 'hashes'
+    lock_fname = 'lock'
+    control_fnames = (cache_index_fname, cache_journal_fname, content_hashes_fname, lock_fname)
 
     def __init__(self, keeper: "CacheFactory", appid: str) -> None:
         """ Create an instance that represents cache_dir in cache_path
@@ -37,16 +116,64 @@ class CacheJar:
         :param appid: application id that owns this jar. Must be convertable into a valid file name.
         """
         self.cache_directory = os.path.join(keeper.cache_root, appid)
+        self._appid = appid
         self._cache_directory_index = os.path.join(self.cache_directory, CacheJar.cache_index_fname)
+        self._journal = IndexJournal(os.path.join(self.cache_directory, CacheJar.cache_journal_fname),
+                                     self._cache_directory_index)
         self._globally_disabled = keeper.disabled
         self._locally_disabled = False
+        self.memory_tier: Optional[MemoryTier] = None              # Optional in-memory tier in front of the files
+        # Optional tier behind the files, shared with jars on other machines - see cachejar.sharedtier
+        self.shared_tier: Optional["sharedtier.SharedTier"] = keeper.shared_tier
+        self._background: Set["futures.Future"] = set()     # Shared tier copies and file removals in progress
+        self._background_lock = threading.Lock()
+        self._writes: Optional["writebehind.WriteBehindQueue"] = None     # See write_behind
+        self.max_pending_writes = 100                       # Size of the write-behind queue.  Set before enabling it
+        self.url_signatures: Optional[UrlSignatureCache] = None    # Optional cache of URL signatures
+        self.directory_signer: DirectorySigner = default_directory_signer
+        self._content_signer: Optional[ContentSigner] = None
+        self.max_bytes: Optional[int] = None                # Disk quota for the jar.  None means no limit
+        self.max_entries: Optional[int] = None              # Maximum number of cached objects.  None means no limit
+        self.eviction_policy = 'lru'                        # 'lru' or 'cost' - see eviction_key
+        self.serializer: str = CacheJar.default_serializer  # Name of the serializer used by update
+        self.compression: Optional[str] = None              # Name of the codec used to compress new files
+        self.compression_threshold = 4096                   # Files smaller than this aren't compressed
+        self.max_workers: Optional[int] = None              # Threads used by the batch operations. None: default
+        self._thread_pool: Optional["futures.ThreadPoolExecutor"] = None
+        self._pool_lock = threading.Lock()
+        self._lock: Union[RWLock, NoLock] = NoLock()         # Guards the memory index - see threadsafe
+        self._deferred_removals: Optional[List[str]] = None  # Files to remove later rather than immediately
+        self._identities: Optional["index.IdentityIndex"] = None    # Built when first needed - see _identity_index
+        self._fsck_scan: Optional["fsck.DirectoryScan"] = None       # fsck pass in progress
+        self._fsck_lock = threading.Lock()
+        self._inflight: Dict[tuple, "asyncio.Future"] = {}              # Coalesced asynchronous operations
+        self._computing: Dict[Tuple[str, str], "futures.Future"] = {}   # Objects being built by get_or_compute
+        self._computing_lock = threading.Lock()
+        # Seconds without a heartbeat after which a build lease is considered abandoned. None means that processes
+        # don't coordinate building objects - see get_or_compute
+        self.lease_timeout: Optional[float] = None
+        self.readable_identities = False    # Record the readable form of object identities in the index
+        self._watcher: Optional["watcher.Watcher"] = None                # See watch_sources
+        self._trusted: Dict[str, str] = {}      # name_or_url --> signature that hasn't changed since it was watched
+        self._watch_generation = 0              # Number of changes reported by the watcher
+        self._watch_lock = threading.Lock()
+        self._index_key = (CacheJar.cache_index_fname, self.cache_directory)    # Watcher key for the index files
+        self._index_trusted = False             # The watcher hasn't seen the index or journal change since last check
+        self.total_bytes = 0
+        self.total_objects = 0
+        self._keeper = keeper
         os.makedirs(self.cache_directory, exist_ok=True)
-        if os.path.exists(self._cache_directory_index):
-            self._load_index()
-        else:
-            # _cache maps from a file/url to a CacheEntry, shich is a signature and a set of cached objects
-            self._cache = CacheIndex()
-            self._update_index()
+        # Any number of processes can share a jar.  Changes to the index are made while holding the exclusive lock,
+        # after bringing the memory index up to date with whatever the other processes have done (see _mutating)
+        self._index_lock = FileLock(os.path.join(self.cache_directory, CacheJar.lock_fname))
+        with self._index_lock.exclusive():
+            if os.path.exists(self._cache_directory_index):
+                if self._load_index():
+                    self._update_index()
+            else:
+                # _cache maps from a file/url to a CacheEntry, shich is a signature and a set of cached objects
+                self._cache = index.CacheIndex()
+                self._update_index()
 
     @property
     def disabled(self) -> bool:
@@ -60,29 +187,171 @@ class CacheJar:
         """ Change globally disabled setting """
         self._globally_disabled = val
 
-    @staticmethod
-    def _identity(obj_id: Any, *parms: Any, **kwparms: Any):
-        return str(obj_id) + (str(parms) if parms else '') + (str(kwparms) if kwparms else '')
+    @property
+    def threadsafe(self) -> bool:
+        """ True means that the jar can be shared by any number of threads.  Lookups run concurrently with each
+        other, while updates and invalidations are made one at a time and are atomic with respect to lookups.  Set
+        this before the jar is shared.
+        """
+        return isinstance(self._lock, RWLock)
+
+    @threadsafe.setter
+    def threadsafe(self, val: bool) -> None:
+        self._lock = RWLock() if val else NoLock()
+
+    @property
+    def watch_sources(self) -> bool:
+        """ True means the jar subscribes to change notifications (inotify on Linux, polling elsewhere - see
+        cachejar.watcher) for the files, directories and patterns it validates.  A source that hasn't changed since
+        it was last signed isn't signed again, so a hit becomes an in-memory check.  Urls are still signed on every
+        reference.  If the watcher loses track of changes, every source is re-signed on its next reference.
+        """
+        return self._watcher is not None
+
+    @watch_sources.setter
+    def watch_sources(self, val: bool) -> None:
+        if val and self._watcher is None:
+            self._watcher = watcher.create_watcher(self._source_changed, self._sources_overflowed)
+        elif not val and self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+            with self._watch_lock:
+                self._trusted.clear()
+                self._index_trusted = False
+
+    def _source_changed(self, name_or_url: Any) -> None:
+        """ Watcher callback - name_or_url has to be signed on its next reference """
+        with self._watch_lock:
+            if name_or_url == self._index_key:
+                self._index_trusted = False
+            else:
+                self._trusted.pop(name_or_url, None)
+            self._watch_generation += 1
+
+    def _sources_overflowed(self) -> None:
+        """ Watcher callback - changes have been lost, so everything has to be signed on its next reference """
+        with self._watch_lock:
+            self._trusted.clear()
+            self._index_trusted = False
+            self._watch_generation += 1
+
+    @property
+    def write_behind(self) -> bool:
+        """ True means that update, update_using, update_many, get_or_compute and memoize queue new objects and return
+        without writing them.  A background thread serializes the queued objects, writes their cache files and adds
+        them to the index, one journal write per batch.  Queued objects are returned by lookups in this process right
+        away - other processes see them once they have been written.  Updates block while max_pending_writes objects
+        are queued.  Use flush() to wait for the queue to empty; it is drained when the interpreter exits as well.
+        Enabling write_behind makes the jar threadsafe.
+        """
+        return self._writes is not None
+
+    @write_behind.setter
+    def write_behind(self, val: bool) -> None:
+        if val and self._writes is None:
+            if not self.threadsafe:
+                self.threadsafe = True
+            self._writes = writebehind.WriteBehindQueue(self._write_queued, self.max_pending_writes)
+        elif not val and self._writes is not None:
+            writes = self._writes
+            self._writes = None
+            writes.close()
+            self._raise_write_errors(writes.take_errors())
+
+    @property
+    def signature_mode(self) -> str:
+        """ How files and directories are signed - 'stat' (type, size and modification time) or 'content' (a hash
+        of the file contents).  Changing the mode invalidates existing entries on their next reference.
+        """
+        return 'content' if self._content_signer else 'stat'
+
+    @signature_mode.setter
+    def signature_mode(self, mode: str) -> None:
+        if mode == 'content':
+            if self._content_signer is None:
+                self._content_signer = ContentSigner(os.path.join(self.cache_directory, CacheJar.content_hashes_fname),
+                                                     self.directory_signer.max_workers)
+        elif mode == 'stat':
+            self._content_signer = None
+        else:
+            raise ValueError(f"Unknown signature mode: {mode}")
+
+    def _signature(self, name_or_url: str, expected: Optional[str] = None) -> Optional[str]:
+        """ Return the current signature of name_or_url
+
+        :param name_or_url: file, directory, url or Dependencies
+        :param expected: signature on record.  Lets Dependencies stop at the first member that has changed
+        :return: signature.  None if expected was supplied and Dependencies found it to be out of date
+        """
+        if isinstance(name_or_url, Dependencies):
+            return name_or_url.signature(self._signature, expected)
+        if is_url(name_or_url):
+            return self.url_signatures.signature(name_or_url) if self.url_signatures is not None \
+                else signature(name_or_url)
+        if self._content_signer is not None:
+            return self._content_signer.signature(name_or_url)
+        return self.directory_signer.signature(name_or_url) if os.path.isdir(name_or_url) \
+            else file_signature(name_or_url)
+
+    def _checked_signature(self, name_or_url: str, recorded: Optional[str]) -> Optional[str]:
+        """ _signature, skipping sources that are watched and haven't changed since their signature was recorded """
+        source_watcher = self._watcher
+        if source_watcher is None:
+            return self._signature(name_or_url, recorded)
+        source_watcher.poll()
+        with self._watch_lock:
+            if recorded is not None and self._trusted.get(name_or_url) == recorded:
+                return recorded
+            generation = self._watch_generation
+        # Subscribe before signing, so that any change after the signature is computed is reported
+        sources = name_or_url.sources if isinstance(name_or_url, Dependencies) else [name_or_url]
+        watched = not any(is_url(source) for source in sources) and \
+            all(source_watcher.watch(name_or_url, source) for source in sources)
+        sig = self._signature(name_or_url, recorded)
+        if watched and sig is not None:
+            source_watcher.poll()
+            with self._watch_lock:
+                if self._watch_generation == generation:
+                    self._trusted[name_or_url] = sig
+        return sig
+
+    def _current_signature(self, name_or_url: str) -> str:
+        """ Return the current signature of name_or_url """
+        recorded = self._recorded_signature(name_or_url)
+        sig = self._checked_signature(name_or_url, recorded)
+        return sig if sig is not None else self._checked_signature(name_or_url, None)
+
+    def _identity(self, obj_id: Any, *parms: Any, **kwparms: Any) -> str:
+        """ Return the key that an object is cached under - a fixed size digest of the canonical encoding of obj_id
+        and its parameters (see cachejar.identity).  With readable_identities, the key carries the readable form as
+        well, which _add_object records in the index.
+        """
+        key = identity.object_identity(obj_id, parms, kwparms)
+        if self.readable_identities:
+            key = identity.Identity(key)
+            key.readable = identity.readable_identity(obj_id, parms, kwparms)
+        return key
 
     def object_for(self, name_or_url: str, obj_id: Any, *parms: Any, **kwparms: Any) -> Optional[object]:
         """ Return the object representing the supplied URL or file name
 
-        :param name_or_url: name of file or URI associated with the object
+        :param name_or_url: name of file, directory or URI associated with the object, or the Dependencies it was
+        derived from
         :param obj_id: object identifier
         :param parms: object parameters
         :param kwparms: keyword parameters if any
         :return: object if exists and signature matches
         """
-        if name_or_url in self._cache and not self.disabled:
-            sig = signature(name_or_url)
-            if sig != self._cache[name_or_url].signature:
-                self._clear_cache_entry(name_or_url, sig)
-            obj_identity = self._identity(obj_id, *parms, **kwparms)
-            if obj_identity in self._cache[name_or_url].cached_objects:
-                with open(os.path.join(self.cache_directory,
-                                       self._cache[name_or_url].cached_objects[obj_identity]), 'rb') as f:
-                    return pickle.load(f)
-        return None
+        if self.disabled:
+            return None
+        obj_identity = self._identity(obj_id, *parms, **kwparms)
+        found = self._validated_lookup(name_or_url, obj_identity)
+        if found:
+            present, obj = self._fetch(found)
+            if present:
+                return obj
+        present, obj = self._queued(name_or_url, obj_identity)
+        return obj if present else self._shared_fetch(name_or_url, obj_identity)[1]
 
     def update(self, name_or_url: str, obj: object, obj_id: Any, *parms: Any, **kwparms: Any) -> bool:
         """ Add or update an object in the cache.
@@ -94,25 +363,945 @@ class CacheJar:
         :param kwparms: keyword params as well
         :return: True if cache was updated, false if unable to or update is not needed
         """
+        if self.disabled:
+            return False
+        return self._update(name_or_url, obj, self._identity(obj_id, *parms, **kwparms))
+
+    def update_using(self, serializer: Union[str, Serializer], name_or_url: str, obj: object, obj_id: Any,
+                     *parms: Any, **kwparms: Any) -> bool:
+        """ Add or update an object in the cache using a specific serializer
+
+        :param serializer: serializer or name of registered serializer to use in place of the jar's serializer
+        :param name_or_url: file or url associated with object
+        :param obj: object that represents name
+        :param obj_id: stringifiable object that uniquely represents the item
+        :param parms: additional parameters that render object unique
+        :param kwparms: keyword params as well
+        :return: True if cache was updated, false if unable to or update is not needed
+        """
+        if self.disabled:
+            return False
+        return self._update(name_or_url, obj, self._identity(obj_id, *parms, **kwparms),
+                            serializer=serializer if isinstance(serializer, str) else serializer.name)
+
+    def get_or_compute(self, builder: Callable[[], Any], name_or_url: str, obj_id: Any, *parms: Any,
+                       **kwparms: Any) -> Any:
+        """ Return the cached object, building (and caching) it if it isn't there.  If several threads miss on the
+        same object at once, only one of them runs builder - the others wait for, and share, its result (or
+        exception).  The jar is made threadsafe the first time this is called, so it must not be in use by other
+        threads at that point.  The time it takes to build the object is recorded for the 'cost' eviction policy.
+
+        If lease_timeout is set, processes sharing the jar coordinate as well: the first one to miss takes a lease on
+        the object and builds it, while the others poll for the result.  If the builder fails or the process holding
+        the lease dies, one of the waiting processes takes over.
+
+        Note that a builder that returns None is run on every call, as None can't be told apart from a cache miss.
+
+        :param builder: function that computes the object
+        :param name_or_url: file or url associated with object
+        :param obj_id: object identifier
+        :param parms: object parameters
+        :param kwparms: keyword parameters if any
+        :return: cached or newly built object
+        """
+        return self._get_or_compute(name_or_url, self._identity(obj_id, *parms, **kwparms), builder)
+
+    def memoize(self, source: Union[str, int] = 0, obj_id: Optional[str] = None,
+                record_cost: bool = True) -> Callable[[Callable], Callable]:
+        """ Decorator that caches the results of a function of a file or url (see get_or_compute).
+
+            @jar.memoize('fname')
+            def parse(fname, strict=False): ...
+
+        The source argument becomes name_or_url and the remaining arguments, with defaults filled in, become the
+        object parameters, so they must have a stable string representation.
+
+        :param source: name or position of the argument that names the file or url
+        :param obj_id: object identifier.  Default: the module and qualified name of the function
+        :param record_cost: True means record how long the function took for the 'cost' eviction policy
+        """
+        def decorator(fn: Callable) -> Callable:
+            fn_signature = inspect.signature(fn)
+            source_arg = list(fn_signature.parameters)[source] if isinstance(source, int) else source
+            fn_id = obj_id or f"{fn.__module__}.{fn.__qualname__}"
+
+            @functools.wraps(fn)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                bound = fn_signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = dict(bound.arguments)
+                name_or_url = arguments.pop(source_arg)
+                return self._get_or_compute(name_or_url, self._identity(fn_id, *arguments.values()),
+                                            lambda: fn(*args, **kwargs), record_cost)
+            return wrapper
+        return decorator
+
+    def _get_or_compute(self, name_or_url: str, obj_identity: str, builder: Callable[[], Any],
+                        record_cost: bool = True) -> Any:
+        if not self.threadsafe:
+            with self._computing_lock:                  # Threads making their first call at once switch only once
+                if not self.threadsafe:
+                    self.threadsafe = True
+
+        def cached() -> Tuple[bool, Any]:
+            if self.disabled:
+                return False, None
+            found = self._validated_lookup(name_or_url, obj_identity)
+            present, obj = self._fetch(found) if found else (False, None)
+            if not present:
+                present, obj = self._queued(name_or_url, obj_identity)
+            return (present, obj) if present else self._shared_fetch(name_or_url, obj_identity)
+
+        def build() -> Any:
+            start = time.perf_counter()
+            obj = builder()
+            if not self.disabled:
+                self._update(name_or_url, obj, obj_identity, cost=time.perf_counter() - start if record_cost else None)
+            return obj
+
+        def compute() -> Any:
+            # The object may have been added while we were waiting to get here
+            present, obj = cached()
+            if present:
+                return obj
+            if self.lease_timeout is None or self.disabled:
+                return build()
+            lease = Lease(self._lease_path(name_or_url, obj_identity), self.lease_timeout, self._index_lock.path)
+            while not lease.acquire():
+                time.sleep(self.lease_poll_interval)
+                present, obj = cached()
+                if present:
+                    return obj
+            try:
+                present, obj = cached()             # It may have been finished just before we got the lease
+                return obj if present else build()
+            finally:
+                lease.release()
+
+        present, obj = cached()
+        return obj if present else self._single_flight((name_or_url, obj_identity), compute)
+
+    def _lease_path(self, name_or_url: str, obj_identity: str) -> str:
+        """ Return the path of the lease file for building an object """
+        key = hashlib.blake2b(f"{name_or_url}\0{obj_identity}".encode(), digest_size=16).hexdigest()
+        return os.path.join(self.cache_directory, f'L{key}.lease')
+
+    def _validated_lookup(self, name_or_url: str, obj_identity: str) -> Optional["index.ObjectInfo"]:
+        """ Return the object_info for a cached object whose source hasn't changed, None if there isn't one """
+        recorded = self._recorded_signature(name_or_url)
+        if recorded is None:
+            return None
+        self._validate_entry(name_or_url, self._checked_signature(name_or_url, recorded))
+        return self._lookup(name_or_url, obj_identity)
+
+    def _single_flight(self, key: Tuple[str, str], compute: Callable[[], Any]) -> Any:
+        """ Run compute, unless another thread is already computing key, in which case wait for its result """
+        with self._computing_lock:
+            future = self._computing.get(key)
+            leader = future is None
+            if leader:
+                future = self._computing[key] = futures.Future()
+        if not leader:
+            return future.result()
+        try:
+            result = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._computing_lock:
+                del self._computing[key]
+
+    def object_for_many(self, requests: Iterable[Sequence]) -> List[Optional[object]]:
+        """ Return the objects for a batch of requests.  Each source is signed once, sources are signed concurrently,
+        cache files are read in parallel and all index changes are journaled in a single write.
+
+        :param requests: (name_or_url, obj_id[, parms[, kwparms]]) tuples, where parms is a tuple of positional
+        parameters and kwparms is a dictionary of keyword parameters
+        :return: the object (or None) for each request
+        """
+        requests = [self._batch_request(request) for request in requests]
+        results: List[Optional[object]] = [None] * len(requests)
+        if self.disabled:
+            return results
+        to_load: Dict["index.Blob", Tuple["index.ObjectInfo", List[int]]] = {}   # blob --> (info, request indices)
+        signatures = self._sign_many({r[0] for r in requests if self._has_entry(r[0])})
+
+        def lookup_all() -> None:
+            for i, (name_or_url, obj_identity) in enumerate(requests):
+                found = self._lookup(name_or_url, obj_identity)
+                if found:
+                    to_load.setdefault(found.blob, (found, []))[1].append(i)
+
+        with self._lock.read():
+            current = all(self._cache[name_or_url].signature == sig for name_or_url, sig in signatures.items()
+                          if name_or_url in self._cache)
+        if current:
+            lookup_all()
+        else:
+            with self._mutating():
+                with self._journal.batch():
+                    for name_or_url, sig in signatures.items():
+                        self._validate_entry(name_or_url, sig)
+                    lookup_all()
+                self._compact_if_needed()
+        loaded = self._map(lambda e: self._fetch(e[0]), list(to_load.values()))
+        present: Set[int] = set()
+        for (_, indices), (found, obj) in zip(to_load.values(), loaded):
+            if found:
+                present.update(indices)
+                for i in indices:
+                    results[i] = obj
+        if self._writes is not None:
+            for i, (name_or_url, obj_identity) in enumerate(requests):
+                if i not in present:
+                    found, obj = self._queued(name_or_url, obj_identity)
+                    if found:
+                        present.add(i)
+                        results[i] = obj
+        if self.shared_tier is not None:
+            misses = [i for i in range(len(requests)) if i not in present]
+            for i, (found, obj) in zip(misses, self._shared_fetch_many([requests[i] for i in misses])):
+                results[i] = obj
+        return results
+
+    def update_many(self, updates: Iterable[Sequence]) -> List[bool]:
+        """ Add or update a batch of objects.  Each source is signed once, sources are signed concurrently, cache
+        files are written in parallel and all index changes are journaled in a single write.
+
+        :param updates: (name_or_url, obj, obj_id[, parms[, kwparms]]) tuples, where parms is a tuple of positional
+        parameters and kwparms is a dictionary of keyword parameters
+        :return: True for each object that was added to the cache
+        """
+        updates = [(u[0], u[1], self._batch_request((u[0],) + tuple(u[2:]))[1]) for u in updates]
+        results = [False] * len(updates)
+        if self.disabled:
+            return results
+        signatures = self._sign_many({u[0] for u in updates})
+        if self._writes is not None:
+            return [self._queue_update(name_or_url, obj, obj_identity, signatures[name_or_url])
+                    for name_or_url, obj, obj_identity in updates]
+        self._refresh_index()
+        pending: Dict[Tuple[str, str], int] = {}                        # (name_or_url, identity) --> update index
+        with self._lock.read():
+            for i, (name_or_url, _, obj_identity) in enumerate(updates):
+                if name_or_url not in self._cache or \
+                        self._cache[name_or_url].signature != signatures[name_or_url] or \
+                        obj_identity not in self._cache[name_or_url].objects:
+                    pending.setdefault((name_or_url, obj_identity), i)
+        # Files are written without holding the lock - _commit_blob discards any that are no longer needed
+        written = self._map(lambda i: self._write_blob(updates[i][1], self.serializer, None, self._blob_header(
+            updates[i][0], signatures[updates[i][0]], updates[i][2])), list(pending.values()))
+        with self._mutating():
+            with self._journal.batch():
+                for name_or_url, sig in signatures.items():
+                    self._validate_entry(name_or_url, sig)
+                for ((name_or_url, obj_identity), i), info in zip(pending.items(), written):
+                    results[i] = self._commit_blob(name_or_url, signatures[name_or_url], obj_identity, info,
+                                                   updates[i][1], enforce_quota=False)
+            self._compact_if_needed()
+        self._enforce_quota()
+        return results
+
+    def warm(self, sources: Iterable[str], builder: Callable[[str], Any], obj_id: Optional[Any] = None,
+             max_workers: Optional[int] = None, max_pending: Optional[int] = None,
+             progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, BaseException]:
+        """ Pre-populate the jar with builder(source) for each source that doesn't have an up to date object.
+
+        Objects are built in a pool of worker processes, which write the cache files themselves and only send back
+        their descriptions, so the memory used doesn't depend on the size of the objects.  At most max_pending
+        sources are handed to the pool at a time, and the index is updated once, at the end.  Objects that are in the
+        shared tier are taken from there instead of being built.
+
+        With the default obj_id, the objects are the ones that `jar.memoize()(builder)` would return.  builder must
+        be a module level function, so that it can be sent to the worker processes.
+
+        :param sources: files, directories, urls or Dependencies to build objects for
+        :param builder: function that computes the object for a source
+        :param obj_id: object identifier.  Default: the module and qualified name of builder
+        :param max_workers: number of worker processes.  Default: the number of CPUs
+        :param max_pending: maximum number of sources in the pool at a time.  Default: twice the number of workers
+        :param progress: called with (sources done, sources to build) as each object is finished
+        :return: sources that couldn't be signed or built, with the exception that was raised
+        """
+        failures: Dict[str, BaseException] = {}
+        if self.disabled:
+            return failures
+        obj_identity = self._identity(obj_id or f"{builder.__module__}.{builder.__qualname__}")
+
+        def sign(source: str) -> Tuple[Optional[str], Optional[OSError]]:
+            try:
+                return self._current_signature(source), None
+            except OSError as e:
+                return None, e
+
+        sources = list(dict.fromkeys(sources))
+        signatures: Dict[str, str] = {}
+        for source, (sig, error) in zip(sources, self._map(sign, sources)):
+            if error is not None:
+                failures[source] = error
+            else:
+                signatures[source] = sig
+        self._refresh_index()
+        with self._lock.read():
+            needed = [source for source, sig in signatures.items()
+                      if source not in self._cache or self._cache[source].signature != sig or
+                      obj_identity not in self._cache[source].objects]
+        if self.shared_tier is not None and needed:
+            fetched = self._shared_fetch_many([(source, obj_identity) for source in needed])
+            needed = [source for source, (found, _) in zip(needed, fetched) if not found]
+
+        built: List[Tuple[str, "index.ObjectInfo"]] = []
+        if needed:
+            max_workers = max_workers or os.cpu_count() or 1
+            max_pending = max_pending or 2 * max_workers
+            pending: Dict["futures.Future", str] = {}
+            remaining = iter(needed)
+            ndone = 0
+            with futures.ProcessPoolExecutor(max_workers) as pool:
+                while True:
+                    for source in remaining:
+                        pending[pool.submit(_warm_one, builder, source, self.cache_directory, self.serializer,
+                                            self.compression, self.compression_threshold,
+                                            self._blob_header(source, signatures[source], obj_identity))] = source
+                        if len(pending) >= max_pending:
+                            break
+                    if not pending:
+                        break
+                    finished, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                    for future in finished:
+                        source = pending.pop(future)
+                        try:
+                            built.append((source, future.result()))
+                        except Exception as e:
+                            failures[source] = e
+                        ndone += 1
+                        if progress:
+                            progress(ndone, len(needed))
+
+        if built:
+            with self._mutating():
+                with self._journal.batch():
+                    for source, info in built:
+                        self._validate_entry(source, signatures[source])
+                        self._commit_blob(source, signatures[source], obj_identity, info, None, enforce_quota=False)
+                self._compact_if_needed()
+            self._enforce_quota()
+        return failures
+
+    def export_pack(self, path: str) -> int:
+        """ Write the objects in the jar to a single pack file, which can be opened read-only with
+        cachejar.pack.PackJar or imported into another jar with import_pack.  Objects are packed with the signatures
+        on record, so export a jar whose entries are up to date.  Objects with auxiliary files aren't packed.
+
+        :param path: pack file to write
+        :return: number of objects packed
+        """
+        self._refresh_index()
+        with self._lock.read():
+            entries = [(name_or_url, cache_entry.signature, obj_identity, info)
+                       for name_or_url, cache_entry in self._cache.items()
+                       for obj_identity, info in cache_entry.objects.items()]
+        return pack.write_pack(path, self.signature_mode, entries, self._blob_data)
+
+    def import_pack(self, path: str) -> int:
+        """ Add the objects in a pack written by export_pack to the jar.  Only objects whose sources still have the
+        signatures they were packed with are added, and objects that are already in the jar are left as they are.
+
+        :param path: pack file
+        :return: number of objects added
+        """
+        with pack.PackJar(path) as packed:
+            if packed.signature_mode != self.signature_mode:
+                raise CacheError(f"{path} uses {packed.signature_mode} signatures - jar uses {self.signature_mode}")
+            entries = list(packed.entries())
+            sources = list({name_or_url for name_or_url, *_ in entries})
+            signatures = dict(zip(sources, self._map(lambda source: self._available_signature(
+                Dependencies.from_key(source)), sources)))
+            entries = [entry for entry in entries if entry[1] == signatures[entry[0]]]
+            self._refresh_index()
+            with self._lock.read():
+                entries = [entry for entry in entries if entry[0] not in self._cache or
+                           entry[2] not in self._cache[entry[0]].objects]
+            infos = []
+            for name_or_url, sig, obj_identity, fields, read in entries:
+                infos.append(index.ObjectInfo(index.new_blob(), **fields))
+                self._write_blob_data(infos[-1], read(), self._blob_header(name_or_url, sig, obj_identity))
+        nadded = 0
+        with self._mutating():
+            with self._journal.batch():
+                for (name_or_url, sig, obj_identity, *_), info in zip(entries, infos):
+                    self._validate_entry(name_or_url, sig)
+                    nadded += self._commit_blob(name_or_url, sig, obj_identity, info, None, enforce_quota=False,
+                                                share=False)
+            self._compact_if_needed()
+        self._enforce_quota()
+        return nadded
+
+    def _batch_request(self, request: Sequence) -> Tuple[str, str]:
+        """ Convert a (name_or_url, obj_id[, parms[, kwparms]]) request into (name_or_url, identity) """
+        name_or_url, obj_id = request[0], request[1]
+        parms = request[2] if len(request) > 2 else ()
+        kwparms = request[3] if len(request) > 3 else {}
+        return name_or_url, self._identity(obj_id, *parms, **kwparms)
+
+    def _map(self, fn: Callable[[Any], Any], args: List[Any]) -> List[Any]:
+        """ Apply fn to args, in parallel if there is more than one """
+        if len(args) < 2:
+            return [fn(arg) for arg in args]
+        return list(self._pool().map(fn, args))
+
+    def _pool(self) -> "futures.ThreadPoolExecutor":
+        """ Return the thread pool used for parallel and asynchronous operations """
+        with self._pool_lock:
+            if self._thread_pool is None:
+                self._thread_pool = futures.ThreadPoolExecutor(self.max_workers, thread_name_prefix='cachejar')
+            return self._thread_pool
+
+    def _sign_many(self, sources: Set[str]) -> Dict[str, str]:
+        """ Return the signatures of sources, computed concurrently """
+        sources = list(sources)
+        return dict(zip(sources, self._map(self._current_signature, sources)))
+
+    async def aobject_for(self, name_or_url: str, obj_id: Any, *parms: Any, **kwparms: Any) -> Optional[object]:
+        """ Asynchronous version of object_for.  URL signatures are checked with non-blocking I/O.  File signatures,
+        index reads and updates, reads and deserialization are done in the jar's thread pool, so the event loop isn't
+        held up by another process holding the index lock.  Concurrent lookups of the same object share a single
+        operation.  The jar is made threadsafe on first use.
+        """
+        obj_identity = self._identity(obj_id, *parms, **kwparms)
+        return await self._coalesced(('object_for', name_or_url, obj_identity),
+                                     lambda: self._aobject_for(name_or_url, obj_identity))
+
+    async def _aobject_for(self, name_or_url: str, obj_identity: str) -> Optional[object]:
+        if self.disabled:
+            return None
+        recorded = await self._in_pool(self._recorded_signature, name_or_url)
+        found = None
+        if recorded is not None:
+            sig = await self._asignature(name_or_url, recorded)
+
+            def lookup() -> Optional["index.ObjectInfo"]:
+                if not self._has_entry(name_or_url):
+                    return None
+                self._validate_entry(name_or_url, sig)
+                return self._lookup(name_or_url, obj_identity)
+
+            found = await self._in_pool(lookup)
+        if not found:
+            queued = self._queued_write(name_or_url, obj_identity)
+            if queued is not None:
+                try:
+                    if await self._asignature(name_or_url, queued[0]) == queued[0]:
+                        return queued[1]
+                except OSError:
+                    pass
+            return await self._ashared_fetch(name_or_url, obj_identity)
+        if self.memory_tier is not None and found.blob in self.memory_tier:
+            return self._fetch(found)[1]
+        return (await self._in_pool(self._fetch, found))[1]
+
+    async def _ashared_fetch(self, name_or_url: str, obj_identity: str) -> Optional[object]:
+        """ Asynchronous version of _shared_fetch.  The record is read and added in the jar's thread pool """
+        if self.shared_tier is None:
+            return None
+        try:
+            sig = await self._asignature(name_or_url)
+        except OSError:
+            return None
+        fetched = await self._in_pool(self._shared_get, name_or_url, sig, obj_identity)
+        if fetched is None:
+            return None
+        await self._in_pool(functools.partial(self._commit_blob, name_or_url, sig, obj_identity, *fetched,
+                                              share=False))
+        return fetched[1]
+
+    async def aupdate(self, name_or_url: str, obj: object, obj_id: Any, *parms: Any, **kwparms: Any) -> bool:
+        """ Asynchronous version of update.  Serialization, writing and index updates are done in the jar's thread
+        pool, or by the write-behind thread if write_behind is set.  Concurrent updates that store the very same
+        object under the same identity are coalesced - all callers get the result of the first.
+        """
         if self.disabled:
             return False
         obj_identity = self._identity(obj_id, *parms, **kwparms)
-        sig = signature(name_or_url)
-        if name_or_url not in self._cache:
-            self._cache[name_or_url] = CacheIndex.CacheEntry(sig)
-        if sig != self._cache[name_or_url].signature:
-            self._clear_cache_entry(name_or_url, sig)
-
-        if obj_identity not in self._cache[name_or_url].cached_objects:
-            fname = 'A' + str(uuid.uuid4())
-            fpath = os.path.join(self.cache_directory, fname)
-            with open(fpath, 'wb') as f:
-                pickle.dump(obj, f)
-            self._cache[name_or_url].cached_objects[obj_identity] = fname
-            self._update_index()
-            return True
+        return await self._coalesced(('update', name_or_url, obj_identity, id(obj)),
+                                     lambda: self._aupdate(name_or_url, obj, obj_identity))
+
+    async def _aupdate(self, name_or_url: str, obj: object, obj_identity: str) -> bool:
+        sig = await self._asignature(name_or_url)
+        if self._writes is not None:                # Queueing blocks while the write-behind queue is full
+            return await self._in_pool(self._queue_update, name_or_url, obj, obj_identity, sig)
+
+        def cached() -> bool:
+            self._validate_entry(name_or_url, sig)
+            return self._lookup(name_or_url, obj_identity, record_access=False) is not None
+
+        if await self._in_pool(cached):
+            return False
+        info = await self._in_pool(self._write_blob, obj, self.serializer, None,
+                                   self._blob_header(name_or_url, sig, obj_identity))
+        return await self._in_pool(self._commit_blob, name_or_url, sig, obj_identity, info, obj)
+
+    async def aclean(self, name_or_url: str=None, obj_id: Any=None, *parms: Any, **kwparms: Any) -> int:
+        """ Asynchronous version of clean.  Waiting for write-behind updates, updating the index and removing the
+        files are all done in the jar's thread pool.
+        """
+        identities = [self._identity(obj_id, *parms, **kwparms)] if obj_id is not None else None
+        nremoved, removals = await self._in_pool(self._clean, name_or_url, identities)
+        await self._in_pool(self._remove_files, removals)
+        return nremoved
+
+    async def _asignature(self, name_or_url: str, expected: Optional[str] = None) -> Optional[str]:
+        """ Return the current signature of name_or_url without blocking the event loop (see _signature) """
+        if is_url(name_or_url) and not isinstance(name_or_url, Dependencies):
+            return await self.url_signatures.asignature(name_or_url) if self.url_signatures is not None \
+                else await async_url_signature(name_or_url)
+        return await self._in_pool(self._checked_signature, name_or_url, expected)
+
+    async def _in_pool(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """ Run fn(*args) in the jar's thread pool.  Concurrent async operations read and change the index on
+        different threads, so the jar is made threadsafe first """
+        if not self.threadsafe:
+            self.threadsafe = True
+        return await asyncio.get_event_loop().run_in_executor(self._pool(), fn, *args)
+
+    async def _coalesced(self, key: tuple, operation: Callable[[], Any]) -> Any:
+        """ Run operation, unless an operation with the same key is already running, in which case share its result
+        """
+        key = (id(asyncio.get_event_loop()),) + key
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(operation())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    def _update(self, name_or_url: str, obj: object, obj_identity: str, cost: Optional[float] = None,
+                serializer: Optional[str] = None) -> bool:
+        """ Add or update an object in the cache
+
+        :param name_or_url: file or url associated with object
+        :param obj: object that represents name
+        :param obj_identity: object identity
+        :param cost: time in seconds that it took to compute obj, if known
+        :param serializer: name of the serializer to use.  Default: self.serializer
+        :return: True if cache was updated
+        """
+        sig = self._current_signature(name_or_url)
+        if self._writes is not None:
+            return self._queue_update(name_or_url, obj, obj_identity, sig, cost, serializer)
+        self._validate_entry(name_or_url, sig)
+        if self._lookup(name_or_url, obj_identity, record_access=False):
+            return False
+        info = self._write_blob(obj, serializer or self.serializer, cost,
+                                self._blob_header(name_or_url, sig, obj_identity))
+        return self._commit_blob(name_or_url, sig, obj_identity, info, obj)
+
+    def _queue_update(self, name_or_url: str, obj: object, obj_identity: str, sig: str,
+                      cost: Optional[float] = None, serializer: Optional[str] = None) -> bool:
+        """ Queue an update for the write-behind thread (see write_behind)
+
+        :return: True if the object was queued, False if it is already cached or queued
+        """
+        with self._lock.read():
+            cache_entry = self._cache.get(name_or_url)
+            if cache_entry is not None and cache_entry.signature == sig and obj_identity in cache_entry.objects:
+                return False
+        queued = self._queued_write(name_or_url, obj_identity)
+        if queued is not None and queued[0] == sig:
+            return False
+        self._writes.put((name_or_url, obj_identity), (sig, obj, cost, serializer or self.serializer))
+        return True
+
+    def _queued_write(self, name_or_url: str, obj_identity: str) -> Optional[tuple]:
+        """ Return the (signature, object, cost, serializer) of a queued update, None if there isn't one """
+        writes = self._writes
+        return writes.get((name_or_url, obj_identity)) if writes is not None else None
+
+    def _queued(self, name_or_url: str, obj_identity: str) -> Tuple[bool, object]:
+        """ Look for an object that is waiting to be written in the write-behind queue
+
+        :return: (found, object) - found is False if the object isn't queued or its source has changed since
+        """
+        queued = self._queued_write(name_or_url, obj_identity)
+        if queued is None:
+            return False, None
+        try:
+            current = self._checked_signature(name_or_url, queued[0])
+        except OSError:
+            return False, None
+        return (True, queued[1]) if current == queued[0] else (False, None)
+
+    def _write_queued(self, batch: List[Tuple[Tuple[str, str], tuple]]) -> List[BaseException]:
+        """ Write-behind thread - write the cache files for a batch of queued updates and add them to the index in a
+        single journal write.  Objects whose sources have changed since they were queued are dropped.
+
+        :param batch: ((name_or_url, identity), (signature, object, cost, serializer)) for each update
+        :return: errors for the objects that couldn't be written
+        """
+        errors: List[BaseException] = []
+        written = []
+        for (name_or_url, obj_identity), (sig, obj, cost, serializer) in batch:
+            try:
+                written.append((name_or_url, obj_identity, sig, obj,
+                                self._write_blob(obj, serializer, cost,
+                                                 self._blob_header(name_or_url, sig, obj_identity))))
+            except Exception as e:
+                errors.append(e)
+        # Sources are checked after the files are written, as close as possible to adding them to the index
+        sources = list({name_or_url for name_or_url, *_ in written})
+        signatures = dict(zip(sources, map(self._available_signature, sources)))
+        if written:
+            with self._mutating():
+                with self._journal.batch():
+                    for name_or_url, obj_identity, sig, obj, info in written:
+                        if signatures[name_or_url] == sig and not self.disabled:
+                            self._validate_entry(name_or_url, sig)
+                            self._commit_blob(name_or_url, sig, obj_identity, info, obj, enforce_quota=False)
+                        else:
+                            self._remove_files(self._blob_paths(info))
+                self._compact_if_needed()
+            self._enforce_quota()
+        return errors
+
+    def flush(self) -> None:
+        """ Wait until every object in the write-behind queue has been written and added to the index, and until
+        any copies to the shared tier and file removals that are in progress have finished.
+
+        :raises CacheError: if any queued objects couldn't be written since the last flush
+        """
+        writes = self._writes
+        if writes is not None:
+            writes.drain()
+            self._raise_write_errors(writes.take_errors())
+        self.wait_for_background()
+
+    @staticmethod
+    def _raise_write_errors(errors: List[BaseException]) -> None:
+        if errors:
+            raise CacheError(f"{len(errors)} queued object(s) could not be written") from errors[0]
+
+    def _drain_writes(self) -> None:
+        """ Wait for the write-behind queue to empty, so that queued objects can't reappear after a clean """
+        writes = self._writes
+        if writes is not None:
+            writes.drain()
+
+    def _commit_blob(self, name_or_url: str, sig: str, obj_identity: str, info: "index.ObjectInfo", obj: object,
+                     enforce_quota: bool = True, share: bool = True) -> bool:
+        """ Add a newly written cache file to the index.  The index may have been changed (by us or by another
+        process) while the file was being written, in which case the file is discarded if it is no longer needed.
+
+        :param share: False means the object came from the shared tier, so it isn't copied back to it
+        :return: True if the object was added
+        """
+        with self._mutating():
+            if name_or_url not in self._cache:
+                self._validate_entry(name_or_url, sig)
+            cache_entry = self._cache[name_or_url]
+            if cache_entry.signature != sig or obj_identity in cache_entry.objects:
+                self._remove_files(self._blob_paths(info))
+                return False
+            self._add_object(name_or_url, obj_identity, info, obj)
+        if share and self.shared_tier is not None:
+            self._share(name_or_url, sig, obj_identity, info)
+        if enforce_quota:
+            self._enforce_quota(protect=(name_or_url, obj_identity))
+        return True
+
+    def _shared_key(self, name_or_url: str, sig: str, obj_identity: str) -> str:
+        """ Return the key that an object is stored under in the shared tier """
+        return hashlib.blake2b(f"{self._appid}\0{name_or_url}\0{sig}\0{obj_identity}".encode(),
+                               digest_size=16).hexdigest()
+
+    def _share(self, name_or_url: str, sig: str, obj_identity: str, info: "index.ObjectInfo") -> None:
+        """ Copy a newly added object to the shared tier in the background """
+        self._in_background(self._copy_to_shared, self.shared_tier, self._shared_key(name_or_url, sig, obj_identity),
+                            info)
+
+    def _in_background(self, fn: Callable, *args: Any) -> "futures.Future":
+        """ Run fn(*args) in the jar's thread pool, keeping track of it for wait_for_background """
+        with self._background_lock:
+            future = self._pool().submit(fn, *args)
+            self._background.add(future)
+        future.add_done_callback(self._background_done)
+        return future
+
+    def _background_done(self, future: "futures.Future") -> None:
+        with self._background_lock:
+            self._background.discard(future)
+
+    def _copy_to_shared(self, tier: "sharedtier.SharedTier", key: str, info: "index.ObjectInfo") -> None:
+        data = self._blob_data(info)
+        if data is not None:
+            metadata = info.as_dict()
+            del metadata['atime']
+            tier.put(key, sharedtier.encode_record(metadata, data))
+
+    def _blob_data(self, info: "index.ObjectInfo") -> Optional[bytes]:
+        """ Return the contents of the cache file for an object that is to be copied somewhere else, without its header
+
+        :return: contents.  None if the file has been removed, or if the object has auxiliary files - only objects that
+        live in a single file are copied
+        """
+        fpath = os.path.join(self.cache_directory, info.fname)
+        if any(os.path.exists(path) for path in self._blob_serializer(info).aux_files(fpath)):
+            return None
+        try:
+            with open(fpath, 'rb') as f:
+                index.read_blob_header(f)
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_blob_data(self, info: "index.ObjectInfo", data: bytes, header: dict) -> None:
+        """ Write the contents of a cache file that has been copied from somewhere else to info's file
+
+        :param info: object_info for the file.  Its size is set to the size of the file
+        :param data: contents, as returned by _blob_data
+        :param header: source, signature and identity of the object (see _blob_header)
+        """
+        fpath = os.path.join(self.cache_directory, info.fname)
+        with open(fpath + '.tmp', 'wb') as f:
+            index.write_blob_header(f, header, info)
+            f.write(data)
+            info.size = f.tell()
+        os.replace(fpath + '.tmp', fpath)
+
+    def wait_for_background(self) -> None:
+        """ Wait for any copies to the shared tier and file removals that are in progress """
+        with self._background_lock:
+            pending = list(self._background)
+        futures.wait(pending)
+
+    def _available_signature(self, name_or_url: str) -> Optional[str]:
+        """ Return the current signature of name_or_url, None if it can't be signed (e.g. it doesn't exist) """
+        try:
+            return self._current_signature(name_or_url)
+        except OSError:
+            return None
+
+    def _shared_get(self, name_or_url: str, sig: Optional[str], obj_identity: str) \
+            -> Optional[Tuple["index.ObjectInfo", object]]:
+        """ Read an object from the shared tier into a new cache file.  The file isn't added to the index.
+
+        :return: (object_info, object) if the shared tier has the object, None otherwise
+        """
+        if sig is None:
+            return None
+        try:
+            record = self.shared_tier.get(self._shared_key(name_or_url, sig, obj_identity))
+        except OSError:
+            return None
+        if record is None:
+            return None
+        try:
+            metadata, data = sharedtier.decode_record(record)
+            info = index.ObjectInfo(index.new_blob(), **metadata)
+        except (ValueError, TypeError):
+            try:
+                self.shared_tier.delete(self._shared_key(name_or_url, sig, obj_identity))
+            except OSError:
+                pass
+            return None                         # Damaged, or written by an incompatible version
+        self._write_blob_data(info, data, self._blob_header(name_or_url, sig, obj_identity))
+        return info, self._load_blob(info)
+
+    def _shared_fetch_many(self, requests: List[Tuple[str, str]]) -> List[Tuple[bool, object]]:
+        """ Look for objects that aren't in the jar in the shared tier, adding the ones that are there to the jar.
+        Records are read in parallel.
+
+        :param requests: (name_or_url, identity) of each object
+        :return: (found, object) for each request
+        """
+        if self.shared_tier is None or self.disabled:
+            return [(False, None)] * len(requests)
+        sources = list({name_or_url for name_or_url, _ in requests})
+        signatures = dict(zip(sources, self._map(self._available_signature, sources)))
+        fetched = self._map(lambda r: self._shared_get(r[0], signatures[r[0]], r[1]), requests)
+        results = []
+        for (name_or_url, obj_identity), got in zip(requests, fetched):
+            if got is None:
+                results.append((False, None))
+            else:
+                self._commit_blob(name_or_url, signatures[name_or_url], obj_identity, *got, share=False)
+                results.append((True, got[1]))
+        return results
+
+    def _shared_fetch(self, name_or_url: str, obj_identity: str) -> Tuple[bool, object]:
+        """ Look for an object that isn't in the jar in the shared tier, adding it to the jar if it is there
+
+        :return: (found, object)
+        """
+        return self._shared_fetch_many([(name_or_url, obj_identity)])[0]
+
+    def _validate_entry(self, name_or_url: str, sig: Optional[str]) -> None:
+        """ Make sure there is an entry for name_or_url whose signature is sig, discarding any objects that were
+        cached under a different signature.  A signature of None means that the entry is out of date, but its new
+        signature isn't known (see _signature) - any existing entry is removed """
+        with self._lock.read():
+            if name_or_url in self._cache and sig == self._cache[name_or_url].signature:
+                return
+        with self._mutating():
+            if name_or_url not in self._cache:
+                if sig is not None:
+                    self._cache[name_or_url] = index.CacheEntry(sig)
+                    self._log(('s', name_or_url, sig))
+            elif sig != self._cache[name_or_url].signature:
+                self._clear_cache_entry(name_or_url, sig)
+
+    def _write_blob(self, obj: object, serializer: str, cost: Optional[float] = None,
+                    header: Optional[dict] = None) -> "index.ObjectInfo":
+        """ Serialize obj to a new cache file
+
+        :param obj: object to write
+        :param serializer: name of the serializer to use
+        :param cost: time in seconds that it took to compute obj, if known
+        :param header: source, signature and identity of the object (see _blob_header)
+        :return: object_info for the new file
+        """
+        return write_cache_file(self.cache_directory, obj, serializer, self.compression, self.compression_threshold,
+                                cost, header)
+
+    @staticmethod
+    def _blob_header(name_or_url: str, sig: str, obj_identity: str) -> dict:
+        """ Return what a cache file records about the object in it, so that the index can be rebuilt from the files
+        (see fsck) """
+        header = dict(source=str(name_or_url), signature=sig, identity=str(obj_identity))
+        if isinstance(obj_identity, identity.Identity):
+            header['label'] = obj_identity.readable
+        return header
+
+    def _add_object(self, name_or_url: str, obj_identity: str, info: "index.ObjectInfo", obj: object) -> None:
+        """ Add a newly written cache file to the index """
+        if isinstance(obj_identity, identity.Identity):
+            info.label = obj_identity.readable
+            obj_identity = str(obj_identity)
+        if self.memory_tier is not None and obj is not None:     # warm doesn't have the object in this process
+            self.memory_tier.put(info.blob, obj, info.size)
+        self._cache[name_or_url].objects[obj_identity] = info
+        if self._identities is not None:
+            self._identities.add(name_or_url, obj_identity)
+        self.total_bytes += info.size
+        self.total_objects += 1
+        self._log(('a', name_or_url, obj_identity, info.blob, info.as_dict()))
+
+    def set_cost(self, name_or_url: str, cost: float, obj_id: Any, *parms: Any, **kwparms: Any) -> bool:
+        """ Record the time it took to compute a cached object, for use by the 'cost' eviction policy
+
+        :param name_or_url: file or url associated with object
+        :param cost: compute time in seconds
+        :param obj_id: object identifier
+        :param parms: object parameters
+        :param kwparms: keyword parameters if any
+        :return: True if the object is in the cache
+        """
+        obj_identity = self._identity(obj_id, *parms, **kwparms)
+        with self._mutating():
+            if name_or_url in self._cache and obj_identity in self._cache[name_or_url].objects:
+                self._cache[name_or_url].objects[obj_identity].cost = cost
+                self._log(('i', name_or_url, obj_identity, {'cost': cost}))
+                return True
         return False
 
+    def _has_entry(self, name_or_url: str) -> bool:
+        """ Determine whether there is an up to date entry for name_or_url """
+        return self._recorded_signature(name_or_url) is not None
+
+    def _recorded_signature(self, name_or_url: str) -> Optional[str]:
+        """ Return the signature of the entry for name_or_url, None if there isn't one """
+        self._refresh_index()
+        with self._lock.read():
+            cache_entry = self._cache.get(name_or_url)
+            return cache_entry.signature if cache_entry is not None else None
+
+    def _lookup(self, name_or_url: str, obj_identity: str, record_access: bool = True) \
+            -> Optional["index.ObjectInfo"]:
+        """ Return the object_info of a cached object, noting that it has been referenced
+
+        :return: object_info or None if the object isn't cached
+        """
+        with self._lock.read():
+            if name_or_url not in self._cache or obj_identity not in self._cache[name_or_url].objects:
+                return None
+            info = self._cache[name_or_url].objects[obj_identity]
+            stale = time.time() - info.atime >= self.access_resolution
+        if record_access and stale:
+            self._record_access(name_or_url, obj_identity)
+        return info
+
+    def _fetch(self, info: "index.ObjectInfo") -> Tuple[bool, object]:
+        """ Return the object described by info, from the memory tier if it is there
+
+        :return: (found, object) - found is False if the file has been removed by another process
+        """
+        if self.memory_tier is not None:
+            found, obj = self.memory_tier.get(info.blob)
+            if found:
+                return True, obj
+        try:
+            obj = self._load_blob(info)
+        except FileNotFoundError:
+            return False, None
+        if self.memory_tier is not None:
+            self.memory_tier.put(info.blob, obj, info.size)
+        return True, obj
+
+    def _record_access(self, name_or_url: str, obj_identity: str) -> None:
+        """ Note that an object has been referenced """
+        now = time.time()
+        with self._lock.read():
+            stale = name_or_url in self._cache and obj_identity in self._cache[name_or_url].objects and \
+                now - self._cache[name_or_url].objects[obj_identity].atime >= self.access_resolution
+        if stale:
+            with self._mutating():
+                if name_or_url in self._cache and obj_identity in self._cache[name_or_url].objects:
+                    self._cache[name_or_url].objects[obj_identity].atime = now
+                    self._log(('i', name_or_url, obj_identity, {'atime': now}))
+
+    def _eviction_candidates(self) -> Iterator[Tuple[str, str, "index.ObjectInfo"]]:
+        """ Generate (name_or_url, obj_identity, info) for every cached object """
+        for name_or_url, cache_entry in self._cache.items():
+            for obj_identity, info in cache_entry.objects.items():
+                yield name_or_url, obj_identity, info
+
+    def _over_quota(self, fraction: float = 1.0) -> bool:
+        return (self.max_bytes is not None and self.total_bytes > self.max_bytes * fraction) or \
+               (self.max_entries is not None and self.total_objects > self.max_entries * fraction)
+
+    def _enforce_quota(self, protect: Optional[Tuple[str, str]] = None) -> int:
+        """ Evict objects until the jar (and the owning factory) are within their limits.  Once over a limit we evict
+        down to eviction_target of it, so the cost of choosing victims is spread over a number of updates.
+
+        :param protect: (name_or_url, identity) of an object that must not be evicted
+        :return: number of objects evicted
+        """
+        nevicted = 0
+        if self._over_quota():
+            with self._mutating():
+                candidates = sorted((c for c in self._eviction_candidates() if c[:2] != protect),
+                                    key=lambda c: eviction_key(self.eviction_policy, c[2]))
+                with self._journal.batch():
+                    for name_or_url, obj_identity, _ in candidates:
+                        if not self._over_quota(self.eviction_target):
+                            break
+                        self._evict(name_or_url, obj_identity)
+                        nevicted += 1
+                self._compact_if_needed()
+        return nevicted + self._keeper._enforce_quota(protect=(self, protect))
+
+    def _evict(self, name_or_url: str, obj_identity: str) -> None:
+        """ Remove a single cached object """
+        cache_entry = self._cache[name_or_url]
+        self._remove_blob(name_or_url, obj_identity)
+        self._log(('d', name_or_url, obj_identity))
+        if not cache_entry.objects:
+            del self._cache[name_or_url]
+            self._log(('r', name_or_url))
+
     def _clear_cache_entry(self, name_or_url: str, new_signature: Optional[str], update_index=True) -> None:
         """ Remove all cache files for the supplied cache entry
 
@@ -120,20 +1309,18 @@ class CacheJar:
         :param new_signature: signature to replace (None means remove entire entry)
         :param update_index: False means we'll catch the update later on
         """
-        cache_entry = self._cache[name_or_url]
-        for _, fname in items(cache_entry.cached_objects):
-            fpath = os.path.join(self.cache_directory, fname)
-            if os.path.exists(fpath):
-                os.remove(fpath)
+        for obj_identity in list(self._cache[name_or_url].objects):
+            self._remove_blob(name_or_url, obj_identity)
         if new_signature:
-            self._cache[name_or_url] = CacheIndex.CacheEntry(new_signature)
+            self._cache[name_or_url] = index.CacheEntry(new_signature)
         else:
             del self._cache[name_or_url]
         if update_index:
-            self._update_index()
+            self._log(('s', name_or_url, new_signature) if new_signature else ('r', name_or_url))
 
     def clean(self, name_or_url: str=None, obj_id: Any=None, *parms: Any, **kwparms: Any) -> int:
-        """ Remove outdated entries for file or url name or obj_id
+        """ Remove outdated entries for file or url name or obj_id.  The index is updated immediately, the files are
+        removed in the background.
 
         :param name_or_url: File name or url. If present, just remove entries for this file
         :param obj_id: object identifier.  If present, remove entries for it combined with the parameters.
@@ -141,36 +1328,343 @@ class CacheJar:
         :param kwparms: named parameters
         :return: number of entries removed
         """
-        nremoved = 0
-        obj_identity = self._identity(obj_id, *parms, **kwparms) if obj_id is not None else None
-        for ename_or_url, cache_entry in list(items(self._cache)):        # Lists to prevent dynamic update
-            if name_or_url is None or ename_or_url == name_or_url:
-                for cached_obj_id, fname in list(items(cache_entry.cached_objects)):
-                    if obj_identity is None or obj_identity == cached_obj_id:
-                        fpath = os.path.join(self.cache_directory, fname)
-                        if os.path.exists(fpath):
-                            os.remove(fpath)
-                        nremoved += 1
-                        del self._cache[ename_or_url].cached_objects[cached_obj_id]
-                    if not self._cache[ename_or_url].cached_objects:
-                        del self._cache[ename_or_url]
-        self._update_index()
+        identities = [self._identity(obj_id, *parms, **kwparms)] if obj_id is not None else None
+        nremoved, removals = self._clean(name_or_url, identities)
+        if removals:
+            self._in_background(self._remove_files, removals)
         return nremoved
 
+    def clean_variants(self, obj_id: Any, name_or_url: Optional[str] = None) -> int:
+        """ Remove the objects for obj_id, whatever their parameters.  The files are removed in the background.
+
+        :param obj_id: object identifier
+        :param name_or_url: File name or url. If present, just remove objects cached for it
+        :return: number of objects removed
+        """
+        prefix = identity.identity_prefix(obj_id)
+        with self._mutating():
+            identities = self._identity_index().identities(prefix)
+        nremoved, removals = self._clean(name_or_url, identities)
+        if removals:
+            self._in_background(self._remove_files, removals)
+        return nremoved
+
+    def _identity_index(self) -> "index.IdentityIndex":
+        """ Return the secondary index of object identities, building it if this is the first time it is needed.
+        Must be called with the write lock held """
+        if self._identities is None:
+            self._identities = index.IdentityIndex(self._cache, identity.PREFIX_LENGTH)
+        return self._identities
+
+    def _clean(self, name_or_url: Optional[str], identities: Optional[List[str]]) -> Tuple[int, List[str]]:
+        """ Remove objects from the index
+
+        :param name_or_url: source to remove objects for.  None means all sources
+        :param identities: identities of the objects to remove.  None means all objects
+        :return: number of objects removed, files to remove
+        """
+        nremoved = 0
+        self._drain_writes()
+        with self._mutating():
+            if name_or_url is not None:
+                targets = [(name_or_url, identities)] if name_or_url in self._cache else []
+            elif identities is not None:
+                by_source: Dict[str, List[str]] = {}
+                for obj_identity in identities:
+                    for source in self._identity_index().sources(obj_identity):
+                        by_source.setdefault(source, []).append(obj_identity)
+                targets = list(by_source.items())
+            else:
+                targets = [(source, None) for source in self._cache]
+            removals = self._deferred_removals = []
+            try:
+                with self._journal.batch():
+                    for source, source_identities in targets:
+                        objects = self._cache[source].objects
+                        for obj_identity in list(objects) if source_identities is None else source_identities:
+                            if obj_identity in objects:
+                                self._remove_blob(source, obj_identity)
+                                nremoved += 1
+                                self._log(('d', source, obj_identity))
+                        if not objects:
+                            del self._cache[source]
+                            self._log(('r', source))
+            finally:
+                self._deferred_removals = None
+            self._compact_if_needed()
+        return nremoved, removals
+
+    def fsck(self, repair: bool = True, time_budget: Optional[float] = None) -> "fsck.FsckReport":
+        """ Check the jar directory against the index with a single pass over the directory.  This finds orphans -
+        cache files that nothing refers to, left behind by processes that died between writing a file and adding it
+        to the index, and abandoned temporary files - and dangling objects, whose cache files are missing.  With
+        repair, orphans older than orphan_age are removed and dangling objects are dropped from the index.
+
+        With a time budget, the pass stops once the budget has been spent and the next call carries on from where it
+        left off, so a large jar can be checked a slice at a time (see fsck_in_background).  Only the final slice
+        looks at the index.
+
+        :param repair: False means just report what was found
+        :param time_budget: seconds to spend scanning the directory.  None means scan all of it
+        :return: report.  It is empty, with complete set to False, if the budget ran out before the pass finished
+        """
+        with self._fsck_lock:
+            if self._fsck_scan is None:
+                self._fsck_scan = fsck.DirectoryScan(self.cache_directory)
+            scan = self._fsck_scan
+            if not scan.step(None if time_budget is None else time.monotonic() + time_budget):
+                return fsck.FsckReport(scan.scanned, complete=False)
+            self._fsck_scan = None
+        return self._fsck_finish(scan, repair)
+
+    def fsck_in_background(self, repair: bool = True, time_budget: float = 0.05,
+                           pause: float = 0.05) -> "futures.Future":
+        """ Run fsck in the jar's thread pool, time_budget seconds at a time with pause seconds between slices.  The
+        jar is made threadsafe, as the scan runs alongside the caller's own use of it.
+
+        :return: future for the final report
+        """
+        if not self.threadsafe:
+            self.threadsafe = True
+        return self._in_background(self._fsck_slices, repair, time_budget, pause)
+
+    def _fsck_slices(self, repair: bool, time_budget: float, pause: float) -> "fsck.FsckReport":
+        while True:
+            report = self.fsck(repair, time_budget)
+            if report.complete:
+                return report
+            time.sleep(pause)
+
+    def _fsck_finish(self, scan: "fsck.DirectoryScan", repair: bool) -> "fsck.FsckReport":
+        """ Compare a complete scan with the index and make any repairs """
+        report = fsck.FsckReport(scan.scanned)
+        if not repair:
+            self._refresh_index()
+        with self._mutating() if repair else self._lock.read():
+            referenced: Dict[str, Tuple[str, str]] = {}            # file name --> (name_or_url, identity)
+            for name_or_url, cache_entry in self._cache.items():
+                for obj_identity, info in cache_entry.objects.items():
+                    referenced[info.fname] = (name_or_url, obj_identity)
+            # Files written since the scan went past them are referenced but weren't seen, so check again
+            report.dangling = [referenced[fname] for fname in referenced.keys() - scan.blobs.keys()
+                               if not os.path.exists(os.path.join(self.cache_directory, fname))]
+            candidates = [names for fname, names in scan.blobs.items() if fname not in referenced] + \
+                [[name] for name in scan.temporary]
+            cutoff = time.time() - self.orphan_age
+            for names in candidates:
+                try:
+                    if os.stat(os.path.join(self.cache_directory, names[0])).st_mtime <= cutoff:
+                        report.orphans += names
+                except FileNotFoundError:
+                    pass
+            if repair:
+                with self._journal.batch():
+                    for name_or_url, obj_identity in report.dangling:
+                        self._evict(name_or_url, obj_identity)
+                self._compact_if_needed()
+                self._remove_files([os.path.join(self.cache_directory, name) for name in report.orphans])
+                report.repaired = True
+        return report
+
+    def _remove_blob(self, name_or_url: str, obj_identity: str) -> None:
+        """ Remove a cached object from the entry for name_or_url, along with its file and any in-memory image of it
+        """
+        info = self._cache[name_or_url].objects.pop(obj_identity)
+        if self._identities is not None:
+            self._identities.discard(name_or_url, obj_identity)
+        if self.memory_tier is not None:
+            self.memory_tier.discard(info.blob)
+        self.total_bytes -= info.size
+        self.total_objects -= 1
+        paths = self._blob_paths(info)
+        if self._deferred_removals is not None:
+            self._deferred_removals.extend(paths)
+        else:
+            self._remove_files(paths)
+
+    def _blob_paths(self, info: "index.ObjectInfo") -> List[str]:
+        """ Return the paths of the cache file and any auxiliary files for an object """
+        fpath = os.path.join(self.cache_directory, info.fname)
+        return [fpath] + self._blob_serializer(info).aux_files(fpath)
+
+    @staticmethod
+    def _remove_files(paths: List[str]) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _load_blob(self, info: "index.ObjectInfo") -> object:
+        """ Read the object described by info, decompressing it if necessary """
+        fpath = os.path.join(self.cache_directory, info.fname)
+        with open(fpath, 'rb') as f:
+            index.read_blob_header(f)
+            codec = info.codec
+            if codec:
+                return self._blob_serializer(info).load(io.BytesIO(get_codec(codec).decompress(f.read())), fpath)
+            return self._blob_serializer(info).load(f, fpath)
+
+    @staticmethod
+    def _blob_serializer(info: "index.ObjectInfo") -> Serializer:
+        """ Return the serializer that wrote the object described by info """
+        return get_serializer(info.serializer or CacheJar.default_serializer)
+
+    def _log(self, *records: tuple) -> None:
+        """ Record index mutations that have already been applied to the memory index in the journal """
+        self._journal.append(*records)
+        self._compact_if_needed()
+
+    def _compact_if_needed(self) -> None:
+        if self._journal.needs_compaction:
+            self._update_index()
+
+    def _refresh_index(self, use_watcher: bool = True) -> None:
+        """ Bring the memory index up to date with any changes that other processes have made.  This costs a couple
+        of stat calls when nothing has changed, a read of the new journal records when something has, and a reload
+        when another process has written a new snapshot.  With a synchronous watcher (see watch_sources) the stat
+        calls are skipped as well, as long as the index and journal haven't been touched since they were last checked.
+        Must not be called while holding the read lock.
+
+        :param use_watcher: False means always check the files - used when the index is about to be changed
+        """
+        source_watcher = self._watcher if use_watcher else None
+        if source_watcher is not None and source_watcher.synchronous:
+            source_watcher.poll()
+            with self._watch_lock:
+                if self._index_trusted:
+                    return
+                generation = self._watch_generation
+            watched = source_watcher.watch(self._index_key, self._journal.snapshot_path) and \
+                source_watcher.watch(self._index_key, self._journal.journal_path)
+        else:
+            watched = False
+        if self._journal.status() != 'current':
+            with self._lock.write(), self._index_lock.shared():
+                status = self._journal.status()
+                if status == 'reload':
+                    self._load_index()
+                elif status == 'tail':
+                    for record in self._journal.records(tail=True):
+                        self._apply(record)
+        if watched:
+            source_watcher.poll()
+            with self._watch_lock:
+                if self._watch_generation == generation:
+                    self._index_trusted = True
+
+    @contextmanager
+    def _mutating(self) -> Iterator[None]:
+        """ Hold the write and exclusive file locks, with an up to date memory index, for the duration of a change
+        to the index """
+        with self._lock.write(), self._index_lock.exclusive():
+            self._refresh_index(use_watcher=False)
+            yield
+
+    def _apply(self, record: list) -> None:
+        """ Apply a journal record to the memory index
+
+        :param record: ('s', name_or_url, signature) - (re)set the entry for name_or_url, dropping any cached objects
+                       ('a', name_or_url, identity, blob, info) - add a cached object
+                       ('d', name_or_url, identity) - remove a cached object
+                       ('r', name_or_url) - remove the entry for name_or_url
+                       ('i', name_or_url, identity, info) - update the object_info for a cached object
+        """
+        op, name_or_url = record[0], record[1]
+        if op == 's':
+            if name_or_url in self._cache:
+                self._forget_entry(name_or_url)
+            self._cache[name_or_url] = index.CacheEntry(record[2])
+        elif name_or_url in self._cache:
+            cache_entry = self._cache[name_or_url]
+            if op == 'a':
+                self._forget_object(name_or_url, record[2])
+                if len(record) > 4:
+                    cache_entry.objects[record[2]] = index.ObjectInfo(record[3], **record[4])
+                    self.total_bytes += record[4]['size']
+                    self.total_objects += 1
+                else:
+                    cache_entry.objects[record[2]] = index.ObjectInfo(record[3], None)     # Filled in by _tally
+                if self._identities is not None:
+                    self._identities.add(name_or_url, record[2])
+            elif op == 'd':
+                self._forget_object(name_or_url, record[2])
+            elif op == 'r':
+                self._forget_entry(name_or_url)
+                del self._cache[name_or_url]
+            elif op == 'i':
+                info = cache_entry.objects.get(record[2])
+                if info is not None:
+                    for k, v in record[3].items():
+                        setattr(info, k, v)
+
+    def _forget_object(self, name_or_url: str, obj_identity: str) -> None:
+        """ Drop a cached object that has been removed by someone else from the memory index """
+        info = self._cache[name_or_url].objects.pop(obj_identity, None)
+        if info is not None:
+            if self._identities is not None:
+                self._identities.discard(name_or_url, obj_identity)
+            if self.memory_tier is not None:
+                self.memory_tier.discard(info.blob)
+            if info.size is not None:
+                self.total_bytes -= info.size
+                self.total_objects -= 1
+
+    def _forget_entry(self, name_or_url: str) -> None:
+        """ Drop all of the cached objects for name_or_url from the memory index """
+        cache_entry = self._cache[name_or_url]
+        for obj_identity in list(cache_entry.objects):
+            self._forget_object(name_or_url, obj_identity)
+
+    def _tally(self) -> bool:
+        """ Recompute the usage totals from the memory index, filling in the sizes of objects in indices written by
+        earlier versions.
+
+        :return: True if sizes had to be filled in
+        """
+        self.total_bytes = self.total_objects = 0
+        migrated = False
+        for cache_entry in self._cache.values():
+            for info in cache_entry.objects.values():
+                if info.size is None:
+                    fpath = os.path.join(self.cache_directory, info.fname)
+                    st = os.stat(fpath) if os.path.exists(fpath) else None
+                    info.size, info.atime = (st.st_size, st.st_atime) if st else (0, time.time())
+                    migrated = True
+                self.total_bytes += info.size
+                self.total_objects += 1
+        return migrated
+
     def _update_index(self) -> None:
-        """ Update the disk index from the memory file  """
-        with open(self._cache_directory_index, 'w') as f:
-            f.write(as_json(self._cache))
+        """ Write a complete snapshot of the memory index to disk, replacing the journal.  Must be called with the
+        exclusive lock held. """
+        tmp_index = self._cache_directory_index + '.tmp'
+        with open(tmp_index, 'w') as f:
+            self._cache.dump(f)
+        os.replace(tmp_index, self._cache_directory_index)
+        self._journal.reset(IndexJournal.stat_id(os.stat(self._cache_directory_index)), self._cache.size())
 
-    def _load_index(self) -> None:
-        """ Update the memory file from the disk file  """
+    def _load_index(self) -> bool:
+        """ Update the memory file from the disk file, replaying any journaled changes
+
+        :return: True if the index was written by an earlier version, or was damaged and had to be rebuilt from the
+        cache files, and should be rewritten
+        """
         with open(self._cache_directory_index, 'r') as f:
+            snapshot_id = IndexJournal.stat_id(os.fstat(f.fileno()))
             try:
-                self._cache = jsonasobj.load(f)
-            except json.decoder.JSONDecodeError:
-                self._cache = None
-        if self._cache is None:
-            raise CacheError(f"cache index has been damaged. Remove {self.cache_directory} and try again")
+                self._cache, legacy = index.CacheIndex.load(f)
+            except (ValueError, KeyError, TypeError):
+                # Damaged, e.g. truncated by a crash - rebuild it from the cache files rather than lose them
+                scan = fsck.DirectoryScan(self.cache_directory)
+                scan.step()
+                self._cache, legacy = fsck.rebuild_index(scan), True
+        self._identities = None
+        self._journal.snapshot_id = snapshot_id
+        self._journal.snapshot_size = self._cache.size()
+        for record in self._journal.records():
+            self._apply(record)
+        return self._tally() or legacy
 
     def clear(self) -> None:
         """ Clear all cache entries for directory.  If it appears to be a "pure" directory (e.g. it has a valid
@@ -181,29 +1675,46 @@ class CacheJar:
         if not os.path.exists(self._cache_directory_index):
             raise CacheError("Attempt to clear a non-existent cache")
 
-        self._load_index()            # This will fail if the index is not valid
-        for name_or_url in list(self._cache):
-            self._clear_cache_entry(name_or_url, None, update_index=False)
-        self._cache = CacheIndex()
-        self._update_index()
-        self._load_index()            # Verify that update was successful
+        self._drain_writes()
+        with self._lock.write(), self._index_lock.exclusive():
+            self._load_index()            # A damaged index is rebuilt from the cache files
+            for name_or_url in list(self._cache):
+                self._clear_cache_entry(name_or_url, None, update_index=False)
+            self._cache = index.CacheIndex()
+            self._identities = None
+            if self.memory_tier is not None:
+                self.memory_tier.clear()
+            self._update_index()
 
 
 class CacheFactory:
     """ Preserve an instance of a cache, allowing applications to reference it as necessary.
+
+    Nothing is read or created on disk until it is needed - a jar is loaded the first time it is referenced, and the
+    cache root is only scanned for the rest of the jars when factory wide limits have to be enforced.
     """
     _default_cache_root: str = os.path.abspath(os.path.join(os.path.expanduser('~'), '.cachejar'))
 
-    def __init__(self, cache_root: str=_default_cache_root):
-        """ Construct a cache factory instance based on cache root """
+    def __init__(self, cache_root: str=_default_cache_root, max_bytes: Optional[int]=None,
+                 max_entries: Optional[int]=None, eviction_policy: str='lru',
+                 shared_tier: Optional["sharedtier.SharedTier"]=None):
+        """ Construct a cache factory instance based on cache root
+
+        :param cache_root: directory containing the application caches
+        :param max_bytes: disk quota for all of the jars together.  None means no limit
+        :param max_entries: maximum number of cached objects for all of the jars together.  None means no limit
+        :param eviction_policy: 'lru' or 'cost' - see eviction_key
+        :param shared_tier: storage shared with other machines that the factory's jars read through to on a miss and
+        copy new objects to (see cachejar.sharedtier).  None means the jars are purely local
+        """
         self._caches: Dict[str, CacheJar] = {}  # Map from application to cache
         self._cache_root = cache_root
-        os.makedirs(self.cache_root, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.eviction_policy = eviction_policy
+        self.shared_tier = shared_tier
         self._disabled = False
-        for entry in os.listdir(self.cache_root):
-            fpath = os.path.join(self.cache_root, entry)
-            if os.path.isdir(fpath) and os.path.exists(os.path.join(fpath, 'index')):
-                self._caches[entry] = CacheJar(self, entry)
+        self._scanned = False                   # True means every jar in cache_root has been loaded
 
     @property
     def disabled(self) -> bool:
@@ -219,7 +1730,7 @@ class CacheFactory:
     def clear(self, appid: Any, remove_completely: bool=False) -> None:
         """ Clear out all cache instances for appid """
         appid_str = str(appid)
-        instance = self._caches.get(appid_str)
+        instance = self._existing_jar(appid_str)
         if instance:
             if remove_completely:
                 self._remove_cache_dir(instance, appid_str)
@@ -245,17 +1756,65 @@ class CacheFactory:
 
         :param appid: Application id
         """
-        appid_str = str(appid)
-        if appid_str in self._caches:
-            return self._caches[appid_str].cache_directory
-        else:
-            return None
+        instance = self._existing_jar(str(appid))
+        return instance.cache_directory if instance else None
+
+    def _existing_jar(self, appid: str) -> Optional[CacheJar]:
+        """ Return the jar for appid if there is one, loading it if it hasn't been referenced yet """
+        if appid not in self._caches and \
+                os.path.exists(os.path.join(self.cache_root, appid, CacheJar.cache_index_fname)):
+            self._caches[appid] = CacheJar(self, appid)
+        return self._caches.get(appid)
+
+    def _all_jars(self) -> List[CacheJar]:
+        """ Return all of the jars in the cache root, loading any that haven't been referenced yet """
+        if not self._scanned:
+            if os.path.isdir(self.cache_root):
+                for entry in os.listdir(self.cache_root):
+                    if os.path.isdir(os.path.join(self.cache_root, entry)):
+                        self._existing_jar(entry)
+            self._scanned = True
+        return list(self._caches.values())
+
+    def _over_quota(self, fraction: float = 1.0) -> bool:
+        return (self.max_bytes is not None and
+                sum(j.total_bytes for j in self._all_jars()) > self.max_bytes * fraction) or \
+               (self.max_entries is not None and
+                sum(j.total_objects for j in self._all_jars()) > self.max_entries * fraction)
+
+    def _enforce_quota(self, protect: Optional[Tuple[CacheJar, Optional[Tuple[str, str]]]] = None) -> int:
+        """ Evict objects across all jars until the cache root is within its limits
+
+        :param protect: (jar, (name_or_url, identity)) of an object that must not be evicted
+        :return: number of objects evicted
+        """
+        nevicted = 0
+        if self._over_quota():
+            candidates = []
+            for jar in self._all_jars():
+                with jar._lock.read():
+                    candidates += [(eviction_key(self.eviction_policy, info), id(jar), jar, name_or_url, obj_identity)
+                                   for name_or_url, obj_identity, info in jar._eviction_candidates()
+                                   if protect is None or (jar, (name_or_url, obj_identity)) != protect]
+            candidates.sort(key=lambda c: c[:2])
+            for _, _, jar, name_or_url, obj_identity in candidates:
+                if not self._over_quota(CacheJar.eviction_target):
+                    break
+                with jar._mutating():
+                    if name_or_url in jar._cache and obj_identity in jar._cache[name_or_url].objects:
+                        jar._evict(name_or_url, obj_identity)
+                        nevicted += 1
+        return nevicted
 
     def _remove_cache_dir(self, instance: CacheJar, appid: str) -> None:
+        instance.write_behind = False
+        instance.wait_for_background()
+        instance._index_lock.close()
         foreign_files = []
         for fname in os.listdir(instance.cache_directory):
-            if fname == CacheJar.cache_index_fname or re.match(
-                    r'A[a-fA-F0-9]{8}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{12}$', fname):
+            if fname in CacheJar.control_fnames or re.match(
+                    r'(A([a-f0-9]{24}|[a-fA-F0-9]{8}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{12})'
+                    r'(\.\w+)?|L[a-f0-9]{32}\.lease)$', fname):
                 os.remove(os.path.join(instance.cache_directory, fname))
             else:
                 foreign_files.append(fname)
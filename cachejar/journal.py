@@ -0,0 +1,172 @@
+import json
+import os
+from contextlib import contextmanager
+from typing import List, Iterator, Optional, Tuple, Any
+
+
+class IndexJournal:
+    """ Append-only log of index mutations.
+
+    Each mutation is written as a single JSON array on its own line.  The first line of the journal is a header that
+    identifies the snapshot (the `index` file) that the records apply to, which lets us recognize a journal that has
+    already been folded into a newer snapshot if we crashed half way through a compaction.
+
+    The journal remembers how far it has been read and which snapshot it was loaded against, so that changes made by
+    other processes can be detected with a couple of stat calls (see `status`) and picked up by reading just the new
+    records.  Appending and trimming must be done while holding the jar's exclusive lock.
+    """
+    header_op = 'g'
+
+    def __init__(self, journal_path: str, snapshot_path: str, compact_threshold: int = 1000) -> None:
+        """ Create a journal for snapshot_path
+
+        :param journal_path: file to log mutations to
+        :param snapshot_path: index file that the journal applies to
+        :param compact_threshold: minimum number of records before we consider compaction
+        """
+        self.journal_path = journal_path
+        self.snapshot_path = snapshot_path
+        self.compact_threshold = compact_threshold
+        self.nrecords = 0                   # Records in the journal
+        self.snapshot_size = 0              # Records required to rebuild the snapshot
+        self.snapshot_id: Optional[List[int]] = None        # Identity of the snapshot we were loaded against
+        self.offset = 0                     # Bytes of the journal that have been read or written
+        self._journal_ino: Optional[int] = None           # Inode of the journal we have read
+        self._obsolete = False              # True means the journal on disk belongs to an earlier snapshot
+        self._pending: Optional[List[list]] = None
+
+    @staticmethod
+    def stat_id(st: os.stat_result) -> List[int]:
+        """ Identity of a snapshot file.  Snapshots are replaced, never rewritten, so this changes with each one """
+        return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+    @staticmethod
+    def _encode(record: Tuple[Any, ...]) -> str:
+        return json.dumps(record, separators=(',', ':')) + '\n'
+
+    def status(self) -> str:
+        """ Determine whether the snapshot or journal have been changed by someone else
+
+        :return: 'current' - nothing has changed, 'tail' - records have been appended to the journal, 'reload' - the
+        snapshot has been replaced
+        """
+        try:
+            if self.stat_id(os.stat(self.snapshot_path)) != self.snapshot_id:
+                return 'reload'
+        except FileNotFoundError:
+            return 'reload'
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return 'current' if self._journal_ino is None else 'reload'
+        if st.st_ino != self._journal_ino:
+            return 'tail' if self._journal_ino is None else 'reload'
+        if st.st_size < self.offset:
+            return 'reload'
+        return 'tail' if st.st_size > self.offset else 'current'
+
+    def append(self, *records: Tuple[Any, ...]) -> None:
+        """ Add records to the journal.  Inside a batch, records are held until the batch completes """
+        if self._pending is not None:
+            self._pending.extend(records)
+        elif records:
+            self._write(records)
+
+    def _write(self, records) -> None:
+        data = ''.join(self._encode(r) for r in records).encode()
+        if self._journal_ino is None or self._obsolete:
+            # A new journal is created under a temporary name, so it never shares an inode with the one it replaces
+            data = self._encode((IndexJournal.header_op, self.snapshot_id)).encode() + data
+            tmp_path = self.journal_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+                self._journal_ino = os.fstat(f.fileno()).st_ino
+            os.replace(tmp_path, self.journal_path)
+            self.offset = len(data)
+            self._obsolete = False
+        else:
+            with open(self.journal_path, 'r+b') as f:
+                f.seek(self.offset)
+                f.truncate()                        # Anything past what we have read is a torn record
+                f.write(data)
+            self.offset += len(data)
+        self.nrecords += len(records)
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """ Collect all of the records appended in the body and write them with a single write """
+        if self._pending is not None:
+            yield
+            return
+        self._pending = []
+        try:
+            yield
+        finally:
+            records, self._pending = self._pending, None
+            if records:
+                self._write(records)
+
+    def records(self, tail: bool = False) -> Iterator[list]:
+        """ Return the records that apply to the current snapshot.  A torn trailing record (e.g. from a crash in
+        mid-write) is ignored and will be overwritten by the next append.
+
+        :param tail: True means just return records that were added since the journal was last read
+        """
+        if not tail:
+            self.nrecords = 0
+            self.offset = 0
+            self._journal_ino = None
+            self._obsolete = False
+        if self._obsolete:
+            return
+        try:
+            f = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            if self._journal_ino is not None and st.st_ino != self._journal_ino:
+                return
+            f.seek(self.offset)
+            data = f.read()
+        offset = self.offset
+        for line in data.split(b'\n')[:-1]:             # Last element is what follows the final newline
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            offset += len(line) + 1
+            if self._journal_ino is None:
+                self._journal_ino = st.st_ino
+                if not record or record[0] != IndexJournal.header_op or record[1] != self.snapshot_id:
+                    # Journal belongs to an older snapshot - its contents have already been applied.
+                    self._obsolete = True
+                    self.offset = st.st_size
+                    return
+                self.offset = offset
+            else:
+                self.offset = offset
+                self.nrecords += 1
+                yield record
+
+    def reset(self, snapshot_id: List[int], snapshot_size: int = 0) -> None:
+        """ Discard the journal - called when a new snapshot has been written
+
+        :param snapshot_id: identity of the new snapshot
+        :param snapshot_size: number of records the new snapshot represents
+        """
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.snapshot_id = snapshot_id
+        self._journal_ino = None
+        self._obsolete = False
+        self.offset = 0
+        self.nrecords = 0
+        self.snapshot_size = snapshot_size
+
+    @property
+    def needs_compaction(self) -> bool:
+        """ True if the journal has grown to the point where it should be folded into the snapshot.  Compacting only
+        once the journal is as large as the snapshot keeps the amortized cost of a mutation constant.
+        """
+        return self._pending is None and self.nrecords > max(self.compact_threshold, self.snapshot_size)
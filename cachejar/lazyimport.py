@@ -0,0 +1,54 @@
+import importlib.util
+import sys
+import threading
+from types import ModuleType
+from typing import Any, Dict
+
+_locks: Dict[str, threading.RLock] = {}         # Module name --> lock held while the module is loaded
+_loading = set()                                # Names of the modules whose code is being run
+
+
+class _LazyModule(ModuleType):
+    """ A module whose code is run on the first reference to any of its attributes.
+
+    importlib.util.LazyLoader isn't thread safe before python 3.12 - it makes the module an ordinary module before
+    running its code, so other threads can see it half loaded.  Here the first reference holds a per-module lock
+    while the code runs, and the module only becomes an ordinary module once the code has finished.
+    """
+    def __getattribute__(self, attr: str) -> Any:
+        name = object.__getattribute__(self, '__name__')
+        with _locks[name]:
+            if object.__getattribute__(self, '__class__') is _LazyModule and name not in _loading:
+                _loading.add(name)
+                try:
+                    spec = object.__getattribute__(self, '__spec__')
+                    spec.loader.exec_module(self)
+                    self.__class__ = ModuleType
+                finally:
+                    _loading.discard(name)
+        return ModuleType.__getattribute__(self, attr)         # Falls back to a module level __getattr__
+
+
+def lazy_import(name: str) -> ModuleType:
+    """ Return a module that isn't actually loaded until one of its attributes is referenced.
+
+    This keeps `import cachejar` cheap - modules that are only needed once a jar is used (the index representation,
+    network and asyncio support, thread pools) aren't loaded by programs that never get that far.  The first
+    reference may come from any number of threads at once.
+
+    :param name: fully qualified module name
+    :return: module, possibly not yet loaded
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'", name=name)
+    module = importlib.util.module_from_spec(spec)
+    _locks[name] = threading.RLock()
+    module.__class__ = _LazyModule
+    sys.modules[name] = module
+    parent, _, child = name.rpartition('.')
+    if parent:
+        setattr(sys.modules[parent], child, module)         # What the import statement would have done
+    return module
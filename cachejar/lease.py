@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+import uuid
+from typing import Optional
+
+from cachejar.lazyimport import lazy_import
+from cachejar.locking import FileLock
+
+socket = lazy_import('socket')
+
+
+class Lease:
+    """ A claim, shared by all of the processes using a jar, on building a particular object.
+
+    The lease is a file that is created exclusively.  While it is held, a background thread touches the file every
+    timeout / 4 seconds.  A lease file that hasn't been touched for timeout seconds belongs to a process that died
+    (or hung) and can be taken over by someone else.
+    """
+    def __init__(self, path: str, timeout: float, lock_path: str) -> None:
+        """ Create a lease
+
+        :param path: lease file
+        :param timeout: seconds without a heartbeat after which the lease is considered abandoned
+        :param lock_path: lock file held while an abandoned lease is taken over - the jar's index lock
+        """
+        self.path = path
+        self.timeout = timeout
+        self.lock_path = lock_path
+        self._token = f"{socket.gethostname()} {os.getpid()} {uuid.uuid4()}"
+        self._stop: Optional[threading.Event] = None
+
+    def acquire(self) -> bool:
+        """ Try to take the lease
+
+        :return: True if we now hold the lease, False if someone else holds it
+        """
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+        except FileExistsError:
+            if not self.expired():
+                return False
+            fd = self._take_over()
+            if fd is None:
+                return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(self._token)
+        self._stop = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(self._stop,), daemon=True,
+                         name=f'cachejar-lease-{os.path.basename(self.path)}').start()
+        return True
+
+    def _take_over(self) -> Optional[int]:
+        """ Replace an abandoned lease with our own.  Processes that found it abandoned at the same time take over one
+        at a time, and check again once it is their turn, so only the first of them gets it.
+
+        :return: descriptor of the new lease file, None if someone else has the lease
+        """
+        lock = FileLock(self.lock_path)
+        try:
+            with lock.exclusive():
+                try:
+                    if time.time() - os.stat(self.path).st_mtime <= self.timeout:
+                        return None
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+                try:
+                    return os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+                except FileExistsError:
+                    return None
+        finally:
+            lock.close()
+
+    def expired(self) -> bool:
+        """ True if the lease file is missing or hasn't been touched for timeout seconds """
+        try:
+            return time.time() - os.stat(self.path).st_mtime > self.timeout
+        except FileNotFoundError:
+            return True
+
+    def release(self) -> None:
+        """ Give up the lease, if we still hold it """
+        if self._stop is None:
+            return
+        self._stop.set()
+        self._stop = None
+        if self._held():
+            os.remove(self.path)
+
+    def _held(self) -> bool:
+        """ True if the lease file is still ours - it may have been taken over if we stalled for too long """
+        try:
+            with open(self.path) as f:
+                return f.read() == self._token
+        except FileNotFoundError:
+            return False
+
+    def _heartbeat(self, stop: threading.Event) -> None:
+        while not stop.wait(self.timeout / 4):
+            try:
+                if not self._held():
+                    break
+                os.utime(self.path)
+            except FileNotFoundError:
+                break
@@ -0,0 +1,63 @@
+import os
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None                        # No advisory locking (e.g. Windows) - jars are then single process only
+
+
+class FileLock:
+    """ Advisory lock shared by all of the processes that use a jar.
+
+    Locks are re-entrant within a process: nested requests are satisfied by the lock that is already held, except
+    that asking for an exclusive lock while holding a shared one converts it.  The conversion is not atomic, so
+    anything read under the shared lock has to be re-validated once the exclusive lock is granted.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._fd: Optional[int] = None
+        self._depth = 0
+        self._exclusive = False
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        """ Hold the lock in shared mode - any number of processes can read at the same time """
+        with self._hold(False):
+            yield
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """ Hold the lock in exclusive mode - used for any change to the index """
+        with self._hold(True):
+            yield
+
+    @contextmanager
+    def _hold(self, exclusive: bool) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        upgrade = exclusive and not self._exclusive
+        if self._depth == 0 or upgrade:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._exclusive = exclusive
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                self._exclusive = False
+            elif upgrade:
+                fcntl.flock(self._fd, fcntl.LOCK_SH)
+                self._exclusive = False
+
+    def close(self) -> None:
+        """ Release the lock file """
+        if self._fd is not None and self._depth == 0:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,134 @@
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class MemoryTier:
+    """ Bounded in-memory cache of deserialized objects that sits in front of the pickled files in a CacheJar.
+
+    Objects are returned as is, not copied, so callers that modify a cached object modify the cached image as well.
+    A memory tier can be shared by any number of threads.
+    """
+    policies = ('lru', 'lfu')
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None, policy: str = 'lru') -> None:
+        """ Create a memory tier
+
+        :param max_entries: maximum number of objects to hold.  None means no limit
+        :param max_bytes: maximum total estimated size of the objects (serialized size).  None means no limit
+        :param policy: eviction policy - 'lru' (least recently used) or 'lfu' (least frequently used)
+        """
+        if policy not in MemoryTier.policies:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries: Dict[Hashable, Tuple[Any, int]] = {}          # key --> (object, size)
+        # LRU: key order is recency.  LFU: key --> use count, with a recency ordered bucket per count
+        self._lru: "OrderedDict[Hashable, None]" = OrderedDict()
+        self._counts: Dict[Hashable, int] = {}
+        self._buckets: Dict[int, "OrderedDict[Hashable, None]"] = defaultdict(OrderedDict)
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    @property
+    def hit_rate(self) -> float:
+        """ Fraction of lookups that were satisfied from memory """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """ Look up key
+
+        :param key: object key
+        :return: (True, object) if present, (False, None) otherwise
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            self._touch(key)
+            return True, entry[0]
+
+    def put(self, key: Hashable, obj: Any, nbytes: int) -> None:
+        """ Add or replace key, evicting other entries as needed
+
+        :param key: object key
+        :param obj: object to hold
+        :param nbytes: estimated size of the object
+        """
+        with self._lock:
+            if self.max_bytes is not None and nbytes > self.max_bytes:
+                self.discard(key)
+                return
+            if key in self._entries:
+                self.nbytes -= self._entries[key][1]
+                self._touch(key)
+            elif self.policy == 'lru':
+                self._lru[key] = None
+            else:
+                self._counts[key] = 1
+                self._buckets[1][key] = None
+            self._entries[key] = (obj, nbytes)
+            self.nbytes += nbytes
+            self._evict(key)
+
+    def discard(self, key: Hashable) -> None:
+        """ Remove key if present """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.nbytes -= entry[1]
+                if self.policy == 'lru':
+                    del self._lru[key]
+                else:
+                    count = self._counts.pop(key)
+                    del self._buckets[count][key]
+                    if not self._buckets[count]:
+                        del self._buckets[count]
+
+    def clear(self) -> None:
+        """ Remove all entries.  Hit statistics are preserved """
+        with self._lock:
+            self._entries.clear()
+            self._lru.clear()
+            self._counts.clear()
+            self._buckets.clear()
+            self.nbytes = 0
+
+    def _touch(self, key: Hashable) -> None:
+        if self.policy == 'lru':
+            self._lru.move_to_end(key)
+        else:
+            count = self._counts[key]
+            del self._buckets[count][key]
+            if not self._buckets[count]:
+                del self._buckets[count]
+            self._counts[key] = count + 1
+            self._buckets[count + 1][key] = None
+
+    def _victim(self, keep: Hashable) -> Hashable:
+        """ Return the next entry to evict other than keep """
+        if self.policy == 'lru':
+            return next(iter(self._lru))            # keep was just used, so it is never first
+        for count in sorted(self._buckets):
+            for key in self._buckets[count]:
+                if key != keep:
+                    return key
+
+    def _evict(self, keep: Hashable) -> None:
+        """ Evict entries until we are within bounds, never evicting the entry that was just added """
+        while len(self._entries) > 1 and \
+                ((self.max_entries is not None and len(self._entries) > self.max_entries) or
+                 (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+            self.discard(self._victim(keep))
@@ -0,0 +1,179 @@
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+from typing import Optional, List, Tuple, Callable, Iterator, Any
+
+from cachejar.compression import get_codec
+from cachejar.dependencies import Dependencies
+from cachejar.identity import object_identity
+from cachejar.index import ObjectInfo
+from cachejar.serializers import get_serializer
+from cachejar.signature import ContentSigner, default_directory_signer, file_signature, is_url, signature
+
+# A pack is a single read-only file holding the objects of a jar:
+#
+#   header      magic, version, metadata length, number of slots, table offset, entries offset
+#   metadata    JSON - signature mode, serializer and codec names
+#   table       open addressed hash table of slots, keyed by a digest of source, signature and identity
+#   blobs       the cache files, concatenated
+#   entries     JSON - source, signature, identity, slot, cost and label of each object.  Only read by import
+#
+# A lookup is one probe of the table (the table is at most half full) and a slice of the memory map, and opening a
+# pack only reads the header and metadata.
+PACK_MAGIC = b'CJPACK01'
+PACK_VERSION = 1
+_header = struct.Struct('<8sIIQQQ')
+_slot = struct.Struct('<16sQQHH4x')         # key, blob offset, blob length, serializer, codec.  Offset 0 is empty
+KEY_SIZE = 16
+
+
+def pack_key(name_or_url: str, sig: str, obj_identity: str) -> bytes:
+    """ Return the table key for an object """
+    return hashlib.blake2b(f"{name_or_url}\0{sig}\0{obj_identity}".encode(), digest_size=KEY_SIZE).digest()
+
+
+def write_pack(path: str, signature_mode: str, entries: List[Tuple[str, str, str, ObjectInfo]],
+               read_blob: Callable[[ObjectInfo], Optional[bytes]]) -> int:
+    """ Write a pack
+
+    :param path: file to write.  The pack is written under a temporary name and renamed into place
+    :param signature_mode: signature mode of the jar that the entries came from
+    :param entries: (name_or_url, signature, identity, object_info) for each object
+    :param read_blob: function that returns the contents of the cache file for an object, None to leave it out
+    :return: number of objects written
+    """
+    serializers = sorted({info.serializer or 'pickle' for *_, info in entries})
+    codecs = [None] + sorted({info.codec for *_, info in entries if info.codec})
+    nslots = 1
+    while nslots < 2 * len(entries):
+        nslots *= 2
+    table = bytearray(nslots * _slot.size)
+    used = set()
+    packed = []
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        metadata = json.dumps(dict(signature_mode=signature_mode, serializers=serializers, codecs=codecs)).encode()
+        table_offset = _header.size + len(metadata)
+        table_offset += -table_offset % 8
+        f.write(b'\0' * table_offset)
+        f.write(table)
+        for name_or_url, sig, obj_identity, info in entries:
+            data = read_blob(info)
+            if data is None:
+                continue
+            key = pack_key(name_or_url, sig, obj_identity)
+            slot = int.from_bytes(key[:8], 'little') & (nslots - 1)
+            while slot in used:
+                slot = (slot + 1) & (nslots - 1)
+            used.add(slot)
+            _slot.pack_into(table, slot * _slot.size, key, f.tell(), len(data),
+                            serializers.index(info.serializer or 'pickle'), codecs.index(info.codec))
+            f.write(data)
+            packed.append([name_or_url, sig, obj_identity, slot, info.cost, info.label])
+        entries_offset = f.tell()
+        f.write(json.dumps(packed).encode())
+        f.seek(0)
+        f.write(_header.pack(PACK_MAGIC, PACK_VERSION, len(metadata), nslots, table_offset, entries_offset))
+        f.write(metadata)
+        f.seek(table_offset)
+        f.write(table)
+    os.replace(tmp_path, path)
+    return len(packed)
+
+
+class PackJar:
+    """ A read-only jar backed by a pack written by CacheJar.export_pack.
+
+    The pack is memory mapped, so any number of processes can open the same pack and share one copy of it in the
+    page cache.  Sources are signed the way the exporting jar signed them - a pack exported from a jar with
+    signature_mode = 'content' can be used on machines whose copies of the sources have different modification times.
+    """
+    def __init__(self, path: str) -> None:
+        """ Open a pack
+
+        :param path: pack file
+        :raises ValueError: if path isn't a pack
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, metadata_len, self._nslots, self._table_offset, self._entries_offset = \
+                _header.unpack_from(self._map, 0)
+            if magic != PACK_MAGIC or version != PACK_VERSION:
+                raise ValueError(f"{path} is not a cachejar pack")
+            metadata = json.loads(self._map[_header.size:_header.size + metadata_len])
+        except (ValueError, struct.error):
+            self._map.close()
+            raise ValueError(f"{path} is not a cachejar pack") from None
+        self.signature_mode: str = metadata['signature_mode']
+        self._serializers: List[str] = metadata['serializers']
+        self._codecs: List[Optional[str]] = metadata['codecs']
+        self._content_signer = ContentSigner() if self.signature_mode == 'content' else None
+
+    def __enter__(self) -> "PackJar":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._map.close()
+
+    def _signature(self, name_or_url: str) -> str:
+        """ Return the current signature of name_or_url (see CacheJar._signature) """
+        if isinstance(name_or_url, Dependencies):
+            return name_or_url.signature(self._signature)
+        if is_url(name_or_url):
+            return signature(name_or_url)
+        if self._content_signer is not None:
+            return self._content_signer.signature(name_or_url)
+        return default_directory_signer.signature(name_or_url) if os.path.isdir(name_or_url) \
+            else file_signature(name_or_url)
+
+    def _probe(self, key: bytes) -> Optional[tuple]:
+        """ Return the slot for key, None if it isn't in the pack """
+        mask = self._nslots - 1
+        slot = int.from_bytes(key[:8], 'little') & mask
+        while True:
+            offset = self._table_offset + slot * _slot.size
+            if self._map[offset:offset + KEY_SIZE] == key:
+                return _slot.unpack_from(self._map, offset)
+            if _slot.unpack_from(self._map, offset)[1] == 0:
+                return None
+            slot = (slot + 1) & mask
+
+    def _load(self, slot: tuple) -> object:
+        _, offset, length, serializer, codec = slot
+        data = self._map[offset:offset + length]
+        if codec:
+            data = get_codec(self._codecs[codec]).decompress(data)
+        return get_serializer(self._serializers[serializer]).load(io.BytesIO(data), self.path)
+
+    def object_for(self, name_or_url: str, obj_id: Any, *parms: Any, **kwparms: Any) -> Optional[object]:
+        """ Return the object representing the supplied URL or file name (see CacheJar.object_for)
+
+        :return: object if it is in the pack and its source hasn't changed.  None otherwise, including when the
+        source can't be signed
+        """
+        try:
+            sig = self._signature(name_or_url)
+        except OSError:
+            return None
+        slot = self._probe(pack_key(name_or_url, sig, object_identity(obj_id, parms, kwparms)))
+        return self._load(slot) if slot is not None else None
+
+    def entries(self) -> Iterator[Tuple[str, str, str, dict, Callable[[], bytes]]]:
+        """ Generate (name_or_url, signature, identity, object_info fields, reader) for every object in the pack,
+        where reader returns the contents of the object's cache file.  name_or_url is a plain string (see
+        Dependencies.from_key) """
+        for name_or_url, sig, obj_identity, slot, cost, label in json.loads(self._map[self._entries_offset:]):
+            _, offset, length, serializer, codec = _slot.unpack_from(self._map, self._table_offset + slot * _slot.size)
+            serializer = self._serializers[serializer]
+            info = dict(size=length, cost=cost, codec=self._codecs[codec], label=label,
+                        serializer=serializer if serializer != 'pickle' else None)
+            yield name_or_url, sig, obj_identity, info, \
+                lambda offset=offset, length=length: self._map[offset:offset + length]
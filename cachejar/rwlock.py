@@ -0,0 +1,91 @@
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class RWLock:
+    """ Reader/writer lock for the threads of a process.
+
+    Any number of threads can hold the lock for reading at the same time, a writer holds it alone.  Writers that are
+    waiting take precedence over new readers, so a steady stream of cache hits can't starve an update.
+
+    A thread that holds the write lock can take the lock again for reading or writing.  A thread that holds the read
+    lock can take it again for reading, but not for writing - upgrading would deadlock against another reader doing
+    the same, so it raises RuntimeError instead.
+    """
+    def __init__(self) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._waiting_writers = 0
+        self._local = threading.local()             # Per thread nesting depth
+
+    def _depth(self) -> int:
+        return getattr(self._local, 'depth', 0)
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """ Hold the lock for reading """
+        depth = self._depth()
+        if depth or self._writer == threading.get_ident():
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """ Hold the lock for writing """
+        me = threading.get_ident()
+        depth = self._depth()
+        if self._writer == me:
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+        if depth:
+            raise RuntimeError("A read lock cannot be upgraded to a write lock")
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+
+class NoLock:
+    """ Stand in for RWLock when a jar is only used by one thread """
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        yield
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        yield
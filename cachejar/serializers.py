@@ -0,0 +1,134 @@
+import mmap
+import os
+import pickle
+import struct
+from typing import Any, BinaryIO, Dict, List
+
+try:
+    if pickle.HIGHEST_PROTOCOL >= 5:
+        pickle5 = pickle
+    else:
+        import pickle5                      # Backport for python < 3.8
+except ImportError:
+    pickle5 = None
+
+
+class Serializer:
+    """ Converts objects to and from the contents of a cache file.
+
+    `dump` and `load` are handed the open cache file along with its path, which serializers that keep part of an
+    object outside of the file (see `aux_files`) use to name their own files.
+    """
+    name: str = None
+
+    def dump(self, obj: Any, f: BinaryIO, fpath: str) -> int:
+        """ Serialize obj
+
+        :param obj: object to serialize
+        :param f: binary file to write obj to
+        :param fpath: path of the cache file
+        :return: number of bytes written to auxiliary files
+        """
+        raise NotImplementedError()
+
+    def load(self, f: BinaryIO, fpath: str) -> Any:
+        """ Deserialize an object written by dump """
+        raise NotImplementedError()
+
+    def aux_files(self, fpath: str) -> List[str]:
+        """ Return any additional files that dump may have written for fpath """
+        return []
+
+
+class PickleSerializer(Serializer):
+    """ The default - the object is pickled with the default protocol """
+    name = 'pickle'
+
+    def dump(self, obj: Any, f: BinaryIO, fpath: str) -> int:
+        pickle.dump(obj, f)
+        return 0
+
+    def load(self, f: BinaryIO, fpath: str) -> Any:
+        return pickle.load(f)
+
+
+class Pickle5Serializer(Serializer):
+    """ Pickle protocol 5 with out-of-band buffers.
+
+    Objects that support out-of-band pickling (e.g. numpy arrays) hand their data buffers over separately.  These are
+    written to `<cache file>.oob`, each aligned on a 64 byte boundary, and are read back through a copy-on-write
+    memory map, so large arrays are materialized without copying their data.
+
+    The .oob file starts with a header: magic, buffer count and an (offset, length) pair for each buffer.
+    """
+    name = 'pickle5'
+    alignment = 64
+    magic = b'CJOOB001'
+    aux_suffix = '.oob'
+
+    def __init__(self) -> None:
+        if pickle5 is None:
+            raise ImportError("pickle protocol 5 requires python 3.8 or the pickle5 package")
+
+    def dump(self, obj: Any, f: BinaryIO, fpath: str) -> int:
+        buffers = []
+        pickle5.dump(obj, f, protocol=5, buffer_callback=buffers.append)
+        if not buffers:
+            return 0
+        views = [buf.raw() for buf in buffers]
+        header_len = len(self.magic) + 8 + 16 * len(views)
+        offsets = []
+        offset = header_len
+        for view in views:
+            offset += -offset % self.alignment
+            offsets.append(offset)
+            offset += view.nbytes
+        with open(fpath + self.aux_suffix, 'wb') as aux:
+            aux.write(self.magic + struct.pack('<Q', len(views)))
+            for off, view in zip(offsets, views):
+                aux.write(struct.pack('<QQ', off, view.nbytes))
+            for off, view in zip(offsets, views):
+                aux.write(b'\0' * (off - aux.tell()))
+                aux.write(view)
+            return aux.tell()
+
+    def load(self, f: BinaryIO, fpath: str) -> Any:
+        aux_path = fpath + self.aux_suffix
+        if not os.path.exists(aux_path):
+            return pickle5.load(f)
+        with open(aux_path, 'rb') as aux:
+            m = mmap.mmap(aux.fileno(), 0, access=mmap.ACCESS_COPY)
+        header_len = len(self.magic) + 8
+        if m[:len(self.magic)] != self.magic:
+            raise pickle.UnpicklingError(f"{aux_path} is not an out-of-band buffer file")
+        nbuffers = struct.unpack_from('<Q', m, len(self.magic))[0]
+        view = memoryview(m)
+        buffers = []
+        for i in range(nbuffers):
+            off, length = struct.unpack_from('<QQ', m, header_len + 16 * i)
+            buffers.append(view[off:off + length])
+        # The memory map stays open for as long as any of the buffers are referenced
+        return pickle5.load(f, buffers=buffers)
+
+    def aux_files(self, fpath: str) -> List[str]:
+        return [fpath + self.aux_suffix]
+
+
+serializers: Dict[str, Serializer] = {}
+
+
+def register_serializer(serializer: Serializer) -> None:
+    """ Make a serializer available by name """
+    serializers[serializer.name] = serializer
+
+
+def get_serializer(name: str) -> Serializer:
+    """ Return the serializer registered under name """
+    if name not in serializers:
+        raise KeyError(f"Unknown serializer: {name}")
+    return serializers[name]
+
+
+register_serializer(PickleSerializer())
+if pickle5 is not None:
+    register_serializer(Pickle5Serializer())
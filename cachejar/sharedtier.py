@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import urllib.parse
+from typing import Optional, Tuple
+
+from cachejar.lazyimport import lazy_import
+
+# Network support isn't loaded until an HttpTier is used
+lazy_import('urllib.error')
+lazy_import('urllib.request')
+
+
+class SharedTier:
+    """ Storage shared by the jars on a number of machines, which sits behind the local cache files in a CacheJar.
+
+    A jar that misses locally looks for the object here before it gives up, and objects that are added to a jar are
+    copied here in the background.  Records are keyed by a digest of the jar name, the source, the source's signature
+    and the object identity (see CacheJar._shared_key), so a record is only ever found by a jar whose source has the
+    same signature as the one it was built from.  Note that 'stat' signatures include modification times, so jars on
+    different machines only share objects derived from files if the files are on a shared file system or the jars use
+    signature_mode = 'content'.
+
+    The tier is a cache too - a record that can't be read or written is just a miss.
+    """
+    def get(self, key: str) -> Optional[bytes]:
+        """ Return the record stored under key, None if there isn't one """
+        raise NotImplementedError()
+
+    def put(self, key: str, record: bytes) -> None:
+        """ Store record under key, replacing any existing record """
+        raise NotImplementedError()
+
+    def delete(self, key: str) -> None:
+        """ Remove the record stored under key, if any """
+        raise NotImplementedError()
+
+
+class DirectoryTier(SharedTier):
+    """ Records are files in a directory that all of the machines can see, e.g. an NFS mount.  Files are written
+    under a temporary name and renamed into place, so readers never see a partial record. """
+    def __init__(self, path: str) -> None:
+        self.path = os.path.abspath(path)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, record: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(record)
+        os.replace(tmp_path, path)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class HttpTier(SharedTier):
+    """ Records are blobs in an HTTP store - GET `<base_url>/<key>` returns a record (404 if there isn't one), PUT
+    stores one and DELETE removes it. """
+    def __init__(self, base_url: str, timeout: float = 10.0) -> None:
+        """ Create an HTTP tier
+
+        :param base_url: url of the store.  Keys are appended to it
+        :param timeout: seconds to wait for the store before treating a request as failed
+        """
+        self.base_url = base_url.rstrip('/') + '/'
+        self.timeout = timeout
+
+    def _request(self, method: str, key: str, data: Optional[bytes] = None) -> bytes:
+        request = urllib.request.Request(urllib.parse.urljoin(self.base_url, key), data=data, method=method)
+        if data is not None:
+            request.add_header('Content-Type', 'application/octet-stream')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self._request('GET', key)
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    def put(self, key: str, record: bytes) -> None:
+        self._request('PUT', key, record)
+
+    def delete(self, key: str) -> None:
+        try:
+            self._request('DELETE', key)
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                raise
+
+
+def encode_record(metadata: dict, data: bytes) -> bytes:
+    """ Return a shared record for the contents of a cache file
+
+    :param metadata: how to read data - serializer, codec and size (see ObjectInfo)
+    :param data: contents of the cache file
+    """
+    return json.dumps(metadata, separators=(',', ':')).encode() + b'\n' + data
+
+
+def decode_record(record: bytes) -> Tuple[dict, bytes]:
+    """ Split a record written by encode_record into its metadata and data
+
+    :raises ValueError: if the record is damaged
+    """
+    header, sep, data = record.partition(b'\n')
+    metadata = json.loads(header) if sep else None
+    if not isinstance(metadata, dict):
+        raise ValueError("Invalid shared record")
+    return metadata, data
@@ -1,13 +1,262 @@
 import hashlib
+import http
+import io
+import json
+import mmap
 import os
-import ssl
 import stat
-import urllib.error
-import urllib.request
-from typing import Optional
+import tempfile
+import threading
+import time
+import urllib.parse
+from typing import Optional, Callable, Dict, Tuple, Set, List
 
-# this allows us to read https files
-ssl._create_default_https_context = ssl._create_unverified_context
+from cachejar.lazyimport import lazy_import
+
+# Network, asyncio and thread pool support aren't loaded until they are used
+asyncio = lazy_import('asyncio')
+futures = lazy_import('concurrent.futures')
+ssl = lazy_import('ssl')
+lazy_import('http.client')
+lazy_import('urllib.error')
+lazy_import('urllib.request')
+
+
+def stat_signature(st: os.stat_result) -> str:
+    """ Signature for a stat result - type, size and modification time """
+    return str((stat.S_IFMT(st.st_mode), st.st_size, st.st_mtime))
+
+
+def file_signature(filepath: str) -> str:
+    """ Signature for a file - type, size and modification time """
+    return stat_signature(os.stat(filepath))
+
+
+class DirectorySigner:
+    """ Directory signatures - a digest of the directory and the signatures of everything in it.
+
+    Directory listings are read with os.scandir and remembered along with the stat of the directory itself.  Adding,
+    removing or renaming an entry changes the directory's stat, so as long as it is unchanged we reuse the listing and
+    only stat the entries.  Note that the entries still have to be stat'ed on every call - rewriting a file doesn't
+    change the stat of the directory that contains it.  As with ContentSigner, listings of directories changed within
+    the last `racy_interval` seconds aren't remembered, as a second change within the timestamp resolution of the
+    file system wouldn't change their stat.
+    """
+    racy_interval = 2.0
+
+    def __init__(self, max_workers: int = 0, file_signer: Callable[[str, os.stat_result], str] = None,
+                 content_only: bool = False) -> None:
+        """ Create a directory signer
+
+        :param max_workers: number of threads to spread stat calls over (useful on network file systems). 0 means
+        stat in the calling thread
+        :param file_signer: function that computes the signature of a file from its path and stat result
+        :param content_only: True means the signature depends only on entry names and file signatures, not on the
+        stat of the directories themselves, so identical copies of a tree have identical signatures
+        """
+        self.max_workers = max_workers
+        self.content_only = content_only
+        self._file_signer = file_signer or (lambda _, st: stat_signature(st))
+        self._executor: Optional["futures.ThreadPoolExecutor"] = None
+        # directory --> (stat key of directory, [(path, isdir), ...])
+        self._listings: Dict[str, Tuple[tuple, List[Tuple[str, bool]]]] = {}
+
+    def signature(self, dirname: str) -> str:
+        """ Return the signature of dirname """
+        return self._dir_signature(dirname, os.stat(dirname))
+
+    def forget(self) -> None:
+        """ Discard all remembered listings """
+        self._listings.clear()
+
+    @staticmethod
+    def _stat_key(st: os.stat_result) -> tuple:
+        return st.st_dev, st.st_ino, st.st_mtime_ns, st.st_ctime_ns
+
+    def _listing(self, dirname: str, st: os.stat_result) -> List[Tuple[str, bool]]:
+        """ Return the sorted (path, isdir) entries in dirname """
+        key = self._stat_key(st)
+        memo = self._listings.get(dirname)
+        if memo is not None and memo[0] == key:
+            return memo[1]
+        with os.scandir(dirname) as it:
+            entries = sorted(((e.name, e.path, e.is_dir()) for e in it), key=lambda e: os.path.normcase(e[0]))
+        listing = [(path, isdir) for _, path, isdir in entries]
+        if time.time() - st.st_mtime >= self.racy_interval:
+            self._listings[dirname] = (key, listing)
+        return listing
+
+    def _stat_all(self, paths: List[str]) -> List[os.stat_result]:
+        if self.max_workers and len(paths) > 1:
+            if self._executor is None:
+                self._executor = futures.ThreadPoolExecutor(self.max_workers, thread_name_prefix='cachejar-stat')
+            return list(self._executor.map(os.stat, paths))
+        return [os.stat(path) for path in paths]
+
+    def _dir_signature(self, dirname: str, st: os.stat_result) -> str:
+        digest = hashlib.md5(b'' if self.content_only else stat_signature(st).encode())
+        listing = self._listing(dirname, st)
+        for (path, isdir), est in zip(listing, self._stat_all([path for path, _ in listing])):
+            if self.content_only:
+                digest.update(os.path.basename(path).encode() + b'\0')
+            digest.update((self._dir_signature(path, est) if isdir else self._file_signer(path, est)).encode())
+        return digest.hexdigest()
+
+
+default_directory_signer = DirectorySigner()
+
+
+def dir_signature(dirname: str) -> str:
+    """ Signature for a directory - a digest of the directory and the signatures of everything in it """
+    return default_directory_signer.signature(dirname)
+
+
+class ContentSigner:
+    """ Signatures based on file content rather than modification time.
+
+    Files are hashed with blake2b - streamed in large chunks, or through mmap for big files.  Digests are remembered
+    along with the stat of the file and, if `memo_path` is supplied, persisted there, so a file is only rehashed when
+    its stat changes.  Files modified within the last `racy_interval` seconds are not remembered, as a second write
+    within the timestamp resolution of the file system wouldn't change their stat.
+    """
+    chunk_size = 1 << 20
+    mmap_threshold = 64 << 20
+    racy_interval = 2.0
+
+    def __init__(self, memo_path: Optional[str] = None, max_workers: int = 0) -> None:
+        """ Create a content signer
+
+        :param memo_path: file to persist the digests in. None means just remember them in memory
+        :param max_workers: number of threads to spread directory stat calls over
+        """
+        self.memo_path = memo_path
+        self._memo: Dict[str, list] = {}            # abs path --> [size, mtime_ns, ctime_ns, ino, digest]
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.directory_signer = DirectorySigner(max_workers, self.stat_file_signature, content_only=True)
+        if memo_path and os.path.exists(memo_path):
+            try:
+                with open(memo_path) as f:
+                    self._memo = json.load(f)
+            except ValueError:
+                pass                                # A damaged memo just means we rehash
+
+    @staticmethod
+    def _stat_key(st: os.stat_result) -> list:
+        return [st.st_size, st.st_mtime_ns, st.st_ctime_ns, st.st_ino]
+
+    @classmethod
+    def hash_file(cls, filepath: str, size: int) -> str:
+        """ Return the blake2b hex digest of the contents of filepath """
+        digest = hashlib.blake2b()
+        with open(filepath, 'rb') as f:
+            if size >= cls.mmap_threshold:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    digest.update(m)
+            else:
+                buf = bytearray(min(cls.chunk_size, max(size, 1)))
+                view = memoryview(buf)
+                n = f.readinto(buf)
+                while n:
+                    digest.update(view[:n])
+                    n = f.readinto(buf)
+        return digest.hexdigest()
+
+    def stat_file_signature(self, filepath: str, st: os.stat_result) -> str:
+        """ Return the content signature for filepath, whose stat is st """
+        path = os.path.abspath(filepath)
+        key = self._stat_key(st)
+        memo = self._memo.get(path)
+        if memo is not None and memo[:4] == key:
+            return memo[4]
+        sig = 'blake2b:' + self.hash_file(filepath, st.st_size)
+        if time.time() - st.st_mtime >= self.racy_interval:
+            with self._lock:
+                self._memo[path] = key + [sig]
+                self._dirty = True
+        return sig
+
+    def signature(self, name: str) -> str:
+        """ Return the content signature of a file or directory """
+        st = os.stat(name)
+        sig = self.directory_signer.signature(name) if stat.S_ISDIR(st.st_mode) \
+            else self.stat_file_signature(name, st)
+        self.save()
+        return sig
+
+    def save(self) -> None:
+        """ Persist the remembered digests if they have changed.  Each save writes its own temporary file, so
+        processes sharing the memo don't trip over each other.  A save that fails is retried next time - until then
+        the files are simply rehashed.
+        """
+        if self._dirty and self.memo_path:
+            with self._lock:
+                tmp_path = None
+                try:
+                    fd, tmp_path = tempfile.mkstemp('.tmp', os.path.basename(self.memo_path) + '.',
+                                                    os.path.dirname(self.memo_path) or None)
+                    with os.fdopen(fd, 'w') as f:
+                        json.dump(self._memo, f)
+                    os.replace(tmp_path, self.memo_path)
+                    self._dirty = False
+                except OSError:
+                    if tmp_path is not None:
+                        try:
+                            os.remove(tmp_path)
+                        except OSError:
+                            pass
+
+
+def url_signature(url: str) -> str:
+    """ Signature for a URL - the Last-Modified, Content-Length and ETag returned by a HEAD request """
+    # this allows us to read https files
+    ssl._create_default_https_context = ssl._create_unverified_context
+    request = urllib.request.Request(url)
+    request.get_method = lambda: 'HEAD'
+    response = urllib.request.urlopen(request)
+    return str((response.info()['Last-Modified'], response.info()['Content-Length'], response.info().get('ETag')))
+
+
+async def async_url_signature(url: str, max_redirects: int = 5) -> str:
+    """ Non-blocking version of url_signature.  Issues the HEAD request over asyncio streams, following up to
+    max_redirects redirects.  Unlike urllib, proxy settings in the environment are not used.
+    """
+    for _ in range(max_redirects + 1):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise urllib.error.URLError(f"unsupported url scheme: {parts.scheme}")
+        https = parts.scheme == 'https'
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or (443 if https else 80),
+                                                       ssl=ssl._create_unverified_context() if https else None)
+        try:
+            path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+            writer.write(f"HEAD {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: close\r\n"
+                         f"User-Agent: Python-urllib/{urllib.request.__version__}\r\n\r\n".encode('latin-1'))
+            await writer.drain()
+            status_line = (await reader.readline()).decode('latin-1').split(None, 2)
+            header_lines = []
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                header_lines.append(line)
+        finally:
+            writer.close()
+        if len(status_line) < 2 or not status_line[0].startswith('HTTP/'):
+            raise urllib.error.URLError(f"invalid response from {url}")
+        status, reason = int(status_line[1]), status_line[2].strip() if len(status_line) > 2 else ''
+        headers = http.client.parse_headers(io.BytesIO(b''.join(header_lines)))
+        if status in (301, 302, 303, 307, 308) and 'Location' in headers:
+            url = urllib.parse.urljoin(url, headers['Location'])
+            continue
+        if status >= 400:
+            raise urllib.error.HTTPError(url, status, reason, headers, None)
+        return str((headers['Last-Modified'], headers['Content-Length'], headers.get('ETag')))
+    raise urllib.error.URLError(f"too many redirects: {url}")
+
+
+def is_url(name_or_url: str) -> bool:
+    return '://' in name_or_url
 
 
 def signature(name_or_url: str) -> str:
@@ -16,22 +265,101 @@ def signature(name_or_url: str) -> str:
     :param name_or_url: directory, file name or url
     :return: Signature
     """
-    def file_signature(filepath) -> str:
-        st = os.stat(filepath)
-        return str((stat.S_IFMT(st.st_mode), st.st_size, st.st_mtime))
-
-    def dir_signature(dirname: str) -> str:
-        sigstr = file_signature(dirname)
-        for filename in sorted(os.listdir(dirname), key=os.path.normcase):
-            sigstr += signature(os.path.join(dirname, filename))
-        return hashlib.md5(sigstr.encode()).hexdigest()
-
-    def url_signature() -> str:
-        request = urllib.request.Request(name_or_url)
-        request.get_method = lambda: 'HEAD'
-        response = urllib.request.urlopen(request)
-        return str((response.info()['Last-Modified'], response.info()['Content-Length'], response.info().get('ETag')))
-
-    return url_signature() if '://' in name_or_url\
+    return url_signature(name_or_url) if is_url(name_or_url) \
         else dir_signature(name_or_url) if os.path.isdir(name_or_url) \
         else file_signature(name_or_url)
+
+
+class UrlSignatureCache:
+    """ Stale-while-revalidate cache of URL signatures.
+
+    A signature younger than `freshness` seconds is trusted as is.  Once it is older than that, the last known
+    signature is returned immediately and a background worker re-issues the HEAD request.  If the signature has
+    changed, the new value is returned on the following lookup (which causes the owning jar to invalidate the entry)
+    and `on_change` is invoked.
+    """
+    def __init__(self, freshness: float = 60.0, max_workers: int = 2,
+                 on_change: Optional[Callable[[str, str], None]] = None,
+                 signer: Callable[[str], str] = url_signature) -> None:
+        """ Create a URL signature cache
+
+        :param freshness: number of seconds that a signature is trusted without revalidation
+        :param max_workers: maximum number of concurrent background HEAD requests
+        :param on_change: callback invoked with (url, new signature) when revalidation detects a change
+        :param signer: function that computes the signature of a URL
+        """
+        self.freshness = freshness
+        self.on_change = on_change
+        self._signer = signer
+        self._max_workers = max_workers
+        self._executor: Optional["futures.ThreadPoolExecutor"] = None
+        self._signatures: Dict[str, Tuple[str, float]] = {}        # url --> (signature, time validated)
+        self._refreshing: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def _known_signature(self, url: str) -> Optional[str]:
+        """ Return the last known signature for url, if any, scheduling a revalidation if it is stale """
+        with self._lock:
+            entry = self._signatures.get(url)
+            if entry is None:
+                return None
+            sig, validated = entry
+            if time.monotonic() - validated >= self.freshness and url not in self._refreshing:
+                self._refreshing.add(url)
+                if self._executor is None:
+                    self._executor = futures.ThreadPoolExecutor(self._max_workers, thread_name_prefix='cachejar-url')
+                self._executor.submit(self._refresh, url)
+            return sig
+
+    def _remember(self, url: str, sig: str) -> str:
+        with self._lock:
+            self._signatures[url] = (sig, time.monotonic())
+        return sig
+
+    def signature(self, url: str) -> str:
+        """ Return the signature for url, revalidating in the background if it is stale """
+        sig = self._known_signature(url)
+        return sig if sig is not None else self._remember(url, self._signer(url))
+
+    async def asignature(self, url: str) -> str:
+        """ Asynchronous version of signature - a missing signature is retrieved without blocking the event loop """
+        sig = self._known_signature(url)
+        if sig is not None:
+            return sig
+        if self._signer is url_signature:
+            sig = await async_url_signature(url)
+        else:
+            sig = await asyncio.get_event_loop().run_in_executor(None, self._signer, url)
+        return self._remember(url, sig)
+
+    def _refresh(self, url: str) -> None:
+        """ Revalidate the signature for url """
+        try:
+            sig = self._signer(url)
+        except (urllib.error.URLError, OSError):
+            # Forget what we know - the next lookup will reissue the request in the foreground and report the error
+            with self._lock:
+                self._signatures.pop(url, None)
+                self._refreshing.discard(url)
+            return
+        with self._lock:
+            old_sig = self._signatures.get(url, (None, 0))[0]
+            self._signatures[url] = (sig, time.monotonic())
+            self._refreshing.discard(url)
+        if old_sig is not None and sig != old_sig and self.on_change:
+            self.on_change(url, sig)
+
+    def invalidate(self, url: Optional[str] = None) -> None:
+        """ Forget the signature for url (all urls if None) """
+        with self._lock:
+            if url is None:
+                self._signatures.clear()
+            else:
+                self._signatures.pop(url, None)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """ Stop the background workers """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
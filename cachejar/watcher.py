@@ -0,0 +1,280 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import sys
+import threading
+from typing import Callable, Dict, Optional, Set, Hashable, List, Tuple
+
+
+class Watcher:
+    """ Change notification for the files and directories that cached objects are derived from.
+
+    Subscriptions are made on behalf of a key (the jar uses the name_or_url of an entry).  The first change to
+    anything a key is subscribed to calls `on_change(key)` and drops the key's subscriptions - it is up to the
+    subscriber to re-sign the source and subscribe again.  If the watcher can no longer tell what has changed (the
+    kernel event queue overflowed) `on_overflow()` is called instead, and subscribers should re-sign everything.
+
+    Files are watched through the directory that contains them, which also catches a file being replaced by rename.
+    Directories and glob patterns are watched recursively.
+    """
+    synchronous = False             # True means poll() reports every change that completed before it was called
+
+    def __init__(self, on_change: Callable[[Hashable], None], on_overflow: Callable[[], None]) -> None:
+        self.on_change = on_change
+        self.on_overflow = on_overflow
+        self._lock = threading.RLock()
+        self._subscriptions: Dict[str, Dict[Hashable, Optional[Set[str]]]] = {}    # dir --> key --> names or None
+        self._keys: Dict[Hashable, Set[str]] = {}                                   # key --> dirs
+
+    def watch(self, key: Hashable, path: str) -> bool:
+        """ Subscribe key to changes to path - a file, directory or glob pattern
+
+        :return: False if path can't be watched, in which case key has no subscriptions
+        """
+        path = os.path.abspath(path)
+        if any(c in path for c in '*?['):
+            base = path[:min(path.index(c) for c in '*?[' if c in path)]
+            return self._watch_tree(key, os.path.dirname(base) if not base.endswith(os.sep) else base)
+        if os.path.isdir(path):
+            return self._watch_tree(key, path)
+        return self._subscribe(key, os.path.dirname(path), os.path.basename(path))
+
+    def _watch_tree(self, key: Hashable, top: str) -> bool:
+        found = False
+        for dirpath, _, _ in os.walk(top):
+            if not self._subscribe(key, dirpath, None):
+                return False
+            found = True
+        return found
+
+    def _subscribe(self, key: Hashable, dirpath: str, name: Optional[str]) -> bool:
+        with self._lock:
+            if dirpath not in self._subscriptions:
+                if not self._add_dir(dirpath):
+                    self.unwatch(key)
+                    return False
+                self._subscriptions[dirpath] = {}
+            subscribers = self._subscriptions[dirpath]
+            if name is None:
+                subscribers[key] = None
+            elif key not in subscribers:
+                subscribers[key] = {name}
+            elif subscribers[key] is not None:
+                subscribers[key].add(name)
+            self._keys.setdefault(key, set()).add(dirpath)
+            return True
+
+    def unwatch(self, key: Hashable) -> None:
+        """ Drop all of the subscriptions for key """
+        with self._lock:
+            for dirpath in self._keys.pop(key, ()):
+                subscribers = self._subscriptions.get(dirpath)
+                if subscribers is not None:
+                    subscribers.pop(key, None)
+                    if not subscribers:
+                        del self._subscriptions[dirpath]
+                        self._remove_dir(dirpath)
+
+    def _changed(self, dirpath: str, name: Optional[str]) -> None:
+        """ Report a change to name in dirpath (None means the directory itself) """
+        with self._lock:
+            keys = [key for key, names in self._subscriptions.get(dirpath, {}).items()
+                    if names is None or name is None or name in names]
+            for key in keys:
+                self.unwatch(key)
+        for key in keys:
+            self.on_change(key)
+
+    def poll(self) -> None:
+        """ Deliver any changes that have been detected but not yet reported """
+        pass
+
+    def close(self) -> None:
+        with self._lock:
+            for key in list(self._keys):
+                self.unwatch(key)
+
+    def _add_dir(self, dirpath: str) -> bool:
+        raise NotImplementedError()
+
+    def _remove_dir(self, dirpath: str) -> None:
+        raise NotImplementedError()
+
+
+class InotifyWatcher(Watcher):
+    """ Linux inotify.  Events are read without blocking when poll is called, so a change that completed before a
+    lookup is always seen by it """
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_MOVE_SELF = 0x800
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ONLYDIR = 0x1000000
+    watch_mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | \
+        IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+    event_header = struct.Struct('iIII')            # wd, mask, cookie, len
+    synchronous = True
+
+    _libc = None
+
+    @classmethod
+    def available(cls) -> bool:
+        if not sys.platform.startswith('linux'):
+            return False
+        if cls._libc is None:
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+                for fn in ('inotify_init1', 'inotify_add_watch', 'inotify_rm_watch'):
+                    getattr(libc, fn)
+            except (OSError, AttributeError):
+                return False
+            cls._libc = libc
+        return True
+
+    def __init__(self, on_change: Callable[[Hashable], None], on_overflow: Callable[[], None]) -> None:
+        super().__init__(on_change, on_overflow)
+        if not self.available():
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wds: Dict[str, int] = {}              # dir --> watch descriptor
+        self._paths: Dict[int, str] = {}            # watch descriptor --> dir
+
+    def _add_dir(self, dirpath: str) -> bool:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), self.watch_mask)
+        if wd < 0:                                  # Gone, not a directory, or out of watches (ENOSPC)
+            return False
+        self._wds[dirpath] = wd
+        self._paths[wd] = dirpath
+        return True
+
+    def _remove_dir(self, dirpath: str) -> None:
+        wd = self._wds.pop(dirpath, None)
+        if wd is not None and self._paths.get(wd) == dirpath:
+            del self._paths[wd]
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def poll(self) -> None:
+        changes: List[Tuple[str, Optional[str]]] = []
+        overflow = False
+        with self._lock:
+            if self._fd < 0:
+                return
+            while True:
+                try:
+                    data = os.read(self._fd, 64 * 1024)
+                except BlockingIOError:
+                    break
+                offset = 0
+                while offset < len(data):
+                    wd, mask, _, length = self.event_header.unpack_from(data, offset)
+                    offset += self.event_header.size
+                    name = data[offset:offset + length].rstrip(b'\0')
+                    offset += length
+                    if mask & self.IN_Q_OVERFLOW:
+                        overflow = True
+                        continue
+                    dirpath = self._paths.get(wd)
+                    if dirpath is None:
+                        continue
+                    if mask & (self.IN_IGNORED | self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                        changes.append((dirpath, None))
+                        if mask & self.IN_IGNORED:          # The kernel has dropped the watch
+                            del self._paths[wd]
+                            self._wds.pop(dirpath, None)
+                    else:
+                        changes.append((dirpath, os.fsdecode(name) if name else None))
+        for dirpath, name in changes:
+            self._changed(dirpath, name)
+        if overflow:
+            self.on_overflow()
+
+    def close(self) -> None:
+        super().close()
+        with self._lock:
+            if self._fd >= 0:
+                os.close(self._fd)
+                self._fd = -1
+
+
+class PollingWatcher(Watcher):
+    """ Portable fallback - a background thread rescans the watched directories every `interval` seconds.  Changes
+    are reported up to `interval` seconds after they happen. """
+    interval = 1.0
+
+    def __init__(self, on_change: Callable[[Hashable], None], on_overflow: Callable[[], None]) -> None:
+        super().__init__(on_change, on_overflow)
+        self._snapshots: Dict[str, Dict[str, tuple]] = {}      # dir --> name --> stat key ('' is the dir itself)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _scan(dirpath: str) -> Optional[Dict[str, tuple]]:
+        try:
+            st = os.stat(dirpath)
+            snapshot = {'': (st.st_ino, st.st_mtime_ns)}
+            with os.scandir(dirpath) as it:
+                for entry in it:
+                    try:
+                        est = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    snapshot[entry.name] = (est.st_ino, est.st_size, est.st_mtime_ns, est.st_ctime_ns)
+        except OSError:
+            return None
+        return snapshot
+
+    def _add_dir(self, dirpath: str) -> bool:
+        snapshot = self._scan(dirpath)
+        if snapshot is None:
+            return False
+        self._snapshots[dirpath] = snapshot
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='cachejar-watcher', daemon=True)
+            self._thread.start()
+        return True
+
+    def _remove_dir(self, dirpath: str) -> None:
+        self._snapshots.pop(dirpath, None)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.rescan()
+
+    def rescan(self) -> None:
+        """ Compare the watched directories with their last snapshots, reporting any differences """
+        with self._lock:
+            dirpaths = list(self._snapshots)
+        for dirpath in dirpaths:
+            snapshot = self._scan(dirpath)
+            with self._lock:
+                previous = self._snapshots.get(dirpath)
+                if previous is None:
+                    continue
+                if snapshot is not None:
+                    self._snapshots[dirpath] = snapshot
+            if snapshot is None or snapshot[''][0] != previous[''][0]:
+                self._changed(dirpath, None)                # Removed or replaced
+            else:
+                for name in set(snapshot) | set(previous):
+                    if snapshot.get(name) != previous.get(name):
+                        self._changed(dirpath, name)        # '' - the directory itself, which only dirs care about
+
+    def close(self) -> None:
+        self._stop.set()
+        super().close()
+
+
+def create_watcher(on_change: Callable[[Hashable], None], on_overflow: Callable[[], None]) -> Watcher:
+    """ Return an inotify watcher if the platform supports it, otherwise a polling one """
+    return InotifyWatcher(on_change, on_overflow) if InotifyWatcher.available() else \
+        PollingWatcher(on_change, on_overflow)
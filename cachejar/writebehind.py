@@ -0,0 +1,91 @@
+import atexit
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class WriteBehindQueue:
+    """ Bounded queue of updates that a background thread writes to a jar.
+
+    Items are keyed, and stay visible through `get` until `write_batch` has returned for them, so a reader never sees
+    a gap between an item leaving the queue and it being in the jar.  The writer takes everything that is queued at
+    once, so updates that arrive while a batch is being written are written together in the next one.  `put` blocks
+    while `max_pending` items are queued.  The queue is drained when the interpreter exits.
+    """
+    def __init__(self, write_batch: Callable[[List[Tuple[Hashable, Any]]], List[BaseException]],
+                 max_pending: int = 100) -> None:
+        """ Create a queue and start its writer thread
+
+        :param write_batch: function that writes a list of (key, item) pairs, returning the errors for any that
+        couldn't be written.  Called on the writer thread
+        :param max_pending: maximum number of queued items
+        """
+        self.max_pending = max_pending
+        self._write_batch = write_batch
+        self._queued: Dict[Hashable, Any] = {}
+        self._writing = False
+        self._closed = False
+        self._errors: List[BaseException] = []
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='cachejar-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """ Return the item queued under key, None if there isn't one """
+        return self._queued.get(key)
+
+    def put(self, key: Hashable, item: Any) -> None:
+        """ Queue item under key, replacing any item that is already queued under it.  Blocks while the queue is full
+        """
+        with self._cond:
+            while len(self._queued) >= self.max_pending and key not in self._queued and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                raise ValueError("Write-behind queue is closed")
+            self._queued[key] = item
+            self._cond.notify_all()
+
+    def drain(self) -> None:
+        """ Wait until everything that has been queued has been written """
+        with self._cond:
+            while self._queued or self._writing:
+                self._cond.wait()
+
+    def take_errors(self) -> List[BaseException]:
+        """ Return the errors for the items that couldn't be written since the last call """
+        with self._cond:
+            errors, self._errors = self._errors, []
+        return errors
+
+    def close(self) -> None:
+        """ Drain the queue and stop the writer thread """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        atexit.unregister(self.close)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queued and not self._closed:
+                    self._cond.wait()
+                if not self._queued:
+                    return
+                batch = list(self._queued.items())
+                self._writing = True
+            try:
+                errors = self._write_batch(batch)
+            except Exception as e:
+                errors = [e]
+            with self._cond:
+                self._errors += errors
+                for key, item in batch:
+                    if self._queued.get(key) is item:           # It may have been replaced while it was written
+                        del self._queued[key]
+                self._writing = False
+                self._cond.notify_all()
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import threading
+import time
+import unittest
+import urllib.error
+from pathlib import Path
+from unittest import mock
+
+from cachejar.jar import CacheFactory
+from cachejar.locking import FileLock
+from cachejar.signature import async_url_signature, url_signature, UrlSignatureCache
+from tests.test_url_signature import ResourceHandler
+from tests.utils.http_server import ThreadingHTTPServer
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class RedirectingHandler(ResourceHandler):
+    def do_HEAD(self):
+        if self.path == '/moved':
+            self.send_response(301)
+            self.send_header('Location', '/resource')
+            self.end_headers()
+        else:
+            super().do_HEAD()
+
+
+class AsyncTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    datafilename = os.path.join(datadir, 'datafile')
+    test_dir = os.path.join(datadir, 'cache')
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), RedirectingHandler)
+        cls.server.version = 1
+        cls.server.nrequests = 0
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.jar = CacheFactory(self.test_dir).cachejar('test_async')
+
+    def tearDown(self):
+        make_and_clear_directory(self.test_dir)
+
+    @staticmethod
+    def run_async(coro):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+
+    def test_url_signature(self):
+        url = self.base + '/resource'
+        self.assertEqual(url_signature(url), self.run_async(async_url_signature(url)))
+        self.assertEqual(url_signature(url), self.run_async(async_url_signature(self.base + '/moved')))
+        with self.assertRaises(urllib.error.HTTPError):
+            self.run_async(async_url_signature(self.base + '/missing'))
+
+    def test_jar(self):
+        async def scenario():
+            self.assertIsNone(await self.jar.aobject_for(self.datafilename, 'obj'))
+            self.assertTrue(await self.jar.aupdate(self.datafilename, [1, 2], 'obj'))
+            self.assertFalse(await self.jar.aupdate(self.datafilename, [1, 2], 'obj'))
+            self.assertEqual([1, 2], await self.jar.aobject_for(self.datafilename, 'obj'))
+            url = self.base + '/resource'
+            self.assertTrue(await self.jar.aupdate(url, 'remote', 'obj', 1))
+            self.assertEqual('remote', await self.jar.aobject_for(url, 'obj', 1))
+            self.assertEqual(1, await self.jar.aclean(url))
+            self.assertIsNone(await self.jar.aobject_for(url, 'obj', 1))
+            Path(self.datafilename).touch()
+            self.assertIsNone(await self.jar.aobject_for(self.datafilename, 'obj'))
+        self.run_async(scenario())
+        self.assertEqual([], [f for f in os.listdir(self.jar.cache_directory) if f.startswith('A')])
+
+    def test_write_behind(self):
+        """ Updates go through the write-behind queue, and aclean waits for it without blocking the event loop """
+        self.jar.write_behind = True
+        release = threading.Event()
+        write_blob = self.jar._write_blob
+        self.jar._write_blob = lambda *args: release.wait(10) and write_blob(*args)
+
+        async def scenario():
+            self.assertTrue(await self.jar.aupdate(self.datafilename, [1, 2], 'obj'))
+            self.assertEqual(0, self.jar.total_objects)                 # Queued, not written yet
+            self.assertEqual([1, 2], await self.jar.aobject_for(self.datafilename, 'obj'))
+            asyncio.get_event_loop().call_later(0.1, release.set)      # Only runs if the loop is free
+            start = time.monotonic()
+            self.assertEqual(1, await self.jar.aclean(self.datafilename))
+            self.assertLess(time.monotonic() - start, 5)
+        try:
+            self.run_async(scenario())
+        finally:
+            self.jar.write_behind = False
+        self.assertEqual(0, self.jar.total_objects)
+
+    def test_index_lock(self):
+        """ Waiting for an index lock that another process holds doesn't hold up the event loop """
+        held = threading.Event()
+
+        def other_process():
+            with FileLock(self.jar._index_lock.path).exclusive():
+                held.set()
+                time.sleep(0.3)
+
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def scenario():
+            task = asyncio.ensure_future(ticker())
+            self.assertTrue(await self.jar.aupdate(self.datafilename, 'obj', 'obj'))
+            self.assertEqual('obj', await self.jar.aobject_for(self.datafilename, 'obj'))
+            task.cancel()
+
+        other = threading.Thread(target=other_process)
+        other.start()
+        held.wait(10)
+        self.run_async(scenario())
+        other.join()
+        self.assertGreater(len(ticks), 10)
+        self.assertTrue(self.jar.threadsafe)
+
+    def test_url_cache(self):
+        self.jar.url_signatures = UrlSignatureCache(freshness=60)
+        url = self.base + '/resource'
+
+        async def scenario():
+            await self.jar.aupdate(url, 'remote', 'obj')
+            self.server.nrequests = 0
+            for _ in range(5):
+                self.assertEqual('remote', await self.jar.aobject_for(url, 'obj'))
+        self.run_async(scenario())
+        self.assertEqual(0, self.server.nrequests)
+        self.jar.url_signatures.shutdown()
+
+    def test_coalescing(self):
+        """ Concurrent lookups of the same object are satisfied by a single read """
+        self.jar.update(self.datafilename, {'a': 1}, 'obj')
+
+        async def scenario():
+            return await asyncio.gather(*[self.jar.aobject_for(self.datafilename, 'obj') for _ in range(10)],
+                                        self.jar.aobject_for(self.datafilename, 'other'))
+        with mock.patch.object(self.jar, '_load_blob', wraps=self.jar._load_blob) as load:
+            results = self.run_async(scenario())
+            self.assertEqual(1, load.call_count)
+        self.assertEqual([{'a': 1}] * 10 + [None], results)
+        self.assertEqual({}, self.jar._inflight)
+
+        # Concurrent updates are only shared if they store the same object
+        obj = ['same']
+
+        async def updates():
+            return await asyncio.gather(self.jar.aupdate(self.datafilename, obj, 'new'),
+                                        self.jar.aupdate(self.datafilename, obj, 'new'),
+                                        self.jar.aupdate(self.datafilename, ['other'], 'new'))
+        with mock.patch.object(self.jar, '_aupdate', wraps=self.jar._aupdate) as aupdate:
+            results = self.run_async(updates())
+            self.assertEqual(2, aupdate.call_count)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual({}, self.jar._inflight)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from cachejar.jar import CacheFactory
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class BatchTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    datafilename = os.path.join(datadir, 'datafile')
+    datafilename2 = os.path.join(datadir, 'datafile2')
+    test_dir = os.path.join(datadir, 'cache')
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.jar = CacheFactory(self.test_dir).cachejar('test_batch')
+
+    def tearDown(self):
+        make_and_clear_directory(self.test_dir)
+
+    def test_batch(self):
+        updates = [(self.datafilename, f"obj {i}", 'obj', (i,)) for i in range(20)] + \
+                  [(self.datafilename2, "kw", 'obj', (), {'kw': True}),
+                   (self.datafilename2, "plain", 'obj'),
+                   (self.datafilename2, "duplicate", 'obj')]
+        with mock.patch.object(self.jar, '_signature', wraps=self.jar._signature) as sig, \
+                mock.patch.object(self.jar._journal, '_write', wraps=self.jar._journal._write) as write:
+            results = self.jar.update_many(updates)
+            self.assertEqual(2, sig.call_count)
+            self.assertEqual(1, write.call_count)
+        self.assertEqual([True] * 22 + [False], results)
+
+        requests = [(self.datafilename, 'obj', (i,)) for i in range(25)] + \
+                   [(self.datafilename2, 'obj', (), {'kw': True}), (self.datafilename2, 'obj'),
+                    ('/nonexistent/file', 'obj')]
+        with mock.patch.object(self.jar, '_signature', wraps=self.jar._signature) as sig:
+            results = self.jar.object_for_many(requests)
+            self.assertEqual(2, sig.call_count)
+        self.assertEqual([f"obj {i}" for i in range(20)] + [None] * 5 + ["kw", "plain", None], results)
+        self.assertEqual(results, [self.jar.object_for(r[0], r[1], *(r[2] if len(r) > 2 else ()),
+                                                       **(r[3] if len(r) > 3 else {})) for r in requests])
+
+        # Changed sources are invalidated
+        Path(self.datafilename2).touch()
+        self.assertEqual([None, "obj 1"], self.jar.object_for_many([(self.datafilename2, 'obj'),
+                                                                    (self.datafilename, 'obj', (1,))]))
+        self.jar.disabled = True
+        self.assertEqual([None], self.jar.object_for_many([(self.datafilename, 'obj', (1,))]))
+        self.assertEqual([False], self.jar.update_many([(self.datafilename, 'x', 'obj', (100,))]))
+
+    def test_duplicates(self):
+        """ The same object requested more than once in a batch is read once """
+        self.jar.update(self.datafilename, [1, 2, 3], 'obj')
+        with mock.patch.object(self.jar, '_load_blob', wraps=self.jar._load_blob) as load:
+            a, b = self.jar.object_for_many([(self.datafilename, 'obj')] * 2)
+            self.assertEqual(1, load.call_count)
+        self.assertIs(a, b)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -34,7 +34,7 @@ class CacheJarTestCase(unittest.TestCase):
         cachejar.factory.clear(self.appid2, remove_completely=True)
 
     def num_data_files(self) -> int:
-        return len([f for f in os.listdir(cachejar.factory.cache_directory(self.appid)) if f != 'index'])
+        return len([f for f in os.listdir(cachejar.factory.cache_directory(self.appid)) if f.startswith('A')])
 
     def test_pickled_file(self):
         """ Basic functional tests """
@@ -79,14 +79,17 @@ class CacheJarTestCase(unittest.TestCase):
         
         # Clean everything for a single file, and obj id
         jar.clean(self.datafilename, TestObj, 'robin', -173)
+        jar.wait_for_background()                   # Files are removed in the background
         self.assertEqual(2, self.num_data_files())
         
         # Clean everything for a whole file
         jar.clean(self.datafilename)
+        jar.wait_for_background()
         self.assertEqual(1, self.num_data_files())
         
         # Clean everything
         jar.clean()
+        jar.wait_for_background()
         self.assertEqual(0, self.num_data_files())
         
     def test_multi_applications(self):
@@ -174,7 +177,7 @@ class CacheJarTestCase(unittest.TestCase):
 
     def test_damaged_index(self):
         """ Make sure we know what happens when the index isn't right """
-        from cachejar.jar import CacheFactory, CacheError
+        from cachejar.jar import CacheFactory
 
         appid = 'test_damaged_index'
         test_dir = os.path.join(self.datadir, 'cache')
@@ -185,8 +188,9 @@ class CacheJarTestCase(unittest.TestCase):
         jar.update(self.datafilename, o, TestObj)
         with open(jar._cache_directory_index, 'a') as f:
             f.write("dirt")
-        with self.assertRaises(CacheError):
-            CacheFactory(test_dir)
+        # The index isn't read until the jar is referenced.  It is rebuilt from the cache files
+        local_factory = CacheFactory(test_dir)
+        self.assertEqual(o, local_factory.cachejar(appid).object_for(self.datafilename, TestObj))
         make_and_clear_directory(test_dir)
 
     def test_reload_file(self):
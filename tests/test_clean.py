@@ -0,0 +1,72 @@
+import os
+import unittest
+
+from cachejar.jar import CacheFactory
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class CleanTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    test_dir = os.path.join(datadir, 'cache')
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.src = os.path.join(self.test_dir, 'src')
+        os.makedirs(self.src)
+        self.sources = [os.path.join(self.src, f'f{i}') for i in range(5)]
+        for source in self.sources:
+            with open(source, 'w') as f:
+                f.write(source)
+        self.root = os.path.join(self.test_dir, 'root')
+        self.jar = CacheFactory(self.root).cachejar('test_clean')
+        self.jar.update_many([(source, obj_id, obj_id, parms) for source in self.sources
+                              for obj_id, parms in [('parse', (1,)), ('parse', (2,)), ('parse', ()), ('render', (1,))]])
+
+    def tearDown(self):
+        make_and_clear_directory(self.test_dir)
+
+    def cache_files(self) -> int:
+        self.jar.wait_for_background()
+        return len([f for f in os.listdir(self.jar.cache_directory) if f.startswith('A')])
+
+    def test_targeted(self):
+        self.assertEqual(20, self.cache_files())
+        self.assertEqual(5, self.jar.clean(None, 'parse', 1))
+        self.assertEqual(15, self.cache_files())
+        self.assertIsNone(self.jar.object_for(self.sources[0], 'parse', 1))
+        self.assertEqual('parse', self.jar.object_for(self.sources[0], 'parse', 2))
+        self.assertEqual(0, self.jar.clean(None, 'parse', 1))
+
+        self.assertEqual(1, self.jar.clean(self.sources[1], 'parse'))
+        self.assertEqual(9, self.jar.clean_variants('parse'))
+        self.assertEqual(5, self.cache_files())
+        self.assertEqual(5, self.jar.total_objects)
+        self.assertEqual('render', self.jar.object_for(self.sources[0], 'render', 1))
+        self.assertEqual(1, self.jar.clean_variants('render', self.sources[0]))
+        self.assertEqual(4, self.jar.total_objects)
+
+        # Sources with no objects left are removed
+        self.assertNotIn(self.sources[0], self.jar._cache)
+        self.assertEqual(4, len(self.jar._cache))
+
+    def test_index_maintenance(self):
+        """ The secondary index follows changes made by the jar and by other processes """
+        self.assertEqual(5, self.jar.clean(None, 'parse', 1))       # Builds the secondary index
+        self.jar.update(self.sources[0], 'again', 'parse', 1)
+        jar2 = CacheFactory(self.root).cachejar('test_clean')
+        jar2.update(self.sources[1], 'other', 'parse', 1)
+        jar2.clean(self.sources[2], 'parse', 2)
+        self.assertEqual(2, self.jar.clean(None, 'parse', 1))
+        self.assertEqual(9, self.jar.clean_variants('parse'))
+
+        # Invalidated entries drop out of it as well
+        with open(self.sources[3], 'w') as f:
+            f.write('changed')
+        self.assertIsNone(self.jar.object_for(self.sources[3], 'render', 1))
+        self.assertEqual(4, self.jar.clean_variants('render'))
+        self.assertEqual(0, self.jar.total_objects)
+        self.assertEqual(0, self.cache_files())
+
+
+if __name__ == '__main__':
+    unittest.main()
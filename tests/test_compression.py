@@ -0,0 +1,57 @@
+import os
+import unittest
+
+from cachejar.compression import codecs, get_codec
+from cachejar.jar import CacheFactory
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class CompressionTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    datafilename = os.path.join(datadir, 'datafile')
+    test_dir = os.path.join(datadir, 'cache')
+    big = {'triples': [('subject', 'predicate', f'object {i % 10}') for i in range(5000)]}
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.jar = CacheFactory(self.test_dir).cachejar('test_compression')
+
+    def tearDown(self):
+        make_and_clear_directory(self.test_dir)
+
+    def info(self, obj_id):
+        return self.jar._cache[self.datafilename].objects[self.jar._identity(obj_id)]
+
+    def test_codecs(self):
+        for name in ('zlib', 'lzma', 'bz2'):
+            self.assertIn(name, codecs)
+        for codec in codecs.values():
+            self.assertEqual(b'abc' * 100, codec.decompress(codec.compress(b'abc' * 100)))
+        with self.assertRaises(KeyError):
+            get_codec('zip')
+
+    def test_compression(self):
+        self.jar.update(self.datafilename, self.big, 'raw')
+        raw_size = self.info('raw').size
+        self.assertIsNone(self.info('raw').codec)
+
+        self.jar.compression = 'zlib'
+        self.jar.update(self.datafilename, self.big, 'zlib')
+        self.jar.update(self.datafilename, 'small', 'small')
+        self.jar.compression = 'lzma'
+        self.jar.update(self.datafilename, self.big, 'lzma')
+
+        self.assertEqual('zlib', self.info('zlib').codec)
+        self.assertLess(self.info('zlib').size, raw_size / 10)
+        self.assertEqual('lzma', self.info('lzma').codec)
+        self.assertIsNone(self.info('small').codec)
+
+        # Mixed codecs are read back transparently
+        jar2 = CacheFactory(self.test_dir).cachejar('test_compression')
+        for obj_id in ('raw', 'zlib', 'lzma'):
+            self.assertEqual(self.big, jar2.object_for(self.datafilename, obj_id))
+        self.assertEqual('small', jar2.object_for(self.datafilename, 'small'))
+
+
+if __name__ == '__main__':
+    unittest.main()
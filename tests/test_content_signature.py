@@ -0,0 +1,119 @@
+import hashlib
+import os
+import shutil
+import time
+import unittest
+from unittest import mock
+
+from cachejar.jar import CacheFactory
+from cachejar.signature import ContentSigner
+from tests.utils.file_utils import FileTesting
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class ContentSignatureTestCase(FileTesting):
+    cache_dir = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'data', 'cache')
+
+    def setUp(self):
+        super().setUp()
+        make_and_clear_directory(self.cache_dir)
+        self.memo_path = os.path.join(self.cache_dir, 'hashes')
+
+    def tearDown(self):
+        make_and_clear_directory(self.cache_dir)
+        super().tearDown()
+
+    def fpath(self, fname: str, subdir: str = '') -> str:
+        return os.path.join(self.test_dir, subdir, fname)
+
+    def age(self, fname: str, subdir: str = '') -> None:
+        """ Move the modification time of a file far enough into the past that its digest can be remembered """
+        past = time.time() - 60
+        os.utime(self.fpath(fname, subdir), (past, past))
+
+    def test_content(self):
+        signer = ContentSigner()
+        self.add_file('data1.txt')
+        sig = signer.signature(self.fpath('data1.txt'))
+        self.assertTrue(sig.startswith('blake2b:'))
+        self.age('data1.txt')
+        self.assertEqual(sig, signer.signature(self.fpath('data1.txt')))
+        self.modify_file('data1.txt')
+        self.assertNotEqual(sig, signer.signature(self.fpath('data1.txt')))
+
+        # Same answer through mmap
+        self.add_file('data2.txt')
+        with mock.patch.object(ContentSigner, 'mmap_threshold', 1):
+            mapped_sig = signer.signature(self.fpath('data2.txt'))
+        self.assertEqual(mapped_sig, ContentSigner().signature(self.fpath('data2.txt')))
+        with open(self.fpath('empty.txt'), 'w'):
+            pass
+        self.assertEqual('blake2b:' + hashlib.blake2b().hexdigest(), signer.signature(self.fpath('empty.txt')))
+
+    def test_memo(self):
+        """ Files are only rehashed when their stat changes """
+        self.add_file('data1.txt')
+        self.age('data1.txt')
+        signer = ContentSigner(self.memo_path)
+        with mock.patch.object(ContentSigner, 'hash_file', wraps=ContentSigner.hash_file) as hash_file:
+            sig = signer.signature(self.fpath('data1.txt'))
+            self.assertEqual(sig, signer.signature(self.fpath('data1.txt')))
+            self.assertEqual(1, hash_file.call_count)
+            self.assertEqual(sig, ContentSigner(self.memo_path).signature(self.fpath('data1.txt')))
+            self.assertEqual(1, hash_file.call_count)
+
+            # A recently modified file isn't remembered, as it might be rewritten within the same clock tick
+            self.add_file('data2.txt')
+            signer.signature(self.fpath('data2.txt'))
+            signer.signature(self.fpath('data2.txt'))
+            self.assertEqual(3, hash_file.call_count)
+
+    def test_save(self):
+        """ Signers sharing a memo save it independently, and a failed save is retried """
+        self.add_file('data1.txt')
+        self.age('data1.txt')
+        memo_path = os.path.join(self.cache_dir, 'missing', 'hashes')
+        signer = ContentSigner(memo_path)
+        sig = signer.signature(self.fpath('data1.txt'))         # Nowhere to save it
+        self.assertFalse(os.path.exists(memo_path))
+        os.makedirs(os.path.dirname(memo_path))
+        self.add_file('data2.txt')
+        self.age('data2.txt')
+        signer2 = ContentSigner(memo_path)
+        signer2.signature(self.fpath('data2.txt'))
+        signer.signature(self.fpath('data1.txt'))
+        self.assertEqual(['hashes'], os.listdir(os.path.dirname(memo_path)))
+        with mock.patch.object(ContentSigner, 'hash_file') as hash_file:
+            self.assertEqual(sig, ContentSigner(memo_path).signature(self.fpath('data1.txt')))
+            self.assertEqual(0, hash_file.call_count)
+
+    def test_copies(self):
+        """ Identical copies of a directory have the same signature regardless of their timestamps """
+        self.make_subdir('a')
+        self.add_file('x.txt', 'a')
+        self.make_subdir(os.path.join('a', 'b'))
+        self.add_file('y.txt', os.path.join('a', 'b'))
+        signer = ContentSigner()
+        sig = signer.signature(self.fpath('a'))
+        time.sleep(0.01)
+        shutil.copytree(self.fpath('a'), self.fpath('c'))
+        self.assertEqual(sig, signer.signature(self.fpath('c')))
+        self.modify_file('y.txt', os.path.join('c', 'b'))
+        self.assertNotEqual(sig, signer.signature(self.fpath('c')))
+
+    def test_jar(self):
+        jar = CacheFactory(self.cache_dir).cachejar('test_content_signature')
+        self.assertEqual('stat', jar.signature_mode)
+        jar.signature_mode = 'content'
+        self.add_file('data1.txt')
+        jar.update(self.fpath('data1.txt'), 'obj', 'id')
+        self.touch_file('data1.txt')
+        self.assertEqual('obj', jar.object_for(self.fpath('data1.txt'), 'id'))
+        self.modify_file('data1.txt')
+        self.assertIsNone(jar.object_for(self.fpath('data1.txt'), 'id'))
+        with self.assertRaises(ValueError):
+            jar.signature_mode = 'fast'
+
+
+if __name__ == '__main__':
+    unittest.main()
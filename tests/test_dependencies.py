@@ -0,0 +1,99 @@
+import os
+import pickle
+import threading
+import time
+import unittest
+
+from cachejar import Dependencies
+from cachejar.jar import CacheFactory
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+def touch(path: str, text: str = 'x') -> None:
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+class DependenciesTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    test_dir = os.path.join(datadir, 'cache')
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.src = os.path.join(self.test_dir, 'src')
+        os.makedirs(os.path.join(self.src, 'data'))
+        os.makedirs(os.path.join(self.src, 'rules'))
+        self.schema = os.path.join(self.src, 'schema.json')
+        touch(self.schema)
+        touch(os.path.join(self.src, 'data', 'd1'))
+        touch(os.path.join(self.src, 'rules', 'r1.yaml'))
+        self.deps = Dependencies(self.schema, os.path.join(self.src, 'data'),
+                                 os.path.join(self.src, 'rules', '*.yaml'))
+        self.jar = CacheFactory(self.test_dir).cachejar('test_dependencies')
+
+    def tearDown(self):
+        make_and_clear_directory(self.test_dir)
+
+    def test_key(self):
+        self.assertEqual(Dependencies('b', 'a', 'a'), Dependencies('a', 'b'))
+        self.assertEqual(['a', 'b'], Dependencies('b', 'a').sources)
+        self.assertNotEqual(Dependencies('a', 'b'), Dependencies('a'))
+        self.assertEqual(self.deps.sources, pickle.loads(pickle.dumps(self.deps)).sources)
+        with self.assertRaises(ValueError):
+            Dependencies()
+
+    def test_jar(self):
+        self.jar.update(self.deps, 'model', 'model')
+        self.assertEqual('model', self.jar.object_for(self.deps, 'model'))
+        self.assertEqual('model', self.jar.object_for(Dependencies(*reversed(self.deps.sources)), 'model'))
+
+        def changed(change):
+            self.jar.update(self.deps, 'model', 'model')
+            self.assertEqual('model', self.jar.object_for(self.deps, 'model'))
+            time.sleep(0.01)
+            change()
+            self.assertIsNone(self.jar.object_for(self.deps, 'model'))
+
+        changed(lambda: touch(self.schema, 'changed'))
+        changed(lambda: touch(os.path.join(self.src, 'data', 'd2')))
+        changed(lambda: touch(os.path.join(self.src, 'rules', 'r2.yaml')))
+        changed(lambda: touch(os.path.join(self.src, 'rules', 'r1.yaml'), 'changed'))
+        touch(os.path.join(self.src, 'rules', 'r3.txt'))                            # Not part of the pattern
+        self.jar.update(self.deps, 'model', 'model')
+        touch(os.path.join(self.src, 'rules', 'r4.txt'))
+        self.assertEqual('model', self.jar.object_for(self.deps, 'model'))
+
+        # Dependencies can be used anywhere a name_or_url can
+        @self.jar.memoize()
+        def build(deps, n):
+            return n * 2
+        self.assertEqual(4, build(self.deps, 2))
+        self.assertEqual(4, self.jar.object_for(self.deps, 'tests.test_dependencies.DependenciesTestCase.test_jar.'
+                                                           '<locals>.build', 2))
+
+    def test_incremental(self):
+        """ Members are signed concurrently and validation stops at the first one that has changed """
+        deps = Dependencies('a', 'b', 'c', 'd')
+        started = set()
+        lock = threading.Lock()
+
+        def signer(source):
+            with lock:
+                started.add(source)
+            if source != 'a':
+                time.sleep(0.5)
+            return source + '1'
+
+        start = time.time()
+        sig = deps.signature(signer)
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(4, len(started))
+        self.assertEqual(sig, deps.signature(signer, sig))
+
+        start = time.time()
+        self.assertIsNone(deps.signature(lambda source: signer(source).replace('a1', 'a2'), sig))
+        self.assertLess(time.time() - start, 0.4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import hashlib
+import os
+import stat
+import time
+import unittest
+from unittest import mock
+
+from cachejar.signature import DirectorySigner
+from tests.utils.file_utils import FileTesting
+
+
+def listdir_signature(name: str) -> str:
+    """ The original listdir based signature algorithm """
+    st = os.stat(name)
+    sigstr = str((stat.S_IFMT(st.st_mode), st.st_size, st.st_mtime))
+    if os.path.isdir(name):
+        for filename in sorted(os.listdir(name), key=os.path.normcase):
+            sigstr += listdir_signature(os.path.join(name, filename))
+        return hashlib.md5(sigstr.encode()).hexdigest()
+    return sigstr
+
+
+class DirectorySignerTestCase(FileTesting):
+    def populate(self) -> None:
+        for f in ('b.txt', 'a.txt', 'C.txt'):
+            self.add_file(f)
+        self.make_subdir('sub')
+        self.add_file('x.txt', 'sub')
+        self.make_subdir(os.path.join('sub', 'deeper'))
+        self.add_file('y.txt', os.path.join('sub', 'deeper'))
+
+    def age(self) -> None:
+        """ Move the modification times of the directories far enough into the past that their listings can be
+        remembered """
+        past = time.time() - 60
+        for dirpath, _, _ in os.walk(self.test_dir):
+            os.utime(dirpath, (past, past))
+
+    def test_compatible(self):
+        """ Signatures are unchanged from the original implementation """
+        self.populate()
+        self.assertEqual(listdir_signature(self.test_dir), DirectorySigner().signature(self.test_dir))
+        self.assertEqual(listdir_signature(self.test_dir), DirectorySigner(max_workers=4).signature(self.test_dir))
+
+    def test_listing_reuse(self):
+        """ Directories whose stat hasn't changed aren't rescanned """
+        self.populate()
+        self.age()
+        signer = DirectorySigner()
+        sig = signer.signature(self.test_dir)
+        with mock.patch('os.scandir', side_effect=os.scandir) as scandir:
+            self.assertEqual(sig, signer.signature(self.test_dir))
+            self.assertEqual(0, scandir.call_count)
+
+            # A change in file content is still detected
+            self.modify_file('x.txt', 'sub')
+            sig2 = signer.signature(self.test_dir)
+            self.assertNotEqual(sig, sig2)
+            self.assertEqual(0, scandir.call_count)
+
+            # Adding a file rescans just the directory that changed
+            self.add_file('z.txt', os.path.join('sub', 'deeper'))
+            self.assertNotEqual(sig2, signer.signature(self.test_dir))
+            self.assertEqual(1, scandir.call_count)
+        self.assertEqual(listdir_signature(self.test_dir), signer.signature(self.test_dir))
+
+    def test_racy(self):
+        """ Listings of recently changed directories aren't remembered - another change within the same clock tick
+        wouldn't change the directory's stat """
+        self.populate()
+        signer = DirectorySigner()
+        sig = signer.signature(self.test_dir)
+        with mock.patch('os.scandir', side_effect=os.scandir) as scandir:
+            self.assertEqual(sig, signer.signature(self.test_dir))
+            self.assertEqual(3, scandir.call_count)
+        self.age()
+        with mock.patch('os.scandir', side_effect=os.scandir) as scandir:
+            signer.signature(self.test_dir)
+            signer.signature(self.test_dir)
+            self.assertEqual(3, scandir.call_count)
+
+    def test_file_signer(self):
+        """ File signatures can be supplied by the caller """
+        self.populate()
+        signer = DirectorySigner(file_signer=lambda path, st: os.path.basename(path))
+        sig = signer.signature(self.test_dir)
+        self.touch_file('x.txt', 'sub')
+        self.assertEqual(sig, signer.signature(self.test_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import pickle
+import unittest
+
+from cachejar import Dependencies
+from cachejar.jar import CacheFactory
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class FsckTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    test_dir = os.path.join(datadir, 'cache')
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.src = os.path.join(self.test_dir, 'src')
+        os.makedirs(self.src)
+        self.sources = [os.path.join(self.src, f'f{i}') for i in range(10)]
+        for source in self.sources:
+            with open(source, 'w') as f:
+                f.write(source)
+        self.root = os.path.join(self.test_dir, 'root')
+        self.jar = self.new_jar()
+        self.jar.update_many([(source, f'obj {i}', 'obj') for i, source in enumerate(self.sources)])
+
+    def tearDown(self):
+        make_and_clear_directory(self.test_dir)
+
+    def new_jar(self):
+        return CacheFactory(self.root).cachejar('test_fsck')
+
+    def path(self, fname: str) -> str:
+        return os.path.join(self.jar.cache_directory, fname)
+
+    def make_damage(self, dangling: int = 3) -> list:
+        """ Leave an orphan, an abandoned temporary file and a dangling object (for sources[dangling]) behind
+
+        :return: names of the orphans
+        """
+        orphan = self.jar._write_blob('orphan', 'pickle')           # Written, but never added to the index
+        with open(self.path(orphan.fname + '.tmp'), 'wb') as f:
+            f.write(b'partial')
+        os.remove(self.path(self.jar._cache[self.sources[dangling]].objects[self.jar._identity('obj')].fname))
+        return sorted([orphan.fname, orphan.fname + '.tmp'])
+
+    def test_fsck(self):
+        orphans = self.make_damage()
+        self.assertEqual([], self.jar.fsck(repair=False).orphans)    # Too young to be considered abandoned
+        self.jar.orphan_age = 0
+        report = self.jar.fsck(repair=False)
+        self.assertTrue(report.complete)
+        self.assertFalse(report.repaired)
+        self.assertEqual(orphans, sorted(report.orphans))
+        self.assertEqual([(self.sources[3], self.jar._identity('obj'))], report.dangling)
+        self.assertTrue(os.path.exists(self.path(orphans[0])))
+        self.assertEqual(10, self.jar.total_objects)
+
+        report = self.jar.fsck()
+        self.assertTrue(report.repaired)
+        self.assertFalse(any(os.path.exists(self.path(orphan)) for orphan in orphans))
+        self.assertEqual(9, self.jar.total_objects)
+        self.assertEqual(9, self.new_jar().total_objects)
+        self.assertEqual('obj 4', self.jar.object_for(self.sources[4], 'obj'))
+        report = self.jar.fsck()
+        self.assertEqual(([], []), (report.orphans, report.dangling))
+
+    def test_incremental(self):
+        orphans = self.make_damage()
+        self.jar.orphan_age = 0
+        nslices = 0
+        while True:
+            nslices += 1
+            report = self.jar.fsck(time_budget=0)
+            if report.complete:
+                break
+            self.assertEqual([], report.orphans)
+        self.assertGreater(nslices, 10)
+        self.assertEqual(orphans, sorted(report.orphans))
+        self.assertEqual(1, len(report.dangling))
+
+        self.make_damage(5)
+        report = self.jar.fsck_in_background(time_budget=0, pause=0).result()
+        self.assertEqual((2, 1), (len(report.orphans), len(report.dangling)))
+        self.assertEqual(8, self.jar.total_objects)
+
+    def test_concurrent_update(self):
+        """ The jar carries on being updated while fsck runs in the background """
+        future = self.jar.fsck_in_background(time_budget=0, pause=0)
+        self.assertTrue(self.jar.threadsafe)
+        for n in range(50):
+            self.jar.update(self.sources[n % 10], f'obj {n}', 'obj', n)
+        report = future.result()
+        self.assertEqual(([], []), (report.orphans, report.dangling))
+        self.assertEqual(60, self.jar.total_objects)
+        jar2 = self.new_jar()
+        self.assertEqual([f'obj {n}' for n in range(50)],
+                         jar2.object_for_many([(self.sources[n % 10], 'obj', (n,)) for n in range(50)]))
+
+    def test_rebuild(self):
+        """ A damaged index is rebuilt from the cache files """
+        self.jar.readable_identities = True
+        self.jar.compression = 'zlib'
+        self.jar.compression_threshold = 0
+        deps = Dependencies(self.sources[0], self.sources[1])
+        self.jar.update(deps, 'deps', 'model', 1, strict=True)
+        self.jar.update_using('pickle5', self.sources[2], list(range(100)), 'numbers')
+        legacy = self.path('A' + 24 * 'f')
+        with open(legacy, 'wb') as f:
+            pickle.dump('legacy', f)                                # No header - written by an earlier version
+        with open(self.jar._cache_directory_index, 'r+') as f:
+            f.truncate(os.path.getsize(self.jar._cache_directory_index) // 2)
+        os.remove(os.path.join(self.jar.cache_directory, 'journal'))
+
+        jar = self.new_jar()
+        self.assertEqual(12, jar.total_objects)
+        self.assertEqual([f'obj {i}' for i in range(10)], jar.object_for_many([(s, 'obj') for s in self.sources]))
+        self.assertEqual('deps', jar.object_for(deps, 'model', 1, strict=True))
+        self.assertEqual(list(range(100)), jar.object_for(self.sources[2], 'numbers'))
+        info = jar._cache[self.sources[2]].objects[jar._identity('numbers')]
+        self.assertEqual(('pickle5', 'zlib'), (info.serializer, info.codec))
+        self.assertIn("model(1,)", jar._cache[deps].objects[jar._identity('model', 1, strict=True)].label)
+
+        # Files that couldn't be placed are orphans
+        jar.orphan_age = 0
+        self.assertEqual(['A' + 24 * 'f'], jar.fsck().orphans)
+        self.assertFalse(os.path.exists(legacy))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import datetime
+import enum
+import os
+import pathlib
+import sys
+import unittest
+
+from cachejar.identity import object_identity, register_encoder, identity_prefix
+from cachejar.jar import CacheFactory
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class Color(enum.Enum):
+    RED = 1
+
+
+class Point:
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+
+register_encoder(Point, lambda p: (p.x, p.y))
+
+
+def key(obj_id, *parms, **kwparms):
+    return object_identity(obj_id, parms, kwparms)
+
+
+class IdentityTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    datafilename = os.path.join(datadir, 'datafile')
+    test_dir = os.path.join(datadir, 'cache')
+
+    def test_canonical(self):
+        self.assertEqual(40, len(key('obj', 'x' * 10000)))
+        # Variants of an object share a prefix
+        self.assertEqual(key('obj', 1)[:16], key('obj', 2, a=3)[:16])
+        self.assertEqual(identity_prefix('obj'), key('obj')[:16])
+        self.assertNotEqual(key('obj', 1)[:16], key('obj2', 1)[:16])
+        # Keyword order doesn't matter
+        self.assertEqual(key('obj', a=1, b=2), key('obj', b=2, a=1))
+        self.assertEqual(key('obj', {'a': 1, 'b': {2, 3}}), key('obj', {'b': {3, 2}, 'a': 1}))
+        self.assertEqual(key(Point(1, 2)), key(Point(1, 2)))
+        self.assertEqual(key(pathlib.Path('/a/b')), key(pathlib.PurePosixPath('/a/b')))
+
+        # Values that print the same but aren't equal are told apart
+        distinct = [key('obj', *parms) for parms in
+                    [(1,), ('1',), (1.0,), (True,), ((1,),), ([1],), ({1},), (None,), ('None',), (1, 2), ('1, 2',),
+                     (Color.RED,), ('Color.RED',), (datetime.date(2020, 1, 2),), ('2020-01-02',), (Point(1, 2),),
+                     (b'1',), ()]]
+        self.assertEqual(len(distinct), len(set(distinct)))
+        self.assertNotEqual(key('ab', 'c'), key('a', 'bc'))
+        self.assertNotEqual(key('obj', a=1), key('obj', 1))
+
+    @unittest.skipIf(sys.version_info < (3, 7), "dataclasses need python 3.7")
+    def test_dataclasses(self):
+        """ Dataclass instances are identified by their fields """
+        from dataclasses import dataclass
+
+        @dataclass
+        class Options:
+            strict: bool
+            depth: int = 3
+
+        self.assertEqual(key(Options, Options(True)), key(Options, Options(strict=True, depth=3)))
+        self.assertNotEqual(key('obj', Options(True)), key('obj', Options(False)))
+        self.assertNotEqual(key('obj', Options(True)), key('obj', 'Options(strict=True, depth=3)'))
+
+    def test_functions(self):
+        """ Classes and functions are identified by name, lambdas by instance """
+        self.assertEqual(key(IdentityTestCase), key(IdentityTestCase))
+        self.assertNotEqual(key(Point), key(Color))
+        self.assertEqual(key(len), key(len))
+        f1, f2 = lambda: 1, lambda: 2
+        self.assertNotEqual(key(f1), key(f2))
+
+    def test_readable(self):
+        make_and_clear_directory(self.test_dir)
+        jar = CacheFactory(self.test_dir).cachejar('test_identity')
+        jar.update(self.datafilename, 'obj', 'parse', b=2, a=1)
+        self.assertEqual('obj', jar.object_for(self.datafilename, 'parse', a=1, b=2))
+        self.assertIsNone(next(iter(jar._cache[self.datafilename].objects.values())).label)
+
+        jar.readable_identities = True
+        jar.update(self.datafilename, 'obj2', 'parse', 17, strict=True)
+        jar._update_index()
+        jar2 = CacheFactory(self.test_dir).cachejar('test_identity')
+        self.assertEqual({None, "parse(17,){'strict': True}"},
+                         {info.label for info in jar2._cache[self.datafilename].objects.values()})
+        self.assertEqual('obj2', jar2.object_for(self.datafilename, 'parse', 17, strict=True))
+        make_and_clear_directory(self.test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
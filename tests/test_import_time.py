@@ -0,0 +1,120 @@
+import ast
+import os
+import subprocess
+import sys
+import unittest
+
+from cachejar.jar import CacheFactory
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+package_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def import_times(statement: str) -> dict:
+    """ Run statement in a fresh interpreter and return the cumulative import time (usec) of each module loaded """
+    env = dict(os.environ, PYTHONPATH=package_root)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], env=env,
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def lazy_modules(statement: str) -> dict:
+    """ Run statement in a fresh interpreter and return the lazily imported modules, mapped to whether they have
+    actually been loaded.  (Their code isn't run by the import system, so -X importtime doesn't see them) """
+    script = statement + """
+import sys
+from cachejar.lazyimport import _locks, _LazyModule
+print(repr({name: not isinstance(sys.modules[name], _LazyModule) for name in _locks}))
+"""
+    env = dict(os.environ, PYTHONPATH=package_root)
+    result = subprocess.run([sys.executable, '-c', script], env=env, stdout=subprocess.PIPE, universal_newlines=True,
+                            check=True)
+    return ast.literal_eval(result.stdout.splitlines()[-1])
+
+
+class ImportTimeTestCase(unittest.TestCase):
+    heavy_modules = ('ssl', 'urllib.request', 'http.client', 'asyncio', 'concurrent.futures._base', 'inspect', 'socket')
+
+    def test_import(self):
+        """ `import cachejar` doesn't load network, asyncio or thread pool support """
+        times = import_times('import cachejar')
+        self.assertEqual([], [m for m in self.heavy_modules if m in times])
+        loaded = lazy_modules('import cachejar')
+        self.assertIn('cachejar.index', loaded)
+        self.assertEqual([], [name for name, is_loaded in loaded.items() if is_loaded])
+
+    def test_jar_use(self):
+        """ ... but they are there when they are needed """
+        loaded = lazy_modules('import cachejar; cachejar.jar("test_import_time").memoize()(len); '
+                              'cachejar.factory.clear("test_import_time", remove_completely=True)')
+        self.assertTrue(loaded['cachejar.index'])
+        self.assertTrue(loaded['inspect'])
+        self.assertFalse(loaded['cachejar.pack'])   # Only needed for pack files
+        self.assertFalse(loaded['cachejar.fsck'])
+
+    def test_concurrent_first_use(self):
+        """ Lazily imported modules can be loaded by any number of threads at once """
+        test_dir = os.path.join(os.path.dirname(__file__), 'data', 'cache')
+        make_and_clear_directory(test_dir)
+        statement = f"""
+import threading
+from cachejar.jar import CacheFactory
+jar = CacheFactory({os.path.join(test_dir, 'root')!r}).cachejar('app')
+jar.threadsafe = True
+barrier = threading.Barrier(16)
+errors = []
+
+def lookup():
+    barrier.wait()
+    try:
+        jar.object_for({os.path.join(os.path.dirname(__file__), 'data', 'datafile')!r}, 'obj', 1)
+    except Exception as e:
+        errors.append(e)
+
+threads = [threading.Thread(target=lookup) for _ in range(16)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+assert not errors, errors
+"""
+        env = dict(os.environ, PYTHONPATH=package_root)
+        for _ in range(3):
+            result = subprocess.run([sys.executable, '-c', statement], env=env, stderr=subprocess.PIPE,
+                                    universal_newlines=True)
+            self.assertEqual(0, result.returncode, result.stderr)
+        make_and_clear_directory(test_dir)
+
+    def test_module_getattr(self):
+        """ Attributes that a module provides through a module level __getattr__ are found """
+        loaded = lazy_modules('from cachejar.lazyimport import lazy_import; '
+                              'lazy_import("concurrent.futures").ThreadPoolExecutor(1).shutdown()')
+        self.assertTrue(loaded['concurrent.futures'])
+
+    def test_lazy_factory(self):
+        """ A factory doesn't touch the disk until a jar is used """
+        test_dir = os.path.join(os.path.dirname(__file__), 'data', 'cache')
+        make_and_clear_directory(test_dir)
+        root = os.path.join(test_dir, 'root')
+        factory = CacheFactory(root)
+        self.assertFalse(os.path.exists(root))
+        self.assertIsNone(factory.cache_directory('app'))
+        factory.cachejar('app').update(os.path.join(os.path.dirname(__file__), 'data', 'datafile'), 'x', 'obj')
+
+        # Jars that already exist are found when they are referenced
+        factory2 = CacheFactory(root)
+        self.assertEqual({}, factory2._caches)
+        self.assertEqual(os.path.join(root, 'app'), factory2.cache_directory('app'))
+        factory2.clear('app', remove_completely=True)
+        self.assertFalse(os.path.exists(os.path.join(root, 'app')))
+        make_and_clear_directory(test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import io
+import json
+import os
+import unittest
+
+from cachejar.index import CacheIndex, CacheEntry, ObjectInfo, new_blob, blob_fname
+from cachejar.jar import CacheFactory
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class IndexTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    datafilename = os.path.join(datadir, 'datafile')
+    test_dir = os.path.join(datadir, 'cache')
+
+    def test_blob_names(self):
+        """ New cache files have fixed width names, names from earlier versions are kept as they are """
+        names = {blob_fname(new_blob()) for _ in range(100)}
+        self.assertEqual(100, len(names))
+        self.assertEqual({25}, {len(name) for name in names})
+        self.assertTrue(all(name.startswith('A') for name in names))
+        self.assertEqual('A00000000000000000000002a', blob_fname(42))
+        legacy = 'A0b3a9d8e-7d52-4f0e-9a8d-1b5bb0e8c7f1'
+        self.assertEqual(legacy, blob_fname(legacy))
+
+    def test_round_trip(self):
+        index = CacheIndex()
+        entry = index['f1'] = CacheEntry('sig1')
+        entry.objects['obj'] = ObjectInfo(new_blob(), 17, 1000.0)
+        entry.objects['obj(1,)'] = ObjectInfo('A0b3a9d8e-7d52-4f0e-9a8d-1b5bb0e8c7f1', 3, 2000.0, 1.5, 'json', 'zlib')
+        index['f2'] = CacheEntry('sig2')
+        f = io.StringIO()
+        index.dump(f)
+        f.seek(0)
+        index2, legacy = CacheIndex.load(f)
+        self.assertFalse(legacy)
+        self.assertEqual(['f1', 'f2'], list(index2))
+        self.assertEqual(('sig1', 'sig2'), (index2['f1'].signature, index2['f2'].signature))
+        self.assertEqual({}, index2['f2'].objects)
+        for obj_identity, info in index['f1'].objects.items():
+            info2 = index2['f1'].objects[obj_identity]
+            self.assertEqual([getattr(info, a) for a in ObjectInfo.__slots__],
+                             [getattr(info2, a) for a in ObjectInfo.__slots__])
+        self.assertEqual(4, index2.size())
+
+        # Identities shared across entries are shared in memory as well
+        f2 = io.StringIO(json.dumps(['cachejar-index', 2, {'f1': ['s', [['parse(True,)', 1, 1, 1.0]]],
+                                                           'f2': ['s', [['parse(True,)', 2, 1, 1.0]]]}]))
+        index3, _ = CacheIndex.load(f2)
+        self.assertIs(next(iter(index3['f1'].objects)), next(iter(index3['f2'].objects)))
+
+    def test_bad_index(self):
+        for text in ('[1, 2, 3]', '["cachejar-index", 99, {}]', '"index"'):
+            with self.assertRaises(ValueError):
+                CacheIndex.load(io.StringIO(text))
+
+    def test_legacy_journal(self):
+        """ Journal records written by earlier versions name the cache file rather than the blob """
+        make_and_clear_directory(self.test_dir)
+        jar = CacheFactory(self.test_dir).cachejar('test_index')
+        jar.update(self.datafilename, 'obj', 'obj')
+        info = jar._cache[self.datafilename].objects[jar._identity('obj')]
+        fname = 'A0b3a9d8e-7d52-4f0e-9a8d-1b5bb0e8c7f1'
+        os.rename(os.path.join(jar.cache_directory, info.fname), os.path.join(jar.cache_directory, fname))
+        jar._journal.append(('a', self.datafilename, jar._identity('obj'), fname, info.as_dict()))
+        jar2 = CacheFactory(self.test_dir).cachejar('test_index')
+        self.assertEqual(fname, jar2._cache[self.datafilename].objects[jar2._identity('obj')].fname)
+        self.assertEqual('obj', jar2.object_for(self.datafilename, 'obj'))
+        self.assertEqual(1, jar2.total_objects)
+        make_and_clear_directory(self.test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
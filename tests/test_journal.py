@@ -0,0 +1,94 @@
+import json
+import os
+import unittest
+
+from cachejar.jar import CacheFactory
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class TestObj:
+    def __init__(self, v: int):
+        self.v = v
+
+
+class JournalTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    datafilename = os.path.join(datadir, 'datafile')
+    datafilename2 = os.path.join(datadir, 'datafile2')
+    test_dir = os.path.join(datadir, 'cache')
+    appid = 'test_journal'
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.jar = CacheFactory(self.test_dir).cachejar(self.appid)
+
+    def tearDown(self):
+        make_and_clear_directory(self.test_dir)
+
+    def reopen(self):
+        return CacheFactory(self.test_dir).cachejar(self.appid)
+
+    def test_updates_are_journaled(self):
+        """ Updates append to the journal and leave the index snapshot alone """
+        index_stat = os.stat(self.jar._cache_directory_index)
+        for i in range(10):
+            self.jar.update(self.datafilename, TestObj(i), TestObj, i)
+        self.jar.clean(self.datafilename, TestObj, 3)
+        self.assertEqual(index_stat.st_mtime_ns, os.stat(self.jar._cache_directory_index).st_mtime_ns)
+        self.assertEqual(12, self.jar._journal.nrecords)
+
+        jar2 = self.reopen()
+        for i in range(10):
+            o = jar2.object_for(self.datafilename, TestObj, i)
+            if i == 3:
+                self.assertIsNone(o)
+            else:
+                self.assertEqual(i, o.v)
+
+    def test_compaction(self):
+        """ Once the journal outgrows the threshold it is folded into the snapshot """
+        self.jar._journal.compact_threshold = 5
+        for i in range(20):
+            self.jar.update(self.datafilename, TestObj(i), TestObj, i)
+        self.assertLessEqual(self.jar._journal.nrecords, max(5, self.jar._journal.snapshot_size))
+        jar2 = self.reopen()
+        self.assertEqual(list(range(20)), [jar2.object_for(self.datafilename, TestObj, i).v for i in range(20)])
+
+    def test_legacy_index(self):
+        """ An index written by an earlier version (no journal) is still readable """
+        self.jar.update(self.datafilename, TestObj(1), TestObj)
+        self.jar._update_index()
+        self.assertFalse(os.path.exists(self.jar._journal.journal_path))
+        jar2 = self.reopen()
+        self.assertEqual(1, jar2.object_for(self.datafilename, TestObj).v)
+        jar2.update(self.datafilename2, TestObj(2), TestObj)
+        self.assertEqual(2, self.reopen().object_for(self.datafilename2, TestObj).v)
+
+    def test_torn_record(self):
+        """ A partially written trailing record is discarded """
+        self.jar.update(self.datafilename, TestObj(1), TestObj, 1)
+        with open(self.jar._journal.journal_path, 'a') as f:
+            f.write('["a","' + self.datafilename)
+        jar2 = self.reopen()
+        self.assertEqual(1, jar2.object_for(self.datafilename, TestObj, 1).v)
+        jar2.update(self.datafilename, TestObj(2), TestObj, 2)
+        jar3 = self.reopen()
+        self.assertEqual(1, jar3.object_for(self.datafilename, TestObj, 1).v)
+        self.assertEqual(2, jar3.object_for(self.datafilename, TestObj, 2).v)
+
+    def test_stale_journal(self):
+        """ A journal left behind by an interrupted compaction is not replayed against the new snapshot """
+        self.jar.update(self.datafilename, TestObj(1), TestObj, 1)
+        with open(self.jar._journal.journal_path) as f:
+            stale_journal = f.read()
+        self.jar._update_index()
+        self.jar.clean(self.datafilename, TestObj, 1)
+        self.jar._update_index()
+        with open(self.jar._journal.journal_path, 'w') as f:
+            f.write(stale_journal)
+        self.assertIsNone(self.reopen().object_for(self.datafilename, TestObj, 1))
+        self.assertEqual('g', json.loads(stale_journal.split('\n')[0])[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import random
+import shutil
+import threading
+import time
+import unittest
+
+from cachejar.jar import CacheFactory
+from cachejar.lease import Lease
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+test_dir = os.path.join(datadir, 'cache')
+source = os.path.join(test_dir, 'source')
+builds_file = os.path.join(test_dir, 'builds')
+appid = 'test_lease'
+
+
+def open_jar():
+    jar = CacheFactory(test_dir).cachejar(appid)
+    jar.lease_timeout = 5
+    jar.lease_poll_interval = 0.05
+    return jar
+
+
+def build():
+    with open(builds_file, 'a') as f:
+        f.write(f"{os.getpid()}\n")
+    time.sleep(0.5)
+    return 'expensive'
+
+
+def worker(_) -> str:
+    return open_jar().get_or_compute(build, source, 'obj')
+
+
+def take_over(start: float) -> bool:
+    """ Wait until start, then try to take over the abandoned lease.  Checking whether it has expired takes a
+    random time, to give the other processes a chance to get in between the check and the takeover. """
+    jar = open_jar()
+    lease = Lease(jar._lease_path(source, jar._identity('obj')), jar.lease_timeout, jar._index_lock.path)
+    expired = lease.expired
+    lease.expired = lambda: expired() and (time.sleep(random.uniform(0, 0.05)) or True)
+    time.sleep(max(0.0, start - time.time()))
+    return lease.acquire()
+
+
+class LeaseTestCase(unittest.TestCase):
+    def setUp(self):
+        make_and_clear_directory(test_dir)
+        shutil.copy(os.path.join(datadir, 'datafile'), source)
+        self.lease_path = os.path.join(test_dir, 'test.lease')
+        self.lock_path = os.path.join(test_dir, 'test.lock')
+
+    def tearDown(self):
+        make_and_clear_directory(test_dir)
+
+    def builds(self):
+        with open(builds_file) as f:
+            return f.read().split()
+
+    def test_lease(self):
+        lease = Lease(self.lease_path, 0.4, self.lock_path)
+        self.assertTrue(lease.acquire())
+        self.assertFalse(Lease(self.lease_path, 0.4, self.lock_path).acquire())
+        time.sleep(0.6)                         # The heartbeat keeps it alive
+        self.assertFalse(Lease(self.lease_path, 0.4, self.lock_path).acquire())
+        lease.release()
+        self.assertFalse(os.path.exists(self.lease_path))
+
+        # An abandoned lease can be taken over.  The original holder doesn't remove the new holder's lease.
+        self.assertTrue(lease.acquire())
+        lease._stop.set()                       # Simulate a process that has stopped
+        os.utime(self.lease_path, (time.time() - 1, time.time() - 1))
+        lease2 = Lease(self.lease_path, 0.4, self.lock_path)
+        self.assertTrue(lease2.acquire())
+        lease._stop = threading.Event()
+        lease.release()
+        self.assertTrue(os.path.exists(self.lease_path))
+        lease2.release()
+        self.assertFalse(os.path.exists(self.lease_path))
+
+    def test_processes(self):
+        """ Only one of several processes that miss at once builds the object """
+        with multiprocessing.Pool(4) as pool:
+            self.assertEqual(['expensive'] * 4, pool.map(worker, range(4)))
+        self.assertEqual(1, len(self.builds()))
+        jar = open_jar()
+        self.assertEqual('expensive', jar.object_for(source, 'obj'))
+        self.assertEqual([], [f for f in os.listdir(jar.cache_directory) if f.endswith('.lease')])
+
+    def test_takeover_race(self):
+        """ Only one of several processes that find the same abandoned lease takes it over """
+        jar = open_jar()
+        lease_path = jar._lease_path(source, jar._identity('obj'))
+        with multiprocessing.Pool(8) as pool:
+            for _ in range(10):
+                with open(lease_path, 'w') as f:
+                    f.write('dead process')
+                os.utime(lease_path, (time.time() - 60, time.time() - 60))
+                self.assertEqual(1, sum(pool.map(take_over, [time.time() + 0.3] * 8)))
+                os.remove(lease_path)
+
+    def test_failed_builder(self):
+        """ If the builder fails, a process that was waiting builds it instead """
+        jar1, jar2 = open_jar(), open_jar()
+
+        def failing_build():
+            time.sleep(0.3)
+            raise ValueError("failed")
+
+        def first():
+            with self.assertRaises(ValueError):
+                jar1.get_or_compute(failing_build, source, 'obj')
+
+        t = threading.Thread(target=first)
+        t.start()
+        time.sleep(0.1)
+        self.assertEqual('expensive', jar2.get_or_compute(build, source, 'obj'))
+        t.join()
+        self.assertEqual(1, len(self.builds()))
+
+    def test_abandoned(self):
+        """ A lease left behind by a process that died expires """
+        jar = open_jar()
+        jar.lease_timeout = 0.3
+        with open(jar._lease_path(source, jar._identity('obj')), 'w') as f:
+            f.write('dead process')
+        start = time.time()
+        self.assertEqual('expensive', jar.get_or_compute(build, source, 'obj'))
+        self.assertGreater(time.time() - start, 0.3)
+        self.assertEqual(1, len(self.builds()))
+
+
+if __name__ == '__main__':
+    unittest.main()
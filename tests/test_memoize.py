@@ -0,0 +1,95 @@
+import os
+import shutil
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from cachejar.jar import CacheFactory
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class MemoizeTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    test_dir = os.path.join(datadir, 'cache')
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.source = os.path.join(self.test_dir, 'source')
+        shutil.copy(os.path.join(self.datadir, 'datafile'), self.source)
+        self.jar = CacheFactory(self.test_dir).cachejar('test_memoize')
+        self.calls = []
+
+    def tearDown(self):
+        make_and_clear_directory(self.test_dir)
+
+    def test_memoize(self):
+        @self.jar.memoize('fname')
+        def line_count(fname, strip=False):
+            self.calls.append((fname, strip))
+            with open(fname) as f:
+                return len(f.readlines())
+
+        n = line_count(self.source)
+        self.assertEqual(n, line_count(self.source))
+        self.assertEqual(n, line_count(self.source, False))           # Defaults are part of the identity
+        self.assertEqual(n, line_count(fname=self.source, strip=False))
+        self.assertEqual(1, len(self.calls))
+        line_count(self.source, strip=True)
+        self.assertEqual(2, len(self.calls))
+
+        # Compute time is recorded for cost based eviction
+        infos = [info for _, _, info in self.jar._eviction_candidates()]
+        self.assertEqual(2, len(infos))
+        self.assertTrue(all(info.cost is not None for info in infos))
+
+        # A changed source is recomputed
+        os.utime(self.source, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        line_count(self.source)
+        self.assertEqual(3, len(self.calls))
+
+        # Nothing is cached when the jar is disabled
+        self.jar.disabled = True
+        line_count(self.source)
+        line_count(self.source)
+        self.assertEqual(5, len(self.calls))
+
+    def test_get_or_compute(self):
+        self.assertEqual([1], self.jar.get_or_compute(lambda: [1], self.source, 'obj', 1, k='v'))
+        self.assertEqual([1], self.jar.get_or_compute(lambda: [2], self.source, 'obj', 1, k='v'))
+        self.assertEqual([1], self.jar.object_for(self.source, 'obj', 1, k='v'))
+
+    def test_single_flight(self):
+        """ Concurrent misses on the same object run the builder once """
+        lock = threading.Lock()
+
+        def builder():
+            with lock:
+                self.calls.append(1)
+            time.sleep(0.2)
+            return {'built': True}
+
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda _: self.jar.get_or_compute(builder, self.source, 'obj'), range(8)))
+        self.assertEqual(1, len(self.calls))
+        self.assertEqual([{'built': True}] * 8, results)
+        self.assertEqual(1, self.jar.total_objects)
+        self.assertTrue(self.jar.threadsafe)
+
+    def test_errors(self):
+        """ An exception in the builder goes to everyone that was waiting for it, and nothing is cached """
+        def builder():
+            time.sleep(0.1)
+            raise ValueError("failed")
+
+        with ThreadPoolExecutor(4) as pool:
+            futures = [pool.submit(self.jar.get_or_compute, builder, self.source, 'obj') for _ in range(4)]
+            for f in futures:
+                with self.assertRaises(ValueError):
+                    f.result()
+        self.assertEqual(0, self.jar.total_objects)
+        self.assertEqual({}, self.jar._computing)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import unittest
+from pathlib import Path
+
+from cachejar.jar import CacheFactory
+from cachejar.memtier import MemoryTier
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class TestObj:
+    def __init__(self, v: int):
+        self.v = v
+
+
+class MemoryTierTestCase(unittest.TestCase):
+    def test_lru(self):
+        tier = MemoryTier(max_entries=2)
+        tier.put('a', 1, 10)
+        tier.put('b', 2, 10)
+        self.assertEqual((True, 1), tier.get('a'))
+        tier.put('c', 3, 10)
+        self.assertNotIn('b', tier)
+        self.assertEqual((True, 1), tier.get('a'))
+        self.assertEqual((True, 3), tier.get('c'))
+        self.assertEqual((False, None), tier.get('b'))
+        self.assertEqual(0.75, tier.hit_rate)
+
+    def test_lfu(self):
+        tier = MemoryTier(max_entries=2, policy='lfu')
+        tier.put('a', 1, 10)
+        tier.put('b', 2, 10)
+        for _ in range(3):
+            tier.get('b')
+        tier.get('a')
+        tier.put('c', 3, 10)
+        self.assertEqual(['b', 'c'], sorted(tier._entries))
+        tier.put('d', 4, 10)
+        self.assertEqual(['b', 'd'], sorted(tier._entries))
+
+    def test_bytes(self):
+        tier = MemoryTier(max_bytes=100)
+        tier.put('a', 1, 60)
+        tier.put('b', 2, 30)
+        self.assertEqual(90, tier.nbytes)
+        tier.put('c', 3, 30)
+        self.assertEqual(['b', 'c'], sorted(tier._entries))
+        tier.put('d', 4, 200)
+        self.assertNotIn('d', tier)
+        tier.discard('b')
+        self.assertEqual(30, tier.nbytes)
+        with self.assertRaises(ValueError):
+            MemoryTier(policy='fifo')
+
+
+class JarMemoryTierTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    datafilename = os.path.join(datadir, 'datafile')
+    test_dir = os.path.join(datadir, 'cache')
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.jar = CacheFactory(self.test_dir).cachejar('test_memtier')
+        self.jar.memory_tier = MemoryTier(max_entries=10)
+
+    def tearDown(self):
+        make_and_clear_directory(self.test_dir)
+
+    def blobs(self):
+        return [f for f in os.listdir(self.jar.cache_directory) if f.startswith('A')]
+
+    def test_jar_tier(self):
+        o = TestObj(1)
+        self.jar.update(self.datafilename, o, TestObj)
+        self.assertIs(o, self.jar.object_for(self.datafilename, TestObj))
+        self.assertEqual(1, self.jar.memory_tier.hits)
+
+        # Objects are served from memory without going to the disk
+        self.jar.memory_tier.clear()
+        self.assertEqual(1, self.jar.object_for(self.datafilename, TestObj).v)
+        os.remove(os.path.join(self.jar.cache_directory, self.blobs()[0]))
+        self.assertEqual(1, self.jar.object_for(self.datafilename, TestObj).v)
+
+        # Invalidation removes the memory image
+        Path(self.datafilename).touch()
+        self.assertIsNone(self.jar.object_for(self.datafilename, TestObj))
+        self.assertEqual(0, len(self.jar.memory_tier))
+
+        self.jar.update(self.datafilename, TestObj(2), TestObj)
+        self.jar.clean()
+        self.assertEqual(0, len(self.jar.memory_tier))
+        self.jar.update(self.datafilename, TestObj(3), TestObj)
+        self.jar.clear()
+        self.assertEqual(0, len(self.jar.memory_tier))
+
+
+if __name__ == '__main__':
+    unittest.main()
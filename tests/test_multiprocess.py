@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+import unittest
+
+from cachejar.jar import CacheFactory
+from cachejar.locking import fcntl
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+datafilename = os.path.join(datadir, 'datafile')
+test_dir = os.path.join(datadir, 'cache')
+appid = 'test_multiprocess'
+
+
+def worker(n: int) -> int:
+    """ Add 25 objects to a jar that is shared with the other workers """
+    jar = CacheFactory(test_dir).cachejar(appid)
+    jar._journal.compact_threshold = 10
+    for i in range(25):
+        jar.update(datafilename, (n, i), 'obj', n, i)
+    return jar._journal.nrecords
+
+
+class MultiProcessTestCase(unittest.TestCase):
+    def setUp(self):
+        make_and_clear_directory(test_dir)
+
+    def tearDown(self):
+        make_and_clear_directory(test_dir)
+
+    def test_shared_jar(self):
+        """ Two instances of the same jar see each other's changes """
+        jar1 = CacheFactory(test_dir).cachejar(appid)
+        jar2 = CacheFactory(test_dir).cachejar(appid)
+        jar1.update(datafilename, 'one', 'obj', 1)
+        self.assertEqual('one', jar2.object_for(datafilename, 'obj', 1))
+        jar2.update(datafilename, 'two', 'obj', 2)
+        jar1.update(datafilename, 'three', 'obj', 3)
+        self.assertEqual(3, jar1.total_objects)
+        self.assertEqual(['one', 'two', 'three'],
+                         [jar2.object_for(datafilename, 'obj', i) for i in (1, 2, 3)])
+
+        # A new snapshot written by one is picked up by the other
+        jar1._update_index()
+        jar1.clean(datafilename, 'obj', 1)
+        self.assertIsNone(jar2.object_for(datafilename, 'obj', 1))
+        self.assertEqual(2, jar2.total_objects)
+        self.assertEqual(jar1.total_bytes, jar2.total_bytes)
+
+        # Nothing written by one instance is lost when the other compacts
+        jar2.update(datafilename, 'four', 'obj', 4)
+        jar1._journal.compact_threshold = 0
+        jar1.update(datafilename, 'five', 'obj', 5)
+        jar3 = CacheFactory(test_dir).cachejar(appid)
+        self.assertEqual(['two', 'three', 'four', 'five'],
+                         [jar3.object_for(datafilename, 'obj', i) for i in (2, 3, 4, 5)])
+
+    def test_removed_elsewhere(self):
+        """ An object removed by another process after we looked it up is a cache miss """
+        jar1 = CacheFactory(test_dir).cachejar(appid)
+        jar2 = CacheFactory(test_dir).cachejar(appid)
+        jar1.update(datafilename, 'one', 'obj')
+        self.assertEqual('one', jar2.object_for(datafilename, 'obj'))
+        for fname in os.listdir(jar1.cache_directory):
+            if fname.startswith('A'):
+                os.remove(os.path.join(jar1.cache_directory, fname))
+        self.assertIsNone(jar2.object_for(datafilename, 'obj'))
+
+    def test_atomic_writes(self):
+        """ No temporary files are left behind """
+        jar = CacheFactory(test_dir).cachejar(appid)
+        jar._journal.compact_threshold = 0
+        jar.update(datafilename, 'one', 'obj')
+        self.assertEqual([], [f for f in os.listdir(jar.cache_directory) if f.endswith('.tmp')])
+
+    @unittest.skipIf(fcntl is None, "advisory file locking is not available")
+    def test_processes(self):
+        """ Concurrent updates from several processes, with compactions along the way, are all preserved """
+        with multiprocessing.Pool(4) as pool:
+            pool.map(worker, range(4))
+        jar = CacheFactory(test_dir).cachejar(appid)
+        self.assertEqual(100, jar.total_objects)
+        for n in range(4):
+            for i in range(25):
+                self.assertEqual((n, i), jar.object_for(datafilename, 'obj', n, i))
+        self.assertEqual(100, len([f for f in os.listdir(jar.cache_directory) if f.startswith('A')]))
+
+
+if __name__ == '__main__':
+    unittest.main()
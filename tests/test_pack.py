@@ -0,0 +1,106 @@
+import os
+import time
+import unittest
+
+from cachejar import Dependencies
+from cachejar.jar import CacheFactory, CacheError
+from cachejar.pack import PackJar
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+def touch(path: str, text: str = 'x') -> None:
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+class PackTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    test_dir = os.path.join(datadir, 'cache')
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.src = os.path.join(self.test_dir, 'src')
+        os.makedirs(os.path.join(self.src, 'dir'))
+        self.files = [os.path.join(self.src, f'f{i}') for i in range(20)]
+        for fname in self.files:
+            touch(fname, fname)
+        touch(os.path.join(self.src, 'dir', 'd1'))
+        self.deps = Dependencies(self.files[0], os.path.join(self.src, 'dir'))
+        self.pack_path = os.path.join(self.test_dir, 'jar.pack')
+
+    def tearDown(self):
+        make_and_clear_directory(self.test_dir)
+
+    def jar(self, name: str):
+        return CacheFactory(os.path.join(self.test_dir, name)).cachejar('test_pack')
+
+    def fill(self, jar) -> None:
+        jar.compression = 'zlib'
+        jar.compression_threshold = 100
+        for fname in self.files:
+            jar.update(fname, os.path.basename(fname), 'name')
+            jar.update(fname, 'big ' * 100, 'big', 17, strict=True)
+        jar.update(self.deps, 'deps', 'model')
+
+    def test_pack_jar(self):
+        jar = self.jar('root')
+        self.fill(jar)
+        self.assertEqual(41, jar.export_pack(self.pack_path))
+        with PackJar(self.pack_path) as packed:
+            for fname in self.files:
+                self.assertEqual(os.path.basename(fname), packed.object_for(fname, 'name'))
+                self.assertEqual('big ' * 100, packed.object_for(fname, 'big', 17, strict=True))
+            self.assertEqual('deps', packed.object_for(Dependencies(os.path.join(self.src, 'dir'), self.files[0]),
+                                                       'model'))
+            self.assertIsNone(packed.object_for(self.files[0], 'big', 17))
+            self.assertIsNone(packed.object_for(os.path.join(self.src, 'missing'), 'name'))
+
+            # Lookups are validated against the current signature of the source
+            time.sleep(0.01)
+            touch(os.path.join(self.src, 'dir', 'd2'))
+            touch(self.files[1], 'changed')
+            self.assertIsNone(packed.object_for(self.deps, 'model'))
+            self.assertIsNone(packed.object_for(self.files[1], 'name'))
+            self.assertEqual('f2', packed.object_for(self.files[2], 'name'))
+
+        touch(self.pack_path, 'not a pack')
+        with self.assertRaises(ValueError):
+            PackJar(self.pack_path)
+
+    def test_import(self):
+        jar = self.jar('root')
+        self.fill(jar)
+        jar.export_pack(self.pack_path)
+        time.sleep(0.01)
+        touch(self.files[1], 'changed')
+
+        jar2 = self.jar('root2')
+        jar2.update(self.files[2], 'local', 'name')
+        self.assertEqual(38, jar2.import_pack(self.pack_path))     # Not f1, which changed, or f2's name, which is there
+        self.assertEqual(39, jar2.total_objects)
+        self.assertEqual('local', jar2.object_for(self.files[2], 'name'))
+        self.assertEqual('f3', jar2.object_for(self.files[3], 'name'))
+        self.assertEqual('big ' * 100, jar2.object_for(self.files[3], 'big', 17, strict=True))
+        self.assertEqual('deps', jar2.object_for(self.deps, 'model'))
+        self.assertIsNone(jar2.object_for(self.files[1], 'name'))
+        self.assertEqual(0, jar2.import_pack(self.pack_path))
+
+        jar3 = self.jar('root3')
+        jar3.signature_mode = 'content'
+        with self.assertRaises(CacheError):
+            jar3.import_pack(self.pack_path)
+
+    def test_content_signatures(self):
+        """ Packs exported with content signatures don't depend on modification times """
+        jar = self.jar('root')
+        jar.signature_mode = 'content'
+        self.fill(jar)
+        jar.export_pack(self.pack_path)
+        time.sleep(0.01)
+        touch(self.files[4], self.files[4])
+        with PackJar(self.pack_path) as packed:
+            self.assertEqual('f4', packed.object_for(self.files[4], 'name'))
+
+
+if __name__ == '__main__':
+    unittest.main()
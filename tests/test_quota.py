@@ -0,0 +1,109 @@
+import json
+import os
+import unittest
+import uuid
+
+from cachejar.jar import CacheFactory
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class QuotaTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    datafilename = os.path.join(datadir, 'datafile')
+    datafilename2 = os.path.join(datadir, 'datafile2')
+    test_dir = os.path.join(datadir, 'cache')
+    appid = 'test_quota'
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.factory = CacheFactory(self.test_dir)
+        self.jar = self.factory.cachejar(self.appid)
+        self.jar.access_resolution = 0
+
+    def tearDown(self):
+        make_and_clear_directory(self.test_dir)
+
+    def cached(self, jar=None, fname=None):
+        jar = jar or self.jar
+        return [i for i in range(10) if jar.object_for(fname or self.datafilename, 'obj', i) is not None]
+
+    def test_sizes(self):
+        """ Object sizes are tracked and survive a reload """
+        self.jar.update(self.datafilename, 'x' * 1000, 'obj', 1)
+        self.jar.update(self.datafilename, 'x' * 2000, 'obj', 2)
+        self.assertEqual(2, self.jar.total_objects)
+        blob_bytes = sum(os.path.getsize(os.path.join(self.jar.cache_directory, f))
+                         for f in os.listdir(self.jar.cache_directory) if f.startswith('A'))
+        self.assertEqual(blob_bytes, self.jar.total_bytes)
+        jar2 = CacheFactory(self.test_dir).cachejar(self.appid)
+        self.assertEqual((2, blob_bytes), (jar2.total_objects, jar2.total_bytes))
+        self.jar.clean(self.datafilename, 'obj', 1)
+        self.assertEqual(1, self.jar.total_objects)
+        self.jar.clear()
+        self.assertEqual((0, 0), (self.jar.total_objects, self.jar.total_bytes))
+        jar3 = CacheFactory(self.test_dir).cachejar(self.appid)
+        self.assertEqual((0, 0), (jar3.total_objects, jar3.total_bytes))
+
+    def test_lru(self):
+        self.jar.max_entries = 4
+        for i in range(4):
+            self.jar.update(self.datafilename, i, 'obj', i)
+        self.jar.object_for(self.datafilename, 'obj', 0)
+        self.jar.update(self.datafilename, 4, 'obj', 4)
+        # Evict down to 90% of the limit, least recently used first
+        self.assertEqual([0, 3, 4], self.cached())
+
+    def test_bytes(self):
+        self.jar.update(self.datafilename, 'x' * 1000, 'obj', 0)
+        size = self.jar.total_bytes                     # Cache files carry a header, which includes the source path
+        self.jar.max_bytes = int(size * 3.5)
+        for i in range(1, 4):
+            self.jar.update(self.datafilename, 'x' * 1000, 'obj', i)
+        self.assertLessEqual(self.jar.total_bytes, self.jar.max_bytes)
+        self.assertEqual([1, 2, 3], self.cached())
+
+    def test_cost(self):
+        self.jar.max_entries = 3
+        self.jar.eviction_policy = 'cost'
+        for i in range(3):
+            self.jar.update(self.datafilename, i, 'obj', i)
+            self.assertTrue(self.jar.set_cost(self.datafilename, 10.0 - i, 'obj', i))
+        self.assertFalse(self.jar.set_cost(self.datafilename, 1.0, 'obj', 9))
+        self.jar.update(self.datafilename, 3, 'obj', 3)
+        self.assertEqual([0, 3], self.cached())
+        self.assertEqual(10.0, CacheFactory(self.test_dir).cachejar(self.appid)._cache[self.datafilename]
+                         .objects[self.jar._identity('obj', 0)].cost)
+
+    def test_factory_quota(self):
+        self.factory.max_entries = 3
+        jar2 = self.factory.cachejar('test_quota2')
+        self.jar.update(self.datafilename, 0, 'obj', 0)
+        jar2.update(self.datafilename, 1, 'obj', 1)
+        self.jar.update(self.datafilename, 2, 'obj', 2)
+        jar2.update(self.datafilename, 3, 'obj', 3)
+        self.assertEqual([2], self.cached())
+        self.assertEqual([3], self.cached(jar2))
+
+    def test_legacy_index(self):
+        """ Indices written by earlier versions, without size information, are converted and filled in from the
+        files """
+        self.jar.update(self.datafilename, 'x' * 100, 'obj', 1)
+        entry = self.jar._cache[self.datafilename]
+        legacy_index = {self.datafilename: {'signature': entry.signature, 'cached_objects': {}}}
+        for obj_identity, info in entry.objects.items():
+            fname = 'A' + str(uuid.uuid4())
+            os.rename(os.path.join(self.jar.cache_directory, info.fname),
+                      os.path.join(self.jar.cache_directory, fname))
+            legacy_index[self.datafilename]['cached_objects'][obj_identity] = fname
+        with open(self.jar._cache_directory_index, 'w') as f:
+            json.dump(legacy_index, f)
+        os.remove(self.jar._journal.journal_path)
+        jar2 = CacheFactory(self.test_dir).cachejar(self.appid)
+        self.assertEqual((1, self.jar.total_bytes), (jar2.total_objects, jar2.total_bytes))
+        self.assertEqual([1], self.cached(jar2))
+        with open(self.jar._cache_directory_index) as f:
+            self.assertEqual('cachejar-index', json.load(f)[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import mmap
+import os
+import pickle
+import struct
+import unittest
+
+from cachejar.index import read_blob_header
+from cachejar.jar import CacheFactory
+from cachejar.serializers import Pickle5Serializer, PickleSerializer, get_serializer, register_serializer, \
+    Serializer, pickle5
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ReprSerializer(Serializer):
+    """ A toy serializer that stores the repr of an object """
+    name = 'repr'
+
+    def dump(self, obj, f, fpath):
+        f.write(repr(obj).encode())
+        return 0
+
+    def load(self, f, fpath):
+        return eval(f.read().decode())
+
+
+class SerializerTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    datafilename = os.path.join(datadir, 'datafile')
+    test_dir = os.path.join(datadir, 'cache')
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.jar = CacheFactory(self.test_dir).cachejar('test_serializers')
+
+    def tearDown(self):
+        make_and_clear_directory(self.test_dir)
+
+    def cache_files(self):
+        return sorted(f for f in os.listdir(self.jar.cache_directory) if f.startswith('A'))
+
+    def test_default(self):
+        self.assertIsInstance(get_serializer('pickle'), PickleSerializer)
+        self.jar.update(self.datafilename, {'a': 1}, 'obj')
+        with open(os.path.join(self.jar.cache_directory, self.cache_files()[0]), 'rb') as f:
+            self.assertEqual(self.datafilename, read_blob_header(f)['source'])
+            self.assertEqual({'a': 1}, pickle.load(f))
+        with self.assertRaises(KeyError):
+            get_serializer('nothing')
+
+    def test_custom(self):
+        register_serializer(ReprSerializer())
+        self.jar.update_using('repr', self.datafilename, [1, 'two'], 'obj', 1)
+        self.jar.update_using(ReprSerializer(), self.datafilename, [3], 'obj', 2)
+        self.jar.update(self.datafilename, [4], 'obj', 3)
+        jar2 = CacheFactory(self.test_dir).cachejar('test_serializers')
+        self.assertEqual([1, 'two'], jar2.object_for(self.datafilename, 'obj', 1))
+        self.assertEqual([3], jar2.object_for(self.datafilename, 'obj', 2))
+        self.assertEqual([4], jar2.object_for(self.datafilename, 'obj', 3))
+
+    @unittest.skipIf(pickle5 is None, "pickle protocol 5 not available")
+    def test_out_of_band(self):
+        data = bytearray(b'0123456789' * 1000)
+        self.jar.serializer = 'pickle5'
+        self.jar.update(self.datafilename, {'data': pickle5.PickleBuffer(data), 'n': 1}, 'obj')
+        files = self.cache_files()
+        self.assertEqual(2, len(files))
+        self.assertTrue(files[1].endswith(Pickle5Serializer.aux_suffix))
+        self.assertEqual(sum(os.path.getsize(os.path.join(self.jar.cache_directory, f)) for f in files),
+                         self.jar.total_bytes)
+
+        # The buffer is aligned in the .oob file and comes back mapped, not copied
+        with open(os.path.join(self.jar.cache_directory, files[1]), 'rb') as f:
+            offset = struct.unpack_from('<Q', f.read(32), 16)[0]
+        self.assertEqual(0, offset % Pickle5Serializer.alignment)
+        obj = self.jar.object_for(self.datafilename, 'obj')
+        self.assertEqual(1, obj['n'])
+        self.assertIsInstance(obj['data'], memoryview)
+        self.assertIsInstance(obj['data'].obj, mmap.mmap)
+        self.assertEqual(bytes(data), obj['data'].tobytes())
+
+        self.jar.clean()
+        self.jar.wait_for_background()
+        self.assertEqual([], self.cache_files())
+
+    @unittest.skipIf(pickle5 is None, "pickle protocol 5 not available")
+    def test_in_band(self):
+        """ Objects without out-of-band buffers don't get an auxiliary file """
+        self.jar.update_using('pickle5', self.datafilename, ['abc'], 'obj')
+        self.assertEqual(1, len(self.cache_files()))
+        self.assertEqual(['abc'], self.jar.object_for(self.datafilename, 'obj'))
+
+    @unittest.skipIf(pickle5 is None or numpy is None, "numpy and pickle protocol 5 required")
+    def test_numpy(self):
+        a = numpy.arange(1000000, dtype=numpy.float64)
+        self.jar.update_using('pickle5', self.datafilename, a, 'array')
+        b = self.jar.object_for(self.datafilename, 'array')
+        self.assertTrue(numpy.array_equal(a, b))
+        b[0] = 42.0                                 # Copy on write mapping
+        self.assertEqual(0.0, self.jar.object_for(self.datafilename, 'array')[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler
+
+from cachejar.jar import CacheFactory
+from cachejar.sharedtier import DirectoryTier, HttpTier
+from tests.utils.http_server import ThreadingHTTPServer
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class BlobStoreHandler(BaseHTTPRequestHandler):
+    """ Stand-in for an HTTP blob store.  Blobs are kept in the server's `blobs` dictionary """
+    def do_GET(self):
+        blob = self.server.blobs.get(self.path)
+        if blob is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(blob)))
+        self.end_headers()
+        self.wfile.write(blob)
+
+    def do_PUT(self):
+        self.server.blobs[self.path] = self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(201)
+        self.end_headers()
+
+    def do_DELETE(self):
+        self.send_response(204 if self.server.blobs.pop(self.path, None) is not None else 404)
+        self.end_headers()
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class SharedTierTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    test_dir = os.path.join(datadir, 'cache')
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), BlobStoreHandler)
+        cls.server.blobs = {}
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.store_url = f"http://127.0.0.1:{cls.server.server_address[1]}/store"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.server.blobs.clear()
+        self.srcfile = os.path.join(self.test_dir, 'source.json')
+        with open(self.srcfile, 'w') as f:
+            f.write('source')
+        self.shared_dir = os.path.join(self.test_dir, 'shared')
+
+    def tearDown(self):
+        make_and_clear_directory(self.test_dir)
+
+    @staticmethod
+    def run_async(coro):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+
+    def nodes(self, tier):
+        """ Return jars for two machines that share tier """
+        return [CacheFactory(os.path.join(self.test_dir, node), shared_tier=tier).cachejar('test_shared_tier')
+                for node in ('node1', 'node2')]
+
+    def shared_records(self) -> int:
+        return sum(len(files) for _, _, files in os.walk(self.shared_dir))
+
+    def test_directory_tier(self):
+        node1, node2 = self.nodes(DirectoryTier(self.shared_dir))
+        self.assertTrue(node1.update(self.srcfile, {'model': 1}, 'parse', strict=True))
+        node1.wait_for_background()
+        self.assertEqual(1, self.shared_records())
+
+        # node2 reads through to the shared tier, after which the object is local
+        self.assertIsNone(node2.object_for(self.srcfile, 'parse', strict=False))
+        self.assertEqual({'model': 1}, node2.object_for(self.srcfile, 'parse', strict=True))
+        self.assertEqual(1, node2.total_objects)
+        node2.wait_for_background()
+        self.assertEqual(1, self.shared_records())          # Objects from the shared tier aren't copied back
+        node2.shared_tier = None
+        self.assertEqual({'model': 1}, node2.object_for(self.srcfile, 'parse', strict=True))
+
+        # Records are validated with the same signatures as local files
+        time.sleep(0.01)
+        with open(self.srcfile, 'w') as f:
+            f.write('changed')
+        node2.shared_tier = node1.shared_tier
+        self.assertIsNone(node2.object_for(self.srcfile, 'parse', strict=True))
+
+        # Builds that another node has done aren't repeated
+        builds = []
+        node1.get_or_compute(lambda: builds.append(1) or 'built', self.srcfile, 'build')
+        node1.wait_for_background()
+        self.assertEqual('built', node2.get_or_compute(lambda: builds.append(2) or 'rebuilt', self.srcfile, 'build'))
+        self.assertEqual([1], builds)
+
+    def test_http_tier(self):
+        node1, node2 = self.nodes(HttpTier(self.store_url))
+        node1.compression = 'zlib'
+        node1.compression_threshold = 0
+        node1.update_many([(self.srcfile, f'obj{i}' * 10, 'obj', (i,)) for i in range(3)])
+        node1.wait_for_background()
+        self.assertEqual(3, len(self.server.blobs))
+        self.assertEqual(['obj0' * 10, None, 'obj2' * 10, 'obj1' * 10],
+                         node2.object_for_many([(self.srcfile, 'obj', (0,)), (self.srcfile, 'obj', (5,)),
+                                                (self.srcfile, 'obj', (2,)), (self.srcfile, 'obj', (1,))]))
+        self.assertEqual({'zlib'}, {info.codec for info in node2._cache[self.srcfile].objects.values()})
+
+        node1.update(self.srcfile, 'async', 'aobj')
+        node1.wait_for_background()
+        self.assertEqual('async', self.run_async(node2.aobject_for(self.srcfile, 'aobj')))
+
+    def test_failures(self):
+        """ A shared tier that is damaged or unreachable is just a miss """
+        node1, node2 = self.nodes(DirectoryTier(self.shared_dir))
+        node1.update(self.srcfile, 'obj', 'obj')
+        node1.wait_for_background()
+        for dirpath, _, files in os.walk(self.shared_dir):
+            for fname in files:
+                with open(os.path.join(dirpath, fname), 'wb') as f:
+                    f.write(b'garbage')
+        self.assertIsNone(node2.object_for(self.srcfile, 'obj'))
+        self.assertEqual(0, self.shared_records())          # Damaged records are removed
+
+        node2.shared_tier = HttpTier('http://127.0.0.1:9/store', timeout=1)
+        self.assertIsNone(node2.object_for(self.srcfile, 'obj'))
+        self.assertTrue(node2.update(self.srcfile, 'obj', 'obj'))
+        node2.wait_for_background()
+        self.assertEqual('obj', node2.object_for(self.srcfile, 'obj'))
+
+        # Sources that can't be signed are a miss as well
+        self.assertIsNone(node2.object_for(os.path.join(self.test_dir, 'missing'), 'obj'))
+
+
+if __name__ == '__main__':
+    unittest.main()
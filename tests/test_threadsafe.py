@@ -0,0 +1,113 @@
+import os
+import random
+import shutil
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from cachejar.jar import CacheFactory
+from cachejar.memtier import MemoryTier
+from cachejar.rwlock import RWLock
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class RWLockTestCase(unittest.TestCase):
+    def test_concurrent_readers(self):
+        """ Readers don't wait for each other """
+        lock = RWLock()
+        barrier = threading.Barrier(4, timeout=5)
+
+        def reader():
+            with lock.read():
+                barrier.wait()              # Only passes if all four hold the lock at once
+        with ThreadPoolExecutor(4) as pool:
+            for f in [pool.submit(reader) for _ in range(4)]:
+                f.result()
+
+    def test_writer_excludes(self):
+        lock = RWLock()
+        events = []
+
+        def writer():
+            with lock.write():
+                events.append('write start')
+                time.sleep(0.05)
+                events.append('write end')
+
+        with lock.read():
+            t = threading.Thread(target=writer)
+            t.start()
+            time.sleep(0.05)
+            events.append('read')
+        t.join()
+        self.assertEqual(['read', 'write start', 'write end'], events)
+
+    def test_reentry(self):
+        lock = RWLock()
+        with lock.write():
+            with lock.write():
+                with lock.read():
+                    pass
+        with lock.read():
+            with lock.read():
+                with self.assertRaises(RuntimeError):
+                    with lock.write():
+                        pass
+        with lock.write():                  # Everything was released
+            pass
+
+
+class ThreadSafeJarTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    test_dir = os.path.join(datadir, 'cache')
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.sources = []
+        for i in range(3):
+            source = os.path.join(self.test_dir, f'source{i}')
+            shutil.copy(os.path.join(self.datadir, 'datafile'), source)
+            self.sources.append(source)
+        self.jar = CacheFactory(self.test_dir).cachejar('test_threadsafe')
+        self.jar.threadsafe = True
+        self.jar.memory_tier = MemoryTier(max_entries=10)
+        self.jar.access_resolution = 0
+
+    def tearDown(self):
+        make_and_clear_directory(self.test_dir)
+
+    def test_threads(self):
+        """ Hammer a shared jar with lookups, updates, invalidations and cleans """
+        self.assertTrue(self.jar.threadsafe)
+
+        def work(n: int) -> None:
+            rnd = random.Random(n)
+            for _ in range(100):
+                source = rnd.choice(self.sources)
+                obj_id = rnd.randrange(10)
+                action = rnd.random()
+                if action < 0.6:
+                    obj = self.jar.object_for(source, 'obj', obj_id)
+                    self.assertIn(obj, (None, (source, obj_id)))
+                elif action < 0.9:
+                    self.jar.update(source, (source, obj_id), 'obj', obj_id)
+                elif action < 0.95:
+                    os.utime(source, ns=(time.time_ns(), time.time_ns() + rnd.randrange(10 ** 9)))
+                else:
+                    self.jar.clean(source, 'obj', obj_id)
+
+        with ThreadPoolExecutor(8) as pool:
+            for f in [pool.submit(work, n) for n in range(8)]:
+                f.result()
+
+        # The index, the usage totals and the files on disk all agree
+        fnames = set(self.jar._cache.blobs())
+        self.assertEqual(len(fnames), self.jar.total_objects)
+        self.assertEqual(fnames, {f for f in os.listdir(self.jar.cache_directory) if f.startswith('A')})
+        jar2 = CacheFactory(self.test_dir).cachejar('test_threadsafe')
+        self.assertEqual(self.jar.total_bytes, jar2.total_bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
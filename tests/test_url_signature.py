@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler
+
+from cachejar.jar import CacheFactory
+from cachejar.signature import UrlSignatureCache, url_signature
+from tests.utils.http_server import ThreadingHTTPServer
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class ResourceHandler(BaseHTTPRequestHandler):
+    """ Stand-in for a remote resource.  The server's `version` attribute determines the Last-Modified header """
+    def do_HEAD(self):
+        self.server.nrequests += 1
+        if self.path.endswith('missing'):
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Last-Modified', f"version {self.server.version}")
+        self.send_header('Content-Length', '17')
+        self.send_header('ETag', f'"{self.server.version}"')
+        self.end_headers()
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class UrlSignatureCacheTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    test_dir = os.path.join(datadir, 'cache')
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), ResourceHandler)
+        cls.server.version = 1
+        cls.server.nrequests = 0
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/resource"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.version = 1
+        self.server.nrequests = 0
+
+    @staticmethod
+    def wait_for(cond) -> None:
+        deadline = time.monotonic() + 5
+        while not cond() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_fresh_and_stale(self):
+        changes = []
+        sigs = UrlSignatureCache(freshness=0.2, on_change=lambda u, s: changes.append(s))
+        sig1 = sigs.signature(self.url)
+        self.assertEqual(url_signature(self.url), sig1)
+        self.server.nrequests = 0
+
+        # Within the freshness window nothing goes to the network
+        self.server.version = 2
+        self.assertEqual(sig1, sigs.signature(self.url))
+        self.assertEqual(0, self.server.nrequests)
+
+        # Once stale, the old value is served while the revalidation happens in the background
+        time.sleep(0.25)
+        self.assertEqual(sig1, sigs.signature(self.url))
+        self.wait_for(lambda: changes)
+        self.assertEqual(1, self.server.nrequests)
+        self.assertEqual(1, len(changes))
+        self.assertEqual(changes[0], sigs.signature(self.url))
+        self.assertNotEqual(sig1, changes[0])
+
+        # An unchanged resource doesn't fire the change notification
+        time.sleep(0.25)
+        sigs.signature(self.url)
+        self.wait_for(lambda: self.server.nrequests == 2)
+        time.sleep(0.05)
+        self.assertEqual(1, len(changes))
+        sigs.shutdown()
+
+    def test_jar(self):
+        make_and_clear_directory(self.test_dir)
+        jar = CacheFactory(self.test_dir).cachejar('test_url_signature')
+        jar.url_signatures = UrlSignatureCache(freshness=0.2)
+        jar.update(self.url, "v1", 'text')
+        self.server.nrequests = 0
+        for _ in range(10):
+            self.assertEqual("v1", jar.object_for(self.url, 'text'))
+        self.assertEqual(0, self.server.nrequests)
+
+        self.server.version = 2
+        time.sleep(0.25)
+        self.assertEqual("v1", jar.object_for(self.url, 'text'))       # Stale value while we revalidate
+        self.wait_for(lambda: self.server.nrequests == 1)
+        time.sleep(0.05)
+        self.assertIsNone(jar.object_for(self.url, 'text'))
+        jar.url_signatures.shutdown()
+        make_and_clear_directory(self.test_dir)
+
+    def test_failed_revalidation(self):
+        """ A resource that disappears is reported on the next lookup """
+        import urllib.error
+
+        url = self.url + 'missing'
+        sigs = UrlSignatureCache(freshness=0.1, signer=lambda u: 'sig' if not sigs.gone else url_signature(u))
+        sigs.gone = False
+        sigs.signature(url)
+        sigs.gone = True
+        time.sleep(0.15)
+        self.assertEqual('sig', sigs.signature(url))
+        self.wait_for(lambda: url not in sigs._signatures)
+        with self.assertRaises(urllib.error.HTTPError):
+            sigs.signature(url)
+        sigs.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
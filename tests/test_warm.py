@@ -0,0 +1,90 @@
+import os
+import time
+import unittest
+
+from cachejar.jar import CacheFactory
+from cachejar.sharedtier import DirectoryTier
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+def parse(fname: str) -> dict:
+    """ Builder for the tests - it runs in a worker process """
+    with open(fname) as f:
+        text = f.read()
+    if text == 'bad':
+        raise ValueError(f"{fname} is bad")
+    return {'pid': os.getpid(), 'text': text}
+
+
+class WarmTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    test_dir = os.path.join(datadir, 'cache')
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.src = os.path.join(self.test_dir, 'src')
+        os.makedirs(self.src)
+        self.sources = [os.path.join(self.src, f'f{i}') for i in range(10)]
+        for i, source in enumerate(self.sources):
+            with open(source, 'w') as f:
+                f.write(f'text {i}')
+        self.jar = CacheFactory(os.path.join(self.test_dir, 'root')).cachejar('test_warm')
+
+    def tearDown(self):
+        make_and_clear_directory(self.test_dir)
+
+    def warm(self, sources, **kwargs):
+        reports = []
+        failures = self.jar.warm(sources, parse, max_workers=2, progress=lambda n, t: reports.append((n, t)), **kwargs)
+        return failures, reports
+
+    def test_warm(self):
+        failures, reports = self.warm(self.sources, max_pending=3)
+        self.assertEqual({}, failures)
+        self.assertEqual([(i, 10) for i in range(1, 11)], reports)
+        self.assertEqual(10, self.jar.total_objects)
+        results = [self.jar.object_for(source, 'tests.test_warm.parse') for source in self.sources]
+        self.assertEqual([f'text {i}' for i in range(10)], [r['text'] for r in results])
+        self.assertNotIn(os.getpid(), {r['pid'] for r in results})
+        self.assertTrue(all(info.cost is not None for entry in self.jar._cache.values()
+                            for info in entry.objects.values()))
+
+        # The objects are the ones memoize uses - built in another process
+        self.assertNotEqual(os.getpid(), self.jar.memoize()(parse)(self.sources[3])['pid'])
+
+        # Only missing and stale entries are built
+        self.assertEqual(({}, []), self.warm(self.sources))
+        time.sleep(0.01)
+        with open(self.sources[4], 'w') as f:
+            f.write('changed')
+        self.assertEqual(({}, [(1, 1)]), self.warm(self.sources))
+        self.assertEqual('changed', self.jar.object_for(self.sources[4], 'tests.test_warm.parse')['text'])
+        self.assertEqual(10, self.jar.total_objects)
+
+    def test_failures(self):
+        with open(self.sources[2], 'w') as f:
+            f.write('bad')
+        missing = os.path.join(self.src, 'missing')
+        failures, reports = self.warm(self.sources + [missing])
+        self.assertEqual({self.sources[2], missing}, set(failures))
+        self.assertIsInstance(failures[self.sources[2]], ValueError)
+        self.assertIsInstance(failures[missing], FileNotFoundError)
+        self.assertEqual(10, len(reports))
+        self.assertEqual(9, self.jar.total_objects)
+        self.assertIsNone(self.jar.object_for(self.sources[2], 'tests.test_warm.parse'))
+
+    def test_shared(self):
+        """ Objects that another machine has built are taken from the shared tier """
+        tier = DirectoryTier(os.path.join(self.test_dir, 'shared'))
+        self.jar.shared_tier = tier
+        self.warm(self.sources[:6])
+        self.jar.wait_for_background()
+        jar2 = CacheFactory(os.path.join(self.test_dir, 'root2'), shared_tier=tier).cachejar('test_warm')
+        self.assertEqual({}, jar2.warm(self.sources, parse, max_workers=2,
+                                       progress=lambda n, t: self.assertEqual(4, t)))
+        self.assertEqual(10, jar2.total_objects)
+        jar2.wait_for_background()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import time
+import unittest
+from unittest import mock
+
+from cachejar import Dependencies
+from cachejar.jar import CacheFactory
+from cachejar.watcher import InotifyWatcher, PollingWatcher
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+def touch(path: str, text: str = 'x') -> None:
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+class WatcherTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    test_dir = os.path.join(datadir, 'cache')
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.src = os.path.join(self.test_dir, 'src')
+        os.makedirs(os.path.join(self.src, 'data'))
+        self.srcfile = os.path.join(self.src, 'source.json')
+        touch(self.srcfile)
+        touch(os.path.join(self.src, 'data', 'd1'))
+        self.jar = CacheFactory(self.test_dir).cachejar('test_watcher')
+        self.jar.watch_sources = True
+
+    def tearDown(self):
+        self.jar.watch_sources = False
+        make_and_clear_directory(self.test_dir)
+
+    def signatures(self, fn) -> int:
+        """ Return the number of times fn signs a source """
+        with mock.patch.object(self.jar, '_signature', wraps=self.jar._signature) as signature:
+            fn()
+        return signature.call_count
+
+    def test_hits(self):
+        """ Once a source has been signed and watched, hits don't sign it again or stat the index files """
+        if not InotifyWatcher.available():
+            self.skipTest("inotify not available")
+        datadir = os.path.join(self.src, 'data')
+        self.jar.update(self.srcfile, 'file', 'obj')
+        self.jar.update(datadir, 'dir', 'obj')
+        self.assertEqual('file', self.jar.object_for(self.srcfile, 'obj'))
+        with mock.patch('os.stat', side_effect=AssertionError("stat called")):
+            self.assertEqual(0, self.signatures(lambda: [self.jar.object_for(self.srcfile, 'obj') for _ in range(5)]))
+        self.assertEqual(0, self.signatures(lambda: self.jar.object_for(datadir, 'obj')))
+
+        def changed(source, change):
+            self.jar.update(source, 'built', 'built')
+            self.assertEqual('built', self.jar.object_for(source, 'built'))
+            change()
+            self.assertIsNone(self.jar.object_for(source, 'built'))
+
+        # The tests below would pass without the watcher, so check that the change was reported
+        def reported(change):
+            def fn():
+                generation = self.jar._watch_generation
+                change()
+                self.jar._watcher.poll()
+                self.assertGreater(self.jar._watch_generation, generation)
+            return fn
+
+        changed(self.srcfile, reported(lambda: touch(self.srcfile, 'changed')))
+        replacement = os.path.join(self.src, 'new.json')
+        touch(replacement, 'replaced')
+        changed(self.srcfile, reported(lambda: os.replace(replacement, self.srcfile)))
+        changed(datadir, reported(lambda: touch(os.path.join(datadir, 'd2'))))
+        os.makedirs(os.path.join(datadir, 'sub'))
+        changed(datadir, reported(lambda: touch(os.path.join(datadir, 'sub', 's1'))))
+
+        # Changes to other files in the same directory don't invalidate anything
+        self.jar.update(self.srcfile, 'file', 'obj')
+        self.jar.object_for(self.srcfile, 'obj')
+        touch(os.path.join(self.src, 'other.json'))
+        self.assertEqual(0, self.signatures(lambda: self.jar.object_for(self.srcfile, 'obj')))
+
+    def test_overflow(self):
+        """ When the watcher loses track of changes, everything is signed again """
+        self.jar.update(self.srcfile, 'file', 'obj')
+        self.jar.object_for(self.srcfile, 'obj')
+        self.assertIn(self.srcfile, self.jar._trusted)
+        self.jar._sources_overflowed()
+        self.assertEqual(1, self.signatures(lambda: self.jar.object_for(self.srcfile, 'obj')))
+        self.assertEqual('file', self.jar.object_for(self.srcfile, 'obj'))
+
+    def test_not_trusted(self):
+        """ Urls, and Dependencies with a url member, are signed on every reference """
+        deps = Dependencies(self.srcfile, 'http://example.org/context.jsonld')
+        with mock.patch('cachejar.jar.signature', return_value='url1'):
+            self.jar.update(deps, 'deps', 'obj')
+            self.assertEqual('deps', self.jar.object_for(deps, 'obj'))
+            self.assertNotIn(deps, self.jar._trusted)
+            self.assertGreater(self.signatures(lambda: self.jar.object_for(deps, 'obj')), 0)
+
+            url = 'http://example.org/model.json'
+            self.jar.update(url, 'url', 'obj')
+            self.assertEqual('url', self.jar.object_for(url, 'obj'))
+            self.assertEqual(1, self.signatures(lambda: self.jar.object_for(url, 'obj')))
+            self.assertNotIn(url, self.jar._trusted)
+
+    def test_disable(self):
+        self.jar.update(self.srcfile, 'file', 'obj')
+        self.jar.object_for(self.srcfile, 'obj')
+        self.jar.watch_sources = False
+        self.assertEqual({}, self.jar._trusted)
+        self.assertEqual(1, self.signatures(lambda: self.jar.object_for(self.srcfile, 'obj')))
+
+    def test_polling(self):
+        changes = []
+        overflows = []
+        poller = PollingWatcher(changes.append, lambda: overflows.append(True))
+        poller.interval = 1000                      # Drive it with rescan rather than the background thread
+        try:
+            datadir = os.path.join(self.src, 'data')
+            self.assertTrue(poller.watch('file', self.srcfile))
+            self.assertTrue(poller.watch('dir', datadir))
+            self.assertTrue(poller.watch('pattern', os.path.join(datadir, '*.txt')))
+            self.assertFalse(poller.watch('missing', os.path.join(self.test_dir, 'nowhere', 'x')))
+            poller.rescan()
+            self.assertEqual([], changes)
+
+            touch(os.path.join(self.src, 'other.json'))
+            poller.rescan()
+            self.assertEqual([], changes)
+
+            time.sleep(0.01)
+            touch(self.srcfile, 'changed')
+            poller.rescan()
+            self.assertEqual(['file'], changes)
+
+            # Subscriptions are dropped once a change has been reported
+            touch(self.srcfile, 'changed again')
+            poller.rescan()
+            self.assertEqual(['file'], changes)
+
+            touch(os.path.join(datadir, 'd2'))
+            poller.rescan()
+            self.assertEqual({'file', 'dir', 'pattern'}, set(changes))
+            self.assertEqual([], overflows)
+        finally:
+            poller.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+from cachejar.jar import CacheFactory, CacheError
+from tests.utils.make_and_clear_directory import make_and_clear_directory
+
+
+class WriteBehindTestCase(unittest.TestCase):
+    datadir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+    test_dir = os.path.join(datadir, 'cache')
+
+    def setUp(self):
+        make_and_clear_directory(self.test_dir)
+        self.srcfile = os.path.join(self.test_dir, 'source.txt')
+        with open(self.srcfile, 'w') as f:
+            f.write('source')
+        self.root = os.path.join(self.test_dir, 'root')
+        self.jar = CacheFactory(self.root).cachejar('test_write_behind')
+
+    def tearDown(self):
+        self.jar.write_behind = False
+        make_and_clear_directory(self.test_dir)
+
+    def hold_writer(self) -> threading.Event:
+        """ Make the writer thread wait before writing anything until the returned event is set """
+        release = threading.Event()
+        write_blob = self.jar._write_blob
+        self.jar._write_blob = lambda *args: release.wait(10) and write_blob(*args)
+        return release
+
+    def other_jar(self):
+        return CacheFactory(self.root).cachejar('test_write_behind')
+
+    def test_write_behind(self):
+        self.jar.write_behind = True
+        self.assertTrue(self.jar.threadsafe)
+        release = self.hold_writer()
+        for i in range(5):
+            self.assertTrue(self.jar.update(self.srcfile, f'obj{i}', 'obj', i))
+        self.assertFalse(self.jar.update(self.srcfile, 'again', 'obj', 0))
+        self.assertEqual('obj3', self.jar.object_for(self.srcfile, 'obj', 3))
+        self.assertEqual(['obj1', None], self.jar.object_for_many([(self.srcfile, 'obj', (1,)),
+                                                                   (self.srcfile, 'obj', (7,))]))
+        self.assertEqual('obj2', self.jar.get_or_compute(lambda: self.fail("Not rebuilt"), self.srcfile, 'obj', 2))
+        self.assertIsNone(self.other_jar().object_for(self.srcfile, 'obj', 3))     # Not written yet
+        self.assertEqual(0, self.jar.total_objects)
+
+        release.set()
+        self.jar.flush()
+        self.assertEqual(5, self.jar.total_objects)
+        self.assertEqual([f'obj{i}' for i in range(5)],
+                         self.other_jar().object_for_many([(self.srcfile, 'obj', (i,)) for i in range(5)]))
+        self.assertFalse(self.jar.update(self.srcfile, 'again', 'obj', 0))
+
+    def test_back_pressure(self):
+        self.jar.max_pending_writes = 2
+        self.jar.write_behind = True
+        release = self.hold_writer()
+        self.jar.update(self.srcfile, 'obj0', 'obj', 0)
+        self.jar.update(self.srcfile, 'obj1', 'obj', 1)
+        blocked = threading.Thread(target=self.jar.update, args=(self.srcfile, 'obj2', 'obj', 2))
+        blocked.start()
+        blocked.join(0.2)
+        self.assertTrue(blocked.is_alive())
+        release.set()
+        blocked.join(10)
+        self.assertFalse(blocked.is_alive())
+        self.jar.flush()
+        self.assertEqual(3, self.jar.total_objects)
+
+    def test_stale_and_failed(self):
+        self.jar.write_behind = True
+        release = self.hold_writer()
+        self.jar.update(self.srcfile, 'obj', 'obj')
+        time.sleep(0.01)
+        with open(self.srcfile, 'w') as f:
+            f.write('changed')
+        self.assertIsNone(self.jar.object_for(self.srcfile, 'obj'))
+        release.set()
+        self.jar.flush()
+        self.assertEqual(0, self.jar.total_objects)
+
+        # Objects that can't be serialized are reported by the next flush
+        self.jar.update(self.srcfile, lambda: None, 'unpicklable')
+        self.jar.update(self.srcfile, 'fine', 'fine')
+        with self.assertRaises(CacheError):
+            self.jar.flush()
+        self.jar.flush()
+        self.assertEqual('fine', self.other_jar().object_for(self.srcfile, 'fine'))
+        self.assertIsNone(self.jar.object_for(self.srcfile, 'unpicklable'))
+
+    def test_clean(self):
+        """ Cleaning waits for the queue, so queued objects don't come back afterwards """
+        self.jar.write_behind = True
+        self.jar.update(self.srcfile, 'obj', 'obj')
+        self.assertEqual(1, self.jar.clean(self.srcfile))
+        self.jar.flush()
+        self.assertIsNone(self.jar.object_for(self.srcfile, 'obj'))
+
+    def test_exit(self):
+        """ The queue is drained when the interpreter exits """
+        script = f"""
+import time
+from cachejar.jar import CacheFactory
+jar = CacheFactory({self.root!r}).cachejar('test_write_behind')
+jar.write_behind = True
+write_blob = jar._write_blob
+jar._write_blob = lambda *args: time.sleep(0.2) or write_blob(*args)
+jar.update({self.srcfile!r}, 'written at exit', 'obj')
+"""
+        subprocess.run([sys.executable, '-c', script], check=True, timeout=60,
+                       cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual('written at exit', self.other_jar().object_for(self.srcfile, 'obj'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,7 @@
+import socketserver
+from http.server import HTTPServer
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    """ HTTP server that handles each request in its own thread (http.server.ThreadingHTTPServer needs python 3.7) """
+    daemon_threads = True
@@ -15,8 +15,14 @@ def make_and_clear_directory(directory: str, remake: bool=True) -> None:
     if os.path.exists(directory):
         if not os.path.exists(safety_file):
             raise FileExistsError("{} not found in test directory".format(safety_file))
-        shutil.rmtree(directory)
+        shutil.rmtree(directory, onerror=_ignore_missing)
     if remake:
         os.makedirs(directory)
         with open(safety_file, "w") as f:
             f.write("Generated for safety.  Must be present for test to clear this directory.")
+
+
+def _ignore_missing(function, path, excinfo) -> None:
+    """ rmtree error handler - jars remove files in the background, so a file may be gone before rmtree gets to it """
+    if not issubclass(excinfo[0], FileNotFoundError):
+        raise excinfo[1]